@@ -1,72 +1,145 @@
-import pandas as pd
-import joblib
 import os
-from supabase import create_client
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from inference import Predictor
+import features
+from log_cursor import cursor_filter
 from dotenv import load_dotenv
 
 load_dotenv()
-supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
-
-def run_backtest():
-    print("📥 Tõmban andmeid testimiseks...")
-    # Tõmbame viimased 1000 rida ajalugu
-    res = supabase.table("trade_logs").select("*").not_.is_("vwap", "null").order("created_at", desc=True).execute()
-    
-    if not res.data or len(res.data) < 20:
-        print("❌ Testimiseks on liiga vähe täielikke andmeid (vajalik vähemalt 20 rida).")
-        return
+supabase = None  # luuakse init()-is
+
+PAGE_SIZE = 1000  # Supabase vaikimisi maksimum päringu kohta
+BUY_ABOVE = 0.7
+SELL_BELOW = 0.3
+SELL_STOCH_ABOVE = 80
+START_BALANCE = 1000.0  # USDT
+
+
+def init():
+    global supabase
+    if supabase is None:
+        from supabase import create_client
+        supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+    return supabase
+
+
+def iter_chunks(columns, since=None, symbol=None, page_size=PAGE_SIZE):
+    """Pages of `trade_logs` oldest first as (created_at list, float32 matrix of `columns`).
+
+    Pages by a (created_at, id) cursor, selecting only the needed columns;
+    the next page is fetched in the background while the caller works on
+    the current one.
+    """
+    init()
+
+    def fetch(cursor):
+        query = supabase.table("trade_logs").select(','.join(['id', 'created_at'] + columns)) \
+            .not_.is_("vwap", "null")
+        if symbol:
+            query = query.eq("symbol", symbol)
+        if cursor:
+            query = query.or_(cursor_filter(*cursor))
+        elif since:
+            query = query.gte("created_at", since)
+        return query.order("created_at").order("id").limit(page_size).execute().data or []
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(fetch, None)
+        while True:
+            rows = pending.result()
+            if len(rows) == page_size:
+                pending = pool.submit(fetch, (rows[-1]['created_at'], rows[-1]['id']))
+            if rows:
+                values = np.array([[np.nan if r.get(c) is None else r[c] for c in columns] for r in rows],
+                                  dtype=np.float32)
+                yield [r['created_at'] for r in rows], values
+            if len(rows) < page_size:
+                return
 
-    df = pd.DataFrame(res.data)
-    df = df.iloc[::-1] # Keerame andmed õigesse ajajärjekorda
 
+class Simulation:
+    """Account state of the backtest; `feed` one chunk at a time, the position carries over."""
+
+    def __init__(self, balance=START_BALANCE):
+        self.start_balance = balance
+        self.saldo = balance
+        self.kogus = 0.0
+        self.tehinguid = 0
+        self.rows = 0
+        self.last_price = None
+
+    def feed(self, created, price, stoch_k, predictions):
+        buy = np.flatnonzero(predictions > BUY_ABOVE)
+        sell = np.flatnonzero((predictions < SELL_BELOW) | (stoch_k > SELL_STOCH_ABOVE))
+        i = 0
+        # Hüppame otse järgmise ostu/müügi signaalini, mitte ei käi iga rida läbi
+        while True:
+            events = sell if self.kogus > 0 else buy
+            j = int(np.searchsorted(events, i))
+            if j == len(events):
+                break
+            i = int(events[j])
+            if self.kogus > 0:
+                # MÜÜ (kui AI ennustus < 0.3 või Stoch > 80 ja meil on positsioon)
+                self.saldo = self.kogus * float(price[i])
+                self.kogus = 0.0
+                self.tehinguid += 1
+                kasum = self.saldo - self.start_balance
+                print(f"[{created[i]}] SELL: Hind {price[i]:.2f} | Saldo: {self.saldo:.2f} | Kasum: {kasum:.2f}%")
+            else:
+                # OSTA (kui AI ennustus > 0.7 ja meil pole veel positsiooni)
+                self.kogus = self.saldo / float(price[i])
+                self.saldo = 0.0
+                self.tehinguid += 1
+                print(f"[{created[i]}] BUY: Hind {price[i]:.2f} | AI: {predictions[i]:.2f}")
+            i += 1
+        self.rows += len(price)
+        self.last_price = float(price[-1])
+
+    def value(self):
+        return self.saldo + self.kogus * (self.last_price or 0.0)
+
+
+def run_backtest(since=None, symbol=None):
     if not os.path.exists('trading_brain_xgb.pkl'):
         print("❌ XGBoost mudelit ei leitud. Treeni esmalt brain.py-ga!")
         return
 
+    import joblib
     model = joblib.load('trading_brain_xgb.pkl')
-    
-    alg_saldo = 1000.0  # USDT
-    saldo = alg_saldo
-    kogus = 0
-    tehinguid = 0
-    
-    print(f"🚀 Alustan simulatsiooni {len(df)} küünlaga...")
-    
-    for i in range(len(df)):
-        row = df.iloc[i]
-        price = float(row['price'])
-        
-        # SAMA JÄRJEKORD MIS BOT.PY-S!
-        features = [[
-            price, row['rsi'], row['macd'], row['macd_signal'],
-            row['vwap'], row['stoch_k'], row['stoch_d'],
-            row['atr'], row['ema200'], row['market_pressure']
-        ]]
-        
-        prediction = model.predict_proba(features)[0][1]
-        
-        # OSTA (kui AI ennustus > 0.7 ja meil pole veel positsiooni)
-        if prediction > 0.7 and kogus == 0:
-            kogus = saldo / price
-            saldo = 0
-            tehinguid += 1
-            print(f"[{row['created_at']}] BUY: Hind {price:.2f} | AI: {prediction:.2f}")
-
-        # MÜÜ (kui AI ennustus < 0.3 ja meil on positsioon)
-        elif (prediction < 0.3 or row['stoch_k'] > 80) and kogus > 0:
-            saldo = kogus * price
-            kogus = 0
-            tehinguid += 1
-            kasum = saldo - alg_saldo
-            print(f"[{row['created_at']}] SELL: Hind {price:.2f} | Saldo: {saldo:.2f} | Kasum: {kasum:.2f}%")
-
-    lõpp_väärtus = saldo + (kogus * float(df.iloc[-1]['price']))
+    # SAMA JÄRJEKORD MIS BOT.PY-S (features register)! Ennustus ühe partiina iga lehekülje kohta
+    predictor = Predictor(model)
+    columns = features.log_columns(features.columns(predictor.n_features))
+    price_col = columns.index('price')
+    stoch_col = columns.index('stoch_k')
+
+    print("📥 Loen andmeid lehekülgede kaupa, simulatsioon algab esimesest leheküljest...")
+    sim = Simulation()
+    started = time.perf_counter()
+    for created, X in iter_chunks(columns, since, symbol):
+        sim.feed(created, X[:, price_col], X[:, stoch_col], predictor.predict(X))
+        if sim.rows % (PAGE_SIZE * 100) == 0:
+            print(f"... {sim.rows} rida, {sim.rows / (time.perf_counter() - started):.0f} rida/s")
+
+    if sim.rows < 20:
+        print("❌ Testimiseks on liiga vähe täielikke andmeid (vajalik vähemalt 20 rida).")
+        return
+
+    lõpp_väärtus = sim.value()
+    alg_saldo = sim.start_balance
     print("-" * 30)
-    print(f"SIMULATSIOONI TULEMUS:")
+    print(f"SIMULATSIOONI TULEMUS ({sim.rows} rida, {time.perf_counter() - started:.1f}s):")
     print(f"Algne saldo: {alg_saldo} USDT")
     print(f"Lõplik saldo: {lõpp_väärtus:.2f} USDT")
-    print(f"Kokku tehinguid: {tehinguid}")
+    print(f"Kokku tehinguid: {sim.tehinguid}")
     print(f"Netokasum: {((lõpp_väärtus - alg_saldo) / alg_saldo) * 100:.2f}%")
 
 if __name__ == "__main__":
-    run_backtest()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Backtest the model on logged trade_logs rows')
+    parser.add_argument('--since', default=None, help='created_at alates (ISO), vaikimisi kogu tabel')
+    parser.add_argument('--symbol', default=None)
+    args = parser.parse_args()
+    run_backtest(args.since, args.symbol)
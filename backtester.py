@@ -1,59 +1,163 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
-from binance.client import Client
+import indicators
+import features
 from dotenv import load_dotenv
+import kline_store
+from inference import Predictor
 
 load_dotenv()
-client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
+client = None  # Binance klient, luuakse init()-is alles siis, kui küünlaid on vaja tõmmata
 
 SYMBOL = 'BTCUSDT'
+# NB! Sama järjekord mis bot.analyze_signals ja brain.py (features register)
+FEATURES = features.COLUMNS
+STOCH_BUY_BELOW = 30
+DEFAULT_SETTINGS = {"stop_loss": -2.0, "take_profit": 3.0, "min_ai_confidence": 0.6}
+
+def init():
+    """Create the Binance client for `backtest()` (offline users of the module never call this)."""
+    global client
+    if client is None:
+        from binance.client import Client
+        client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
+    return client
 
-# kopeeritud mõningad meetodid bot.py-st
 
 def prepare_dataframe(klines):
-    df = pd.DataFrame(klines, columns=['time','open','high','low','close','volume','_','_','_','_','_','_'])
-    df[['open','high','low','close','volume']] = df[['open','high','low','close','volume']].apply(pd.to_numeric)
-    df['rsi'] = ta.rsi(df['close'], length=14)
-    macd = ta.macd(df['close'])
-    df['macd'] = macd.iloc[:,0]
-    df['macd_signal'] = macd.iloc[:,2]
-    bbands = ta.bbands(df['close'], length=20, std=2)
-    df['bb_lower'] = bbands.iloc[:,0]
-    df['bb_upper'] = bbands.iloc[:,2]
-    df['ema50'] = ta.ema(df['close'], length=50)
-    df['ema200'] = ta.ema(df['close'], length=200)
-    df['atr'] = ta.atr(df['high'], df['low'], df['close'], length=14)
-    try:
-        df['vwap'] = ta.vwap(df['high'], df['low'], df['close'], df['volume'])
-        stoch = ta.stoch(df['high'], df['low'], df['close'])
-        df['stoch_k'] = stoch.iloc[:,0]
-        df['stoch_d'] = stoch.iloc[:,1]
-    except Exception:
-        pass
-    return df
-
-
-def backtest(start_str="500 hours ago UTC"):
-    klines = client.get_historical_klines(SYMBOL, '1m', start_str)
-    df = prepare_dataframe(klines)
+    if isinstance(klines, pd.DataFrame):
+        df = klines.copy()  # kline_store.load annab juba numbrilised veerud
+    else:
+        df = pd.DataFrame(klines, columns=['time','open','high','low','close','volume','_','_','_','_','_','_'])
+        df[['time','open','high','low','close','volume']] = df[['time','open','high','low','close','volume']].apply(pd.to_numeric)
+    # Ühine indikaatorite moodul (sama mis migrate_logs ja voo kontroll) + kõrgemad ajaraamid 1m küünaldest
+    return features.add_timeframes(indicators.add_indicators(df))
+
+
+def predict(model, df):
+    """AI ennustus kõigile ridadele korraga (üks predict_proba kutse)."""
+    if model is None:
+        return np.full(len(df), 0.5)
+    predictor = Predictor(model)
+    return predictor.predict(df[features.columns(predictor.n_features)].to_numpy(dtype=np.float32)).astype(float)
+
+
+def _find_exit(close, entry, stop_loss, take_profit):
+    """Esimene indeks pärast `entry`-t, kus PnL ületab SL/TP piiri (või None)."""
+    price = close[entry]
+    start, width = entry + 1, 256
+    while start < len(close):
+        pnl = ((close[start:start + width] - price) / price) * 100
+        hit = np.flatnonzero((pnl <= stop_loss) | (pnl >= take_profit))
+        if hit.size:
+            return start + hit[0], pnl[hit[0]]
+        start, width = start + width, width * 2
+    return None, None
+
+
+def simulate(close, prediction, stoch_k, stop_loss=-2.0, take_profit=3.0, min_confidence=0.6):
+    """Positsiooni olekumasin nagu bot.analyze_signals, ühe läbimisega.
+
+    Selle asemel et iga küünalt eraldi vaadata, hüppame järgmise ostusignaali
+    juurde ja sealt vektoriseeritult esimese SL/TP küünlani.
+    Tagastab tehingute listi (entry_idx, exit_idx, pnl); lõpuni avatud
+    positsiooni exit_idx on None ja pnl viimase küünla järgi.
+    """
+    close = np.asarray(close, dtype=float)
+    stoch_k = np.asarray(stoch_k, dtype=float)
+    entries = np.flatnonzero((np.asarray(prediction) >= min_confidence) & (stoch_k < STOCH_BUY_BELOW))
+
+    trades = []
+    flat_from = 0
+    while True:
+        k = np.searchsorted(entries, flat_from)
+        if k == len(entries):
+            break
+        entry = entries[k]
+        exit_idx, pnl = _find_exit(close, entry, stop_loss, take_profit)
+        if exit_idx is None:
+            trades.append((int(entry), None, ((close[-1] - close[entry]) / close[entry]) * 100))
+            break
+        trades.append((int(entry), int(exit_idx), float(pnl)))
+        # Müügi küünlal uut ostu ei tehta (analyze_signals if/elif)
+        flat_from = exit_idx + 1
+    return trades
 
-    last_buy = None
-    pnl_history = []
 
-    for i in range(2, len(df)):
-        window = df.iloc[:i+1].copy()
-        action, summary, pnl, pred = analyze_signals(window)
-        # siin analyseerime liikumist aga ei logi tegelikku orderit
-        if action == 'BUY':
-            last_buy = window.iloc[-1]['close']
-        elif action == 'SELL' and last_buy is not None:
-            pnl_history.append(((window.iloc[-1]['close'] - last_buy) / last_buy) * 100)
-            last_buy = None
-    print(f"Backtest finished items: {len(pnl_history)} trades, avg pnl {pd.Series(pnl_history).mean():.2f}%")
+def summarize(trades):
+    closed = np.array([t[2] for t in trades if t[1] is not None])
+    if closed.size == 0:
+        return {"trades": 0, "avg_pnl": 0.0, "total_return": 0.0, "max_drawdown": 0.0}
+    equity = np.cumprod(1 + closed / 100)
+    drawdown = 1 - equity / np.maximum.accumulate(np.r_[1.0, equity])[1:]
+    return {
+        "trades": int(closed.size),
+        "avg_pnl": float(closed.mean()),
+        "total_return": float((equity[-1] - 1) * 100),
+        "max_drawdown": float(drawdown.max() * 100),
+    }
+
+
+def run(df, model=None, settings=None):
+    """Backtest juba arvutatud indikaatoritega DataFrame'il.
+
+    `market_pressure` peab olema veerg (ajalooline orderiraamatu surve);
+    kui seda pole, kasutatakse neutraalset 1.0.
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    if 'market_pressure' not in df:
+        df = df.assign(market_pressure=1.0)
+    prediction = predict(model, df)
+    trades = simulate(df['close'].to_numpy(), prediction, df['stoch_k'].to_numpy(),
+                      float(settings['stop_loss']), float(settings['take_profit']),
+                      float(settings['min_ai_confidence']))
+    return trades, prediction
+
+
+def check_against_live(df, settings=None, rows=500):
+    """Võrdleb simulate() otsuseid bot.analyze_signals'iga viimasel `rows` real."""
+    import bot
+    model = bot.models.get()
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    df = df.iloc[-rows:].reset_index(drop=True)
+    if 'market_pressure' not in df:
+        df = df.assign(market_pressure=1.0)
+    trades, _ = run(df, model, settings)
+    expected = {t[0]: 'BUY' for t in trades}
+    expected.update({t[1]: 'SELL' for t in trades if t[1] is not None})
+
+    position = bot.Position(SYMBOL)
+    mismatches = 0
+    for i in range(len(df)):
+        action = bot.analyze_signals(df.iloc[i:i + 1], position, settings)[0]
+        if action != expected.get(i, 'HOLD'):
+            mismatches += 1
+    print(f"Kontroll: {len(df)} rida, {mismatches} erinevust bot.analyze_signals'iga")
+    return mismatches == 0
+
+
+def backtest(start_str="500 hours ago UTC", settings=None, pressure=None, check=False):
+    import bot
+    # Kohalikust kline_store'ist, Binance'ist tõmmatakse ainult puuduvad küünlad
+    klines = kline_store.get_klines(init(), SYMBOL, '1m', start_str)
+    df = prepare_dataframe(klines)
+    # Ajalooline surve tuleb ette anda (veerg/list/konstant), live orderiraamat siia ei sobi
+    df['market_pressure'] = 1.0 if pressure is None else pressure
+    if settings is None:
+        bot.init(exchange=False)  # seaded tulevad Supabase'ist, Binance'i klienti pole vaja
+        settings = bot.get_bot_settings()
+
+    if check:
+        check_against_live(df, settings)
+    trades, _ = run(df, bot.models.get(), settings)
+    stats = summarize(trades)
+    print(f"Backtest finished items: {stats['trades']} trades, avg pnl {stats['avg_pnl']:.2f}% | "
+          f"total {stats['total_return']:.2f}% | max drawdown {stats['max_drawdown']:.2f}%")
+    return trades, stats
 
-# backtestile on vaja bot.iset ja model loadimist
-from bot import analyze_signals
 
 if __name__ == '__main__':
-    backtest()
+    # --check võrdleb lisaks tehinguid bot.analyze_signals'iga
+    backtest(check='--check' in sys.argv)
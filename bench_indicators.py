@@ -0,0 +1,107 @@
+"""Correctness check and benchmark of `indicators` against pandas_ta.
+
+Checks every column of `indicators.compute` against the original pandas_ta
+computation on synthetic 1m candles (or a kline_store range) and then
+reports the runtime of both at each size.
+
+Usage:
+    python bench_indicators.py                      # check + benchmark at 500, 100k, 10M rows
+    python bench_indicators.py --sizes 500 100000   # only these sizes
+    python bench_indicators.py --check-only
+    python bench_indicators.py --symbol BTCUSDT --start "30 days ago UTC"  # check on stored klines
+"""
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import indicators
+
+TOLERANCE = 1e-9  # suhteline, hinna suurusjärgu suhtes
+
+
+def synthetic_klines(n, seed=42, start_ms=1_700_000_000_000):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(n) * 10
+    low = np.minimum(open_, close) - rng.random(n) * 10
+    return pd.DataFrame({
+        'time': start_ms + np.arange(n, dtype=np.int64) * 60_000,
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': rng.random(n) * 5,
+    })
+
+
+def check(df):
+    """True when every column matches pandas_ta (values and NaN positions)."""
+    ref = indicators.reference_pandas_ta(df)
+    got = indicators.add_indicators(df.copy())
+    ok = True
+    for col in indicators.COLUMNS:
+        a, b = ref[col].to_numpy(dtype=float), got[col].to_numpy(dtype=float)
+        nan_mismatch = int((np.isnan(a) != np.isnan(b)).sum())
+        both = ~np.isnan(a) & ~np.isnan(b)
+        diff = float(np.abs(a[both] - b[both]).max()) if both.any() else 0.0
+        scale = max(1.0, float(np.nanmax(np.abs(a)))) if both.any() else 1.0
+        passed = nan_mismatch == 0 and diff <= TOLERANCE * scale
+        ok &= passed
+        print(f"  {'OK ' if passed else 'FAIL'} {col:<12} max diff {diff:.2e}  NaN mismatches {nan_mismatch}")
+    return ok
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark(sizes, with_pandas_ta):
+    # Numba kompileerib esimesel kutsel, see ei kuulu mõõtmisse
+    indicators.add_indicators(synthetic_klines(1000))
+    print(f"{'rows':>10} {'indicators':>12} {'pandas_ta':>12} {'speedup':>9}")
+    for n in sizes:
+        df = synthetic_klines(n)
+        repeat = 20 if n <= 10_000 else 3 if n <= 1_000_000 else 1
+        cols = [df[c].to_numpy() for c in ('time', 'high', 'low', 'close', 'volume')]
+        out = np.empty((len(indicators.COLUMNS), n))
+        ours = _best(lambda: indicators.compute(*cols, out=out), repeat)
+        if with_pandas_ta:
+            theirs = _best(lambda: indicators.reference_pandas_ta(df), repeat)
+            print(f"{n:>10} {ours * 1000:>10.2f}ms {theirs * 1000:>10.2f}ms {theirs / ours:>8.1f}x")
+        else:
+            print(f"{n:>10} {ours * 1000:>10.2f}ms {'-':>12} {'-':>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 100_000, 10_000_000])
+    parser.add_argument('--check-only', action='store_true')
+    parser.add_argument('--symbol')
+    parser.add_argument('--start', default='30 days ago UTC')
+    args = parser.parse_args()
+
+    try:
+        import pandas_ta  # noqa: F401
+        have_pandas_ta = True
+    except ImportError:
+        have_pandas_ta = False
+        print("pandas_ta puudub: kontroll jääb vahele, mõõdetakse ainult indicators moodulit")
+
+    print(f"Numba: {'jah' if indicators.njit is not None else 'ei'}")
+    ok = True
+    if have_pandas_ta:
+        if args.symbol:
+            import kline_store
+            datasets = {f"{args.symbol} {args.start}": kline_store.load(args.symbol, '1m', args.start)}
+        else:
+            datasets = {f"synthetic {n}": synthetic_klines(n, seed=n) for n in (300, 5000)}
+        for name, df in datasets.items():
+            print(f"Kontroll: {name}")
+            ok &= check(df)
+    if not args.check_only:
+        benchmark(args.sizes, have_pandas_ta)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,144 @@
+"""Startup benchmark: import time of the entry modules and time to the first decision.
+
+Every measurement runs in a fresh interpreter, the way a deploy restarts
+the bot:
+
+* `import <module>` for the bot and the CLIs (median of `--runs`), plus
+  which heavy packages (Binance client, Supabase, joblib, xgboost, ...)
+  the import pulled in;
+* time to the first decision: `import bot`, then the first `bot.tick` of
+  a synthetic replay (`replay.py`, no network) including the model load
+  and the history fetch.
+
+The result is compared with `bench_startup_baseline.json`; the exit code
+is 1 when an import or the first decision got slower by more than
+`--tolerance` (plus 0.05 s slack), or when a module imports a heavy
+package that its baseline import did not. Like `bench_tick.py`, the
+baseline is machine specific: refresh it with `--update`.
+
+Usage:
+    python bench_startup.py              # run and compare
+    python bench_startup.py --update     # run and write the baseline
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+BASELINE_PATH = 'bench_startup_baseline.json'
+MODEL_PATH = 'trading_brain_xgb.pkl'
+SLACK_S = 0.05
+MODULES = ['bot', 'scheduler', 'backtester', 'backtest', 'optimizer', 'migrate_logs', 'cleaner', 'brain']
+HEAVY = ['binance', 'supabase', 'realtime', 'joblib', 'xgboost', 'websockets', 'numba', 'pandas']
+SYMBOL = 'BTCUSDT'
+REPLAY_MINUTES = 600  # bot.HISTORY_CANDLES ajalugu + mõned küünlad
+
+_IMPORT = ("import sys, time, json; started = time.perf_counter(); import {module}; "
+           "print(json.dumps([time.perf_counter() - started, [m for m in {heavy!r} if m in sys.modules]]))")
+
+
+def _child(args):
+    out = subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_import(module, runs):
+    """Median seconds of `import module` in a fresh interpreter and the heavy packages it loaded."""
+    _child(['-c', _IMPORT.format(module=module, heavy=HEAVY)])  # soojendus: .pyc ja Numba vahemälu
+    results = [_child(['-c', _IMPORT.format(module=module, heavy=HEAVY)]) for _ in range(runs)]
+    return {'seconds': round(statistics.median(r[0] for r in results), 3), 'loads': results[-1][1]}
+
+
+def first_decision(path):
+    """Runs in the child: seconds from before `import bot` to the first decision."""
+    started = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+    import replay
+    data = replay.load(path, [SYMBOL])  # salvestuse lugemine ei kuulu mõõtmise sisse
+    loaded = time.perf_counter()
+    replay.replay(data, model_path=MODEL_PATH, limit=1)
+    decided = time.perf_counter()
+    return [imported - started + decided - loaded, imported - started]
+
+
+def measure_first_decision(runs):
+    import replay
+    path = tempfile.mkdtemp(prefix='bench-startup-')
+    try:
+        for symbol, d in replay.synthesize([SYMBOL], REPLAY_MINUTES).items():
+            replay.save(path, symbol, *d)
+        command = [os.path.abspath(__file__), '--child', path]
+        _child(command)
+        results = [_child(command) for _ in range(runs)]
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    return round(statistics.median(r[0] for r in results), 3)
+
+
+def run(runs):
+    return {
+        'machine': f"{platform.node()} {platform.machine()} {platform.python_version()}",
+        'runs': runs,
+        'imports': {m: measure_import(m, runs) for m in MODULES},
+        'first_decision_s': measure_first_decision(runs),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """List of regressions (empty when the run is within tolerance)."""
+    failures = []
+    for module, base in baseline['imports'].items():
+        now = current['imports'].get(module)
+        if now is None:
+            continue
+        if now['seconds'] > base['seconds'] * (1 + tolerance) + SLACK_S:
+            failures.append(f"import {module} {now['seconds']} s > {base['seconds']} s")
+        added = sorted(set(now['loads']) - set(base['loads']))
+        if added:
+            failures.append(f"import {module} laadib nüüd ka: {', '.join(added)}")
+    if current['first_decision_s'] > baseline['first_decision_s'] * (1 + tolerance) + SLACK_S:
+        failures.append(f"esimene otsus {current['first_decision_s']} s > {baseline['first_decision_s']} s")
+    return failures
+
+
+def report(result):
+    print(f"{'moodul':>14} {'import s':>9}  laaditud")
+    for module, r in result['imports'].items():
+        print(f"{module:>14} {r['seconds']:>9.3f}  {', '.join(r['loads']) or '-'}")
+    print(f"Esimene otsus (import bot + esimene tikk): {result['first_decision_s']:.3f} s")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        print(json.dumps(first_decision(sys.argv[2])))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update', action='store_true', help='kirjuta tulemus baseline failiks')
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    report(result)
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"Baseline kirjutatud: {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"Baseline puudub ({args.baseline}), käivita --update")
+        sys.exit(0)
+    with open(args.baseline) as f:
+        failures = compare(result, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSIOON: {failure}")
+    sys.exit(1 if failures else 0)
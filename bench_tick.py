@@ -0,0 +1,129 @@
+"""End-to-end tick benchmark on a deterministic replay, checked against a baseline.
+
+Replays a synthetic market (`replay.synthesize`, always the same data)
+through the real bot tick and reports ticks/second, per-stage latency
+and the memory each symbol keeps. The result is compared with
+`bench_tick_baseline.json`; the exit code is 1 when
+
+* ticks/second dropped by more than `--tolerance` (default 30%),
+* a stage p95 grew by more than `--tolerance` (plus 0.05 ms slack),
+* memory per symbol grew by more than `--tolerance`,
+* the decisions differ from the baseline with the same model file.
+
+The baseline is machine specific: refresh it with `--update` on the
+machine that runs the check, and commit it together with the change
+that moved the numbers.
+
+Usage:
+    python bench_tick.py                 # run and compare
+    python bench_tick.py --update        # run and write the baseline
+    python bench_tick.py --symbols 5 --hours 48
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import platform
+import tracemalloc
+import replay
+
+BASELINE_PATH = 'bench_tick_baseline.json'
+MODEL_PATH = 'trading_brain_xgb.pkl'
+SLACK_MS = 0.05
+MEMORY_TICKS = 200
+SYMBOL_NAMES = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'BNBUSDT', 'XRPUSDT', 'ADAUSDT', 'DOGEUSDT', 'AVAXUSDT']
+
+
+def _file_digest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def memory_per_symbol(data):
+    """Bytes the bot keeps per symbol (candle buffer, position, last data) after a short replay."""
+    import bot
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    replay.replay(data, model_path=MODEL_PATH, limit=MEMORY_TICKS)
+    bot.supabase.tables.clear()  # logiread on asendaja andmebaasis, mitte boti olekus
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, 'filename')
+                if not stat.traceback[0].filename.endswith(('replay.py', 'tracemalloc.py')))
+    return max(0, grown) / len(data)
+
+
+def run(symbols, hours, samples):
+    data = replay.synthesize(SYMBOL_NAMES[:symbols], int(hours * 60))
+    replay.replay(data, model_path=MODEL_PATH, limit=50)  # soojendus: Numba, mudel, vahemälud
+    result = replay.replay(data, samples=samples, model_path=MODEL_PATH)
+    return {
+        'machine': f"{platform.node()} {platform.machine()} {platform.python_version()}",
+        'params': {'symbols': symbols, 'hours': hours, 'samples': samples},
+        'ticks': result['ticks'],
+        'ticks_per_second': round(result['ticks_per_second'], 1),
+        'stages': {k: {q: round(v[q] * 1000, 4) for q in ('p50', 'p95', 'p99')}
+                   for k, v in sorted(result['stages'].items())},
+        'memory_per_symbol_kb': round(memory_per_symbol(data) / 1024, 1),
+        'actions': result['actions'],
+        'decisions_digest': result['decisions_digest'],
+        'model_digest': _file_digest(MODEL_PATH),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """List of regressions (empty when the run is within tolerance)."""
+    failures = []
+    if current['params'] != baseline['params']:
+        return [f"parameetrid erinevad baseline'ist ({baseline['params']}), võrdlus vahele jäetud"]
+    if current['ticks_per_second'] < baseline['ticks_per_second'] * (1 - tolerance):
+        failures.append(f"tikke/s {current['ticks_per_second']} < {baseline['ticks_per_second']}")
+    for stage, base in baseline['stages'].items():
+        now = current['stages'].get(stage)
+        if now and now['p95'] > base['p95'] * (1 + tolerance) + SLACK_MS:
+            failures.append(f"{stage} p95 {now['p95']} ms > {base['p95']} ms")
+    if current['memory_per_symbol_kb'] > baseline['memory_per_symbol_kb'] * (1 + tolerance):
+        failures.append(f"mälu sümboli kohta {current['memory_per_symbol_kb']} KB > {baseline['memory_per_symbol_kb']} KB")
+    if current['model_digest'] == baseline['model_digest'] and \
+            current['decisions_digest'] != baseline['decisions_digest']:
+        failures.append(f"otsused erinevad (sama mudel): {current['actions']} vs {baseline['actions']}")
+    return failures
+
+
+def report(result):
+    print(f"{result['ticks']} tikki, {result['ticks_per_second']} tikki/s, "
+          f"mälu {result['memory_per_symbol_kb']} KB/sümbol, otsused {result['actions']}")
+    print(f"{'etapp':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, s in result['stages'].items():
+        print(f"{stage:>12} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['p99']:>9.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=2)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--samples', type=int, default=1)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update', action='store_true', help='kirjuta tulemus baseline failiks')
+    args = parser.parse_args()
+
+    result = run(args.symbols, args.hours, args.samples)
+    report(result)
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"Baseline kirjutatud: {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"Baseline puudub ({args.baseline}), käivita --update")
+        sys.exit(0)
+    with open(args.baseline) as f:
+        failures = compare(result, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSIOON: {failure}")
+    sys.exit(1 if failures else 0)
@@ -1,114 +1,210 @@
 import os
 import time
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
-import joblib
 import logging
-from binance.client import Client
-from supabase import create_client
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from indicator_stream import IndicatorStream
+from model_registry import ModelRegistry
+from market_stream import MarketStream
+from log_writer import TradeLogWriter
+from candle_clock import CandleClock
+from ttl_cache import TTLCache, TableSubscription
+import features
+import metrics
 
-# 1. LOGIMISE SEADISTUS
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - [bot] %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Ühendused
-try:
-    client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
-    supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
-    logger.info("✅ Ühendused Binance'i ja Supabase'iga loodud.")
-except Exception as e:
-    logger.error(f"❌ Ühenduse viga: {e}")
+# Ühendused luuakse init()-is, mitte importimisel: tööriistad ja replay impordivad boti ilma võrguta
+client = None
+supabase = None
+
+def init(exchange=True, database=True):
+    """Create the Binance (`exchange`) and Supabase (`database`) clients that are not set yet."""
+    global client, supabase
+    try:
+        if exchange and client is None:
+            from binance.client import Client
+            # BINANCE_API_URL võimaldab suunata boti kohalikule fake_exchange.py serverile
+            client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'), ping=not os.getenv('BINANCE_API_URL'))
+            if os.getenv('BINANCE_API_URL'):
+                client.API_URL = os.getenv('BINANCE_API_URL')
+        if database and supabase is None:
+            from supabase import create_client
+            supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+        logger.info("✅ Ühendused Binance'i ja Supabase'iga loodud.")
+    except Exception as e:
+        logger.error(f"❌ Ühenduse viga: {e}")
 
 SYMBOL = 'BTCUSDT'
-last_buy_price = None
+HISTORY_CANDLES = 500
+streams = {}  # sümbol -> IndicatorStream
+timeframes = {}  # sümbol -> features.TimeframeStream (kui FEATURE_TIMEFRAMES on seatud)
+models = ModelRegistry('trading_brain_xgb.pkl')
+market_stream = None  # MarketStream, käivitatakse run_bot-is
+_last_data = {}  # sümbol -> viimase töödeldud küünla (aeg, close, volume)
+# Logid kirjutatakse taustalõimes partiidena, andmebaasi katkestuse ajal kettale
+def _insert_logs(rows):
+    with metrics.timer('log_insert'):
+        supabase.table("trade_logs").insert(rows).execute()
 
-def get_bot_settings():
-    try:
+log_writer = TradeLogWriter(_insert_logs)
+
+class Position:
+    """Ühe sümboli positsiooni olek (varem globaalne last_buy_price)."""
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.last_buy_price = None
+
+positions = {}  # sümbol -> Position
+
+def get_position(symbol):
+    return positions.setdefault(symbol, Position(symbol))
+
+DEFAULT_SETTINGS = {"stop_loss": -2.0, "take_profit": 3.0, "min_ai_confidence": 0.6}
+SETTINGS_TTL = float(os.getenv('SETTINGS_TTL', '60'))  # sekundit; muudatuste tellimusega jõuavad muudatused kohe
+ORDER_BOOK_TTL = float(os.getenv('ORDER_BOOK_TTL', '5'))  # sekundit, ainult kui turuvoog ei tööta
+settings_subscription = None  # TableSubscription, käivitatakse start_cache-is
+
+def _load_settings():
+    with metrics.timer('settings'):
         res = supabase.table("bot_settings").select("*").eq("id", 1).single().execute()
-        return res.data if res.data else {"stop_loss": -2.0, "take_profit": 3.0, "min_ai_confidence": 0.6}
-    except:
-        return {"stop_loss": -2.0, "take_profit": 3.0, "min_ai_confidence": 0.6}
+    if not res.data:
+        raise ValueError("bot_settings rida id=1 puudub")
+    return res.data
+
+def _load_order_book(symbol):
+    with metrics.timer('order_book'):
+        depth = client.get_order_book(symbol=symbol, limit=10)
+    bids = sum([float(p) * float(q) for p, q in depth['bids']])
+    asks = sum([float(p) * float(q) for p, q in depth['asks']])
+    return bids / asks
+
+# Seaded ja order book'i surve tulevad vahemälust; vea korral viimane hea väärtus, mitte vaikeväärtus
+cache = TTLCache(clock=lambda: now_ms() / 1000)
+cache.register('settings', _load_settings, SETTINGS_TTL, default=DEFAULT_SETTINGS)
+# Order book'i loetakse igal tikil: taustavärskendus tooks ainult lisapäringuid (rate limit), seega read-through
+cache.register('order_book', _load_order_book, ORDER_BOOK_TTL, default=1.0, keep_warm=0)
+
+def get_bot_settings():
+    return cache.get('settings')
 
 # 2. ANDMETE KOGUMINE JA INDIKAATORID
-def get_market_data(symbol):
+def now_ms():
+    # replay.py asendab selle oma virtuaalse kellaga
+    return int(time.time() * 1000)
+
+def get_market_data(symbol, close=None):
+    """Candles with indicators; at a candle close (`close` = boundary in ms) only the closed ones."""
     try:
-        # Tõmbame piisavalt andmeid, et indikaatorid (eriti EMA200) arvutuksid õigesti
-        klines = client.get_historical_klines(symbol, '1m', "500 minutes ago UTC")
-        df = pd.DataFrame(klines, columns=['time', 'open', 'high', 'low', 'close', 'volume', '_', '_', '_', '_', '_', '_'])
-        df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].apply(pd.to_numeric)
-        
-        # --- TEHNILINE ANALÜÜS ---
-        
-        # RSI ja MACD
-        df['rsi'] = ta.rsi(df['close'], length=14)
-        macd = ta.macd(df['close'])
-        df['macd'] = macd.iloc[:, 0]
-        df['macd_signal'] = macd.iloc[:, 2]
-        
-        # Bollinger Bands (Sinu pildil olid need NULL-id, parandame siin)
-        bbands = ta.bbands(df['close'], length=20, std=2)
-        if bbands is not None:
-            df['bb_lower'] = bbands.iloc[:, 0]
-            df['bb_upper'] = bbands.iloc[:, 2]
+        if market_stream is not None and market_stream.is_live(symbol):
+            with metrics.timer('indicators'):
+                df = market_stream.frame(symbol)
         else:
-            df['bb_lower'] = df['close'] * 0.98 # Avarii-väärtus, et vältida NULL-i
-            df['bb_upper'] = df['close'] * 1.02
-
-        # VWAP (Vajab ajaindeksit)
-        df['time_dt'] = pd.to_datetime(df['time'], unit='ms')
-        df.set_index('time_dt', inplace=True)
-        df['vwap'] = ta.vwap(df['high'], df['low'], df['close'], df['volume'])
-        df.reset_index(inplace=True)
-        
-        # Stochastic Oscillator
-        stoch = ta.stoch(df['high'], df['low'], df['close'])
-        if stoch is not None:
-            df['stoch_k'] = stoch.iloc[:, 0]
-            df['stoch_d'] = stoch.iloc[:, 1]
-        
-        # ATR ja EMA
-        df['atr'] = ta.atr(df['high'], df['low'], df['close'], length=14)
-        df['ema200'] = ta.ema(df['close'], length=200)
-        
+            df = _get_market_data_rest(symbol)
+        if close is not None:
+            df = closed_candles(df, close)
+        metrics.gauge('candle_age_seconds', (now_ms() - candle_end(df, close)) / 1000, symbol=symbol)
+        if features.TIMEFRAMES:
+            with metrics.timer('indicators'):
+                df = add_timeframe_features(symbol, df)
+        # Üks surve väärtus tiku kohta, et analyze_signals ja log_to_supabase näeksid sama numbrit
+        df['market_pressure'] = float('nan')
+        df.loc[df.index[-1], 'market_pressure'] = get_order_book_status(symbol)
         return df
     except Exception as e:
+        metrics.inc('market_data_errors_total', symbol=symbol)
         logger.error(f"❌ Viga indikaatorite arvutamisel: {e}")
         return None
 
+def closed_candles(df, close):
+    # Sulgemise tikil otsustatakse sulgunud küünla pealt: just avanenud (sekundi vanune) küünal jääb välja
+    n = int(np.searchsorted(df['time'].to_numpy(), close))
+    return df if n == len(df) else df.iloc[:n].copy()
+
+def candle_end(df, close=None):
+    """Time (ms) the last row's data is from: its close on close ticks, else its open."""
+    return int(df['time'].iloc[-1]) + (60_000 if close is not None else 0)
+
+def _get_market_data_rest(symbol):
+    stream = streams.get(symbol)
+    last = stream.last_time if stream is not None else None
+    missing = (now_ms() - last) // 60_000 + 1 if last else None
+
+    if missing is None or missing >= HISTORY_CANDLES:
+        # Esimene käivitus või liiga suur auk: tõmbame piisavalt andmeid, et indikaatorid (eriti EMA200) arvutuksid õigesti
+        with metrics.timer('klines'):
+            # Algus millisekundites: tekstiline "500 minutes ago UTC" laadis esimesel tikil dateparseri (~1 s)
+            klines = client.get_historical_klines(symbol, '1m', now_ms() - HISTORY_CANDLES * 60_000)
+        stream = streams[symbol] = IndicatorStream(size=HISTORY_CANDLES)
+    else:
+        # Ainult viimane (kujunev) küünal ja vahepeal sulgunud küünlad
+        with metrics.timer('klines'):
+            klines = client.get_klines(symbol=symbol, interval='1m', limit=int(missing) + 1)
+    with metrics.timer('indicators'):
+        stream.extend(klines)
+        return stream.to_frame()
+
+def add_timeframe_features(symbol, df):
+    """`df` with the higher-timeframe columns (last row), from the closed 1m candles in it."""
+    now = now_ms()
+    tf = timeframes.get(symbol)
+    first = int(df['time'].iloc[0])
+    if tf is None or tf.last_time is None or tf.last_time + 60_000 < first:
+        # Esimene kord või auk suurem kui puhver: kõrgemad ajaraamid üks kord Binance'ist
+        tf = timeframes[symbol] = features.TimeframeStream().seed(client, symbol, now)
+    # Tavaliselt üks uus suletud küünal tiku kohta
+    times = df['time'].to_numpy()
+    start = int(np.searchsorted(times, tf.last_time, side='right')) if tf.last_time is not None else 0
+    stop = int(np.searchsorted(times, now - 60_000, side='right'))
+    if stop > start:
+        rows = np.column_stack([df[c].to_numpy()[start:stop] for c in ('time', 'open', 'high', 'low', 'close', 'volume')])
+        for row in rows:
+            tf.update(row)
+    # Üks plokk (veergude kaupa lisamine on pandas'es aeglane); väärtus ainult viimasel real nagu market_pressure
+    values = tf.values()
+    block = np.full((len(df), len(values)), np.nan)
+    block[-1] = list(values.values())
+    return pd.concat([df, pd.DataFrame(block, columns=list(values), index=df.index)], axis=1)
+
 def get_order_book_status(symbol):
-    try:
-        depth = client.get_order_book(symbol=symbol, limit=10)
-        bids = sum([float(p) * float(q) for p, q in depth['bids']])
-        asks = sum([float(p) * float(q) for p, q in depth['asks']])
-        return bids / asks
-    except: return 1.0
+    if market_stream is not None and market_stream.is_live(symbol):
+        return market_stream.pressure(symbol)
+    return cache.get('order_book', symbol)
+
+def _tick_pressure(curr, symbol):
+    # get_market_data salvestab surve viimasele reale; vanemad kutsujad (backtester) seda ei tee
+    pressure = curr.get('market_pressure')
+    return get_order_book_status(symbol) if pressure is None or pd.isna(pressure) else pressure
 
 # 3. OTSUSTAMISE LOOGIKA
-def analyze_signals(df):
-    global last_buy_price
-    settings = get_bot_settings()
+def analyze_signals(df, position=None, settings=None):
+    # Mitme sümboli korral annab ajastaja kaasa sümboli positsiooni ja jagatud seaded
+    position = position or get_position(SYMBOL)
+    settings = settings or get_bot_settings()
     
     curr = df.iloc[-1]
     price = curr['close']
     
     # Algsätted
     prediction = 0.5
-    pressure = get_order_book_status(SYMBOL)
+    pressure = _tick_pressure(curr, position.symbol)
     
-    # Mudeli laadimine
-    if os.path.exists('trading_brain_xgb.pkl'):
+    # Mudel on mälus, uus versioon laaditakse alles siis kui brain.py selle avaldab
+    with metrics.timer('model_load'):
+        predictor = models.predictor()
+    if predictor is not None:
         try:
-            model = joblib.load('trading_brain_xgb.pkl')
-            # NB! Peab ühtima brain.py features listiga
-            features = [
-                float(price), float(curr['rsi']), float(curr['macd']), float(curr['macd_signal']),
-                float(curr['vwap']), float(curr['stoch_k']), float(curr['stoch_d']),
-                float(curr['atr']), float(curr['ema200']), float(pressure)
-            ]
-            prediction = model.predict_proba([features])[0][1]
+            with metrics.timer('inference'):
+                # Veergude järjekord tuleb features registrist (sama mis brain.py ja backtester)
+                # Oma rida igale kutsele: ajastaja lõimed jagavad sama Predictor-it
+                row = predictor.new_row()
+                for i, col in enumerate(features.columns(predictor.n_features)):
+                    row[i] = pressure if col == 'market_pressure' else curr.get(col, float('nan'))
+                prediction = predictor.predict_one(row)
         except Exception as e:
             logger.warning(f"Mudeli ennustus ebaõnnestus: {e}")
 
@@ -117,20 +213,20 @@ def analyze_signals(df):
     pnl = 0
 
     # OSTMINE
-    if last_buy_price is None:
+    if position.last_buy_price is None:
         threshold = float(settings.get('min_ai_confidence', 0.6))
         if prediction >= threshold and curr['stoch_k'] < 30:
             action = "BUY"
-            last_buy_price = price
+            position.last_buy_price = price
             summary = f"🚀 BUY | AI:{prediction:.2f} | Stoch:{curr['stoch_k']:.1f}"
 
     # MÜÜMINE
-    elif last_buy_price is not None:
-        pnl = ((price - last_buy_price) / last_buy_price) * 100
+    elif position.last_buy_price is not None:
+        pnl = ((price - position.last_buy_price) / position.last_buy_price) * 100
         if pnl <= float(settings.get('stop_loss', -2.0)) or pnl >= float(settings.get('take_profit', 3.0)):
             action = "SELL"
             summary = f"💰 SELL | PnL:{pnl:.2f}%"
-            last_buy_price = None
+            position.last_buy_price = None
 
     if action == "HOLD":
         summary = f"HOLD | Price:{price} | AI:{prediction:.2f} | Stoch:{curr['stoch_k']:.1f}"
@@ -138,17 +234,19 @@ def analyze_signals(df):
     return action, summary, pnl, prediction
 
 # 4. SALVESTAMINE
-def log_to_supabase(action, df, pnl, summary, prediction):
+def log_to_supabase(action, df, pnl, summary, prediction, symbol=SYMBOL):
     try:
         curr = df.iloc[-1]
-        pressure = get_order_book_status(SYMBOL)
+        pressure = _tick_pressure(curr, symbol)
         
         # Kontrollime väärtusi enne saatmist (pd.isna asendab NULL-id 0.0-ga)
         def clean(val):
             return float(val) if not pd.isna(val) else 0.0
 
         data = {
-            "symbol": SYMBOL,
+            # Aeg logimise hetkest, mitte andmebaasi vaikeväärtusest: kettalt hiljem saadetud read säilitavad oma aja
+            "created_at": datetime.fromtimestamp(now_ms() / 1000, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            "symbol": symbol,
             "action": action,
             "price": clean(curr['close']),
             "rsi": clean(curr['rsi']),
@@ -165,30 +263,98 @@ def log_to_supabase(action, df, pnl, summary, prediction):
             "pnl": float(pnl),
             "analysis_summary": summary,
             "market_pressure": clean(pressure),
-            "ai_prediction": float(prediction)
+            "ai_prediction": float(prediction),
+            # Soojenemata kõrgema ajaraami väärtus jääb NULL-iks, et brain.py näeks puuduvat väärtust, mitte 0
+            **{col: None if pd.isna(curr.get(col)) else float(curr[col]) for col in features.TIMEFRAME_COLUMNS},
         }
-        supabase.table("trade_logs").insert(data).execute()
+        log_writer.write(data)
     except Exception as e:
         logger.error(f"❌ Logimise viga: {e}")
 
+def start_market_stream(symbols):
+    global market_stream
+    if os.getenv('MARKET_STREAM', '1') != '0':
+        market_stream = MarketStream(client, symbols, os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')).start()
+    return market_stream
+
+def start_cache():
+    """Background refresh of cached settings/order book plus the `bot_settings` change subscription."""
+    global settings_subscription
+    cache.start()
+    if os.getenv('SETTINGS_REALTIME', '1') != '0' and os.getenv('SUPABASE_URL'):
+        settings_subscription = TableSubscription(
+            os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'), 'bot_settings',
+            on_change=lambda row: cache.set('settings', row) if row.get('id') == 1 else None,
+            filter='id=eq.1').start()
+    return cache
+
+def start_metrics():
+    """Metrics endpoint on METRICS_PORT (0 = off) plus log writer and stream gauges."""
+    metrics.register_collector(lambda: {f'log_{k}': v for k, v in log_writer.stats().items()})
+    metrics.register_collector(lambda: {
+        'stream_reconnects': market_stream.reconnects if market_stream is not None else None,
+        'model_load_seconds': models.load_seconds,
+        'settings_subscribed': int(settings_subscription.connected) if settings_subscription is not None else None,
+    })
+    port = int(os.getenv('METRICS_PORT', '9101'))
+    if port:
+        try:
+            metrics.serve(port, os.getenv('METRICS_HOST', '127.0.0.1'))
+        except OSError as e:
+            logger.warning(f"Mõõdikute server ei käivitunud: {e}")
+
+def has_new_data(symbol, df):
+    """False when the last candle is unchanged since the previous tick (nothing to decide)."""
+    last = df.iloc[-1]
+    key = (last['time'], last['close'], last['volume'])
+    if _last_data.get(symbol) == key:
+        metrics.inc('ticks_skipped_total', symbol=symbol)
+        return False
+    _last_data[symbol] = key
+    return True
+
+def last_candle_time(symbol):
+    """Open time (ms) of the last candle a tick decided on, None before the first."""
+    last = _last_data.get(symbol)
+    return None if last is None else int(last[0])
+
+def tick(symbol=SYMBOL, settings=None, close=None):
+    """One decision for `symbol`: (action, summary), or None when there was no new data.
+
+    `close` is the candle boundary (ms) on candle-close ticks, see `get_market_data`.
+    """
+    df = get_market_data(symbol, close)
+    if df is None or not has_new_data(symbol, df):
+        return None
+    action, summary, pnl, prediction = analyze_signals(df, get_position(symbol), settings)
+    log_to_supabase(action, df, pnl, summary, prediction, symbol)
+    return action, summary
+
 def run_bot():
+    init()
     logger.info(f"🤖 Bot V2.1 käivitatud sümbooliga {SYMBOL}")
+    start_metrics()
+    start_cache()
+    start_market_stream([SYMBOL])
+    # Tikid küünla sulgemisel (börsi ajas), mitte fikseeritud 30s pausiga
+    clock = CandleClock(client, market_stream, [SYMBOL])
     while True:
         try:
-            df = get_market_data(SYMBOL)
-            if df is not None:
-                action, summary, pnl, prediction = analyze_signals(df)
-                log_to_supabase(action, df, pnl, summary, prediction)
-                
-                if action != "HOLD": 
-                    logger.info(f"🔔 TEHING: {summary}")
-                else:
-                    print(f"[{time.strftime('%H:%M:%S')}] {summary}", end='\r')
-            
-            time.sleep(30)
+            point, closed = clock.wait()
+            with metrics.tick(SYMBOL):
+                result = tick(SYMBOL, close=point if closed else None)
+                if result is None:
+                    continue
+                action, summary = result
+                metrics.observe('decision_latency', clock.latency(point))
+
+            if action != "HOLD": 
+                logger.info(f"🔔 TEHING: {summary}")
+            else:
+                print(f"[{time.strftime('%H:%M:%S')}] {summary}", end='\r')
         except Exception as e:
             logger.error(f"Põhitsükli viga: {e}")
-            time.sleep(10)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [bot] %(message)s')
     run_bot()
\ No newline at end of file
@@ -1,88 +1,369 @@
 import os
+import sys
 import time
-import pandas as pd
-import joblib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+import numpy as np
 from xgboost import XGBClassifier
-from supabase import create_client
 from dotenv import load_dotenv
+from model_registry import ModelRegistry, publish_model
+from feature_cache import FeatureCache
+import features
 import logging
 
-# LOGIMISE SEADISTUS
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - [brain] %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-try:
-    supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
-    logger.info("✅ Supabase ühendus loodud.")
-except Exception as e:
-    logger.error(f"❌ Supabase ühenduse viga: {e}")
+# Luuakse init()-is: otsingu töölisprotsessid impordivad selle mooduli ega vaja ühendust ega vahemälu
+supabase = None
+cache = None
 
 TRAIN_INTERVAL = 60 # Kontrollime iga minuti järel
+SYMBOL = 'BTCUSDT'
+HORIZON = 5          # sihtmärk: hind 5 rida hiljem
+WINDOW = 200_000     # nullist treenimise libisev aken (ridu)
+INCREMENT_TREES = 20 # puid ühe jätkamise kohta
+MAX_TREES = 500      # rohkem puid -> treenime aknal uuesti nullist
+MIN_NEW_ROWS = 50
+# Hüperparameetrite otsing (python brain.py --search)
+DEFAULT_PARAMS = {'learning_rate': 0.05, 'max_depth': 5}
+SEARCH_CANDIDATES = 16
+SEARCH_FOLDS = 4
+SEARCH_BUDGET = 900      # sekundit kogu otsingule; üle selle jäänud ülesanded tühistatakse
+EARLY_STOPPING = 30      # vooru ilma valideerimise paranemiseta
+HOLDOUT = 0.15           # viimane osa ridadest, mida otsing ei näe
+MIN_GAIN = 0.001         # logloss, mille võrra kandidaat peab praegusest mudelist parem olema
+
+models = ModelRegistry('trading_brain_xgb.pkl')
+
+def init():
+    """Open the Supabase client and the feature cache (once)."""
+    global supabase, cache
+    if supabase is None:
+        try:
+            from supabase import create_client
+            supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+            logger.info("✅ Supabase ühendus loodud.")
+        except Exception as e:
+            logger.error(f"❌ Supabase ühenduse viga: {e}")
+    if cache is None:
+        cache = FeatureCache(SYMBOL)
+
+def labelled(start, stop):
+    """float32 tunnused ja sihtmärk ridadele [start, stop) (vajab HORIZON rida tulevikku)."""
+    data = cache.matrix(start, stop + HORIZON)
+    price = data[:, 0]
+    # Target: Kas hind tõusis järgmise 5 minuti jooksul?
+    y = (price[HORIZON:] > price[:-HORIZON]).astype(np.int32)
+    X = data[:-HORIZON]
+    # Kõrgema ajaraami veerud võivad puududa (vanemad logid); XGBoost käsitleb NaN-i ise
+    keep = ~np.isnan(X[:, :len(features.BASE)]).any(axis=1)
+    return np.ascontiguousarray(X[keep]), y[keep]
+
+def new_model(n_estimators, params=None, **kwargs):
+    # Viimase otsingu võitja parameetrid (kui otsing on jooksnud), muidu vaikimisi
+    params = params or cache.meta.get('params') or DEFAULT_PARAMS
+    return XGBClassifier(
+        n_estimators=n_estimators, 
+        random_state=42,
+        objective='binary:logistic',
+        **params,
+        **kwargs
+    )
 
 def train_ai_model():
+    init()
     logger.info("🧠 Kontrollin andmeid uue mudeli jaoks...")
     try:
-        # PÄRING: Võtame ainult need read, kus MACD ja STOCH on olemas (ignoreerime Bollingeri)
-        res = supabase.table("trade_logs") \
-            .select("*") \
-            .not_.is_("macd", "null") \
-            .not_.is_("stoch_k", "null") \
-            .not_.is_("vwap", "null") \
-            .order("created_at", desc=True) \
-            .limit(1000) \
-            .execute()
-        
-        if not res.data or len(res.data) < 15:
-            logger.info(f"Ootel: Vaja on vähemalt 15 rida uute andmetega. Hetkel leitud: {len(res.data) if res.data else 0}")
+        # Ainult uued read pärast viimast watermark'i ja ainult tunnuste veerud
+        cache.sync(supabase)
+        ready = len(cache) - HORIZON  # nii palju ridu on sihtmärgiga
+        if ready < 10:
+            logger.info(f"Ootel: Vaja on vähemalt 15 rida uute andmetega. Hetkel leitud: {len(cache)}")
             return False
 
-        df = pd.DataFrame(res.data)
-        
-        # Target: Kas hind tõusis järgmise 5 minuti jooksul?
-        df = df.sort_values('created_at')
-        df['target'] = (df['price'].shift(-5) > df['price']).astype(int)
-        
-        # Kasutame ainult neid tunnuseid, mis su pildil olid täidetud
-        features = [
-            'price', 'rsi', 'macd', 'macd_signal', 
-            'vwap', 'stoch_k', 'stoch_d', 'atr', 'ema200',
-            'market_pressure'
-        ]
-        
-        # Puhastame ainult nende tunnuste põhjal
-        train_df = df.dropna(subset=features + ['target'])
-        
-        if len(train_df) < 10:
-            logger.info(f"Pärast puhastust jäi liiga vähe ridu ({len(train_df)}). Ootame veel andmeid.")
-            # Prindime välja, mis täpselt puudu on, et debugida
-            missing = df[features].isnull().sum()
-            logger.info(f"Puuduvad väärtused: \n{missing[missing > 0]}")
+        trained = cache.meta.get('trained_rows', 0)
+        previous = models.get()
+        started = time.perf_counter()
+
+        if previous is not None and trained and ready - trained < MIN_NEW_ROWS:
+            logger.info(f"Ootel: {ready - trained} uut rida, jätkamiseks on vaja {MIN_NEW_ROWS}.")
+            return False
+
+        if previous is not None and trained and \
+                getattr(previous, 'n_features_in_', None) == len(features.COLUMNS) and \
+                previous.get_booster().num_boosted_rounds() + INCREMENT_TREES <= MAX_TREES:
+            # Jätkame eelmise mudeli boostimist ainult uute ridadega
+            X, y = labelled(trained, ready)
+            mode = f"jätkatud (+{INCREMENT_TREES} puud)"
+            model = new_model(INCREMENT_TREES)
+            fit_args = {'xgb_model': previous.get_booster()}
+        else:
+            # Esimene kord, puid liiga palju või muutunud tunnused: treenime nullist libiseval aknal
+            X, y = labelled(max(0, ready - WINDOW), ready)
+            mode = "nullist"
+            model = new_model(cache.meta.get('trees', 100))
+            fit_args = {}
+
+        if len(X) < 10 or len(np.unique(y)) < 2:
+            logger.info(f"Pärast puhastust jäi liiga vähe ridu ({len(X)}) või ainult üks klass. Ootame veel andmeid.")
             return False
 
-        X = train_df[features]
-        y = train_df['target']
-
-        # XGBoost mudel
-        model = XGBClassifier(
-            n_estimators=100, 
-            learning_rate=0.05, 
-            max_depth=5, 
-            random_state=42,
-            objective='binary:logistic'
-        )
-        model.fit(X, y)
+        model.fit(X, y, **fit_args)
         
-        joblib.dump(model, 'trading_brain_xgb.pkl')
-        logger.info(f"🚀 UUS XGBOOST MUDEL LOODUD! Treenitud {len(X)} rea põhjal.")
+        # Ajutine fail + rename, et bot ei loeks kunagi poolikut pickle'it
+        version = publish_model(model, 'trading_brain_xgb.pkl')
+        cache.save_meta(trained_rows=ready)
+        logger.info(f"🚀 UUS XGBOOST MUDEL LOODUD ({version}, {mode})! Treenitud {len(X)} rea põhjal "
+                    f"{time.perf_counter() - started:.1f}s, vahemälus kokku {len(cache)} rida.")
         return True
         
     except Exception as e:
         logger.error(f"Viga treenimisel: {e}")
         return False
 
-if __name__ == "__main__":
+# --- Hüperparameetrite otsing ja ajaline ristvalideerimine ---
+
+_shared = {}
+
+
+def random_params(n, seed=0):
+    """`n` parameter sets; the first one is the current default."""
+    rng = np.random.default_rng(seed)
+    out = [dict(DEFAULT_PARAMS)]
+    for _ in range(n - 1):
+        out.append({
+            'learning_rate': float(np.round(np.exp(rng.uniform(np.log(0.01), np.log(0.2))), 4)),
+            'max_depth': int(rng.integers(3, 9)),
+            'min_child_weight': float(np.round(np.exp(rng.uniform(0, np.log(20))), 2)),
+            'subsample': float(np.round(rng.uniform(0.6, 1.0), 2)),
+            'colsample_bytree': float(np.round(rng.uniform(0.6, 1.0), 2)),
+            'reg_lambda': float(np.round(np.exp(rng.uniform(np.log(0.5), np.log(10))), 2)),
+        })
+    return out
+
+
+def walk_forward_folds(n, folds):
+    """(train_start, train_stop, valid_start, valid_stop) per fold, expanding window.
+
+    HORIZON rows between train and validation are dropped: their labels
+    look into the validation segment.
+    """
+    bounds = np.linspace(0, n, folds + 2).astype(int)
+    out = []
+    for k in range(1, folds + 1):
+        stop = bounds[k] - HORIZON
+        out.append((max(0, stop - WINDOW), stop, bounds[k], bounds[k + 1]))
+    return out
+
+
+def logloss(y, p):
+    p = np.clip(p, 1e-7, 1 - 1e-7)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def _attach(names, shapes, nthread):
+    shms = [shared_memory.SharedMemory(name=n) for n in names]
+    _shared.update(shms=shms, nthread=nthread,
+                   X=np.ndarray(shapes[0], dtype=np.float32, buffer=shms[0].buf),
+                   y=np.ndarray(shapes[1], dtype=np.int32, buffer=shms[1].buf))
+
+
+def _fit_fold(task):
+    """Fit one candidate on one fold with early stopping; runs in a pool worker."""
+    candidate, fold, params, (lo, hi, vlo, vhi) = task
+    X, y = _shared['X'], _shared['y']
+    started = time.perf_counter()
+    model = XGBClassifier(n_estimators=MAX_TREES, random_state=42, objective='binary:logistic',
+                          eval_metric='logloss', early_stopping_rounds=EARLY_STOPPING,
+                          n_jobs=_shared['nthread'], **params)
+    model.fit(X[lo:hi], y[lo:hi], eval_set=[(X[vlo:vhi], y[vlo:vhi])], verbose=False)
+    p = model.predict_proba(X[vlo:vhi])[:, 1]
+    return {'candidate': candidate, 'fold': fold, 'trees': model.best_iteration + 1,
+            'logloss': logloss(y[vlo:vhi], p), 'accuracy': float(np.mean((p >= 0.5) == y[vlo:vhi])),
+            'seconds': time.perf_counter() - started}
+
+
+def _collect(future, task, results):
+    """Append the fold result, or a failure record for the task when the fit raised."""
+    if future.cancelled():
+        return {'candidate': task[0], 'fold': task[1]}
+    try:
+        r = future.result()
+    except Exception as e:
+        r = {'candidate': task[0], 'fold': task[1], 'error': str(e)}
+        logger.warning(f"  kandidaat {task[0]:>2} fold {task[1]}: viga ({e}), kandidaat jääb välja")
+    results.append(r)
+    return r
+
+
+def cross_validate(X, y, candidates, folds=SEARCH_FOLDS, workers=None, budget=SEARCH_BUDGET):
+    """Run every (candidate, fold) in a process pool; returns the finished fold results.
+
+    Workers * XGBoost threads per worker never exceeds the core count.
+    Tasks still queued when `budget` seconds have passed are cancelled.
+    A fold that raises is returned as `{'candidate', 'fold', 'error'}` and
+    the candidate's remaining folds are cancelled.
+    """
+    splits = walk_forward_folds(len(X), folds)
+    tasks = [(c, f, params, split) for c, params in enumerate(candidates) for f, split in enumerate(splits)]
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, cores, len(tasks)))
+    nthread = max(1, cores // workers)
+    logger.info(f"🔎 Otsing: {len(candidates)} kandidaati x {folds} fold'i, {workers} protsessi x {nthread} lõime, "
+                f"eelarve {budget}s")
+    shms = [shared_memory.SharedMemory(create=True, size=max(1, a.nbytes)) for a in (X, y)]
+    results = []
+    started = time.perf_counter()
+    try:
+        np.ndarray(X.shape, dtype=np.float32, buffer=shms[0].buf)[:] = X
+        np.ndarray(y.shape, dtype=np.int32, buffer=shms[1].buf)[:] = y
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=([s.name for s in shms], (X.shape, y.shape), nthread)) as pool:
+            futures = {pool.submit(_fit_fold, t): t for t in tasks}
+            pending = set(futures)
+            while pending:
+                left = budget - (time.perf_counter() - started)
+                done, pending = wait(pending, timeout=max(0.0, left), return_when=FIRST_COMPLETED)
+                for future in done:
+                    r = _collect(future, futures[future], results)
+                    if 'error' in r:
+                        # Ühe fold'i viga välistab ainult selle kandidaadi, tema ülejäänud fold'e pole vaja
+                        for other in pending:
+                            if futures[other][0] == r['candidate']:
+                                other.cancel()
+                    elif not future.cancelled():
+                        logger.info(f"  kandidaat {r['candidate']:>2} fold {r['fold']}: logloss {r['logloss']:.4f} "
+                                    f"täpsus {r['accuracy']:.3f} puid {r['trees']:>3} {r['seconds']:.1f}s")
+                if left <= 0 and pending:
+                    cancelled = sum(f.cancel() for f in pending)
+                    logger.warning(f"⏱️ Eelarve täis: {cancelled} ülesannet tühistati, ootan käimasolevaid")
+                    for future in pending:
+                        if not future.cancelled():
+                            _collect(future, futures[future], results)
+                    break
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def summarize_folds(results, candidates, folds):
+    """Mean logloss per candidate that finished all folds without errors, best first; logs per-fold timing."""
+    failed = {r['candidate'] for r in results if 'error' in r}
+    if failed:
+        logger.warning(f"Kandidaadid {sorted(failed)} ebaõnnestusid ja jäävad pingereast välja.")
+    results = [r for r in results if 'error' not in r]
+    for fold in range(folds):
+        seconds = [r['seconds'] for r in results if r['fold'] == fold]
+        if seconds:
+            logger.info(f"⏱️ Fold {fold}: {len(seconds)} fitti, keskmiselt {np.mean(seconds):.1f}s, "
+                        f"max {np.max(seconds):.1f}s")
+    ranking = []
+    for c, params in enumerate(candidates):
+        rs = [r for r in results if r['candidate'] == c]
+        if len(rs) == folds and c not in failed:
+            ranking.append({'candidate': c, 'params': params,
+                            'logloss': float(np.mean([r['logloss'] for r in rs])),
+                            'accuracy': float(np.mean([r['accuracy'] for r in rs])),
+                            'trees': int(np.mean([r['trees'] for r in rs]))})
+    return sorted(ranking, key=lambda r: r['logloss'])
+
+
+def current_holdout_loss(current, X, y, Xh, yh, holdout):
+    """Holdout logloss of the current model, never measured on rows it was trained on.
+
+    The published model is scored as is only when all its training rows
+    lie before the holdout. Otherwise (`train_ai_model` has continued it on
+    newer rows, or its features no longer match) its parameters and tree
+    count are refitted on the search's training rows `X, y`, like the
+    candidate. None when that fails too.
+    """
+    trained = cache.meta.get('trained_rows', 0)
+    if trained and trained <= holdout - HORIZON:
+        try:
+            return logloss(yh, current.predict_proba(Xh)[:, 1])
+        except Exception as e:
+            logger.warning(f"Praegust mudelit ei saanud holdout'il hinnata ({e}), treenin tema parameetritega uuesti")
+    else:
+        logger.info(f"Praegune mudel on treenitud {trained} real (holdout algab {holdout}. reast), "
+                    f"võrdlen tema parameetritega samal treeningosal treenitud mudeliga")
+    try:
+        refit = new_model(cache.meta.get('trees', 100), n_jobs=os.cpu_count())
+        refit.fit(X, y)
+        return logloss(yh, refit.predict_proba(Xh)[:, 1])
+    except Exception as e:
+        logger.error(f"Praeguste parameetritega mudelit ei saanud treenida: {e}")
+        return None
+
+
+def search(candidates=SEARCH_CANDIDATES, folds=SEARCH_FOLDS, workers=None, budget=SEARCH_BUDGET, seed=0):
+    """Walk-forward CV search; publishes the winner only if it beats the current model on the holdout."""
+    init()
+    cache.sync(supabase)
+    ready = len(cache) - HORIZON
+    start = max(0, ready - WINDOW)
+    holdout = ready - int((ready - start) * HOLDOUT)
+    X, y = labelled(start, holdout - HORIZON)
+    Xh, yh = labelled(holdout, ready)
+    if len(X) < (folds + 1) * 50 or len(Xh) < 50 or len(np.unique(y)) < 2:
+        logger.info(f"Otsinguks on liiga vähe ridu ({len(X)} + {len(Xh)} holdout).")
+        return False
+    started = time.perf_counter()
+    params = random_params(candidates, seed)
+    ranking = summarize_folds(cross_validate(X, y, params, folds, workers, budget), params, folds)
+    if not ranking:
+        logger.warning("Ükski kandidaat ei jõudnud eelarve piires kõiki fold'e läbida.")
+        return False
+    best = ranking[0]
+    logger.info(f"🏆 Parim kandidaat {best['candidate']}: CV logloss {best['logloss']:.4f}, "
+                f"täpsus {best['accuracy']:.3f}, {best['trees']} puud, {best['params']}")
+
+    # Lõplik mudel kõigil ridadel enne holdout'i, puude arv fold'ide early stopping'ust
+    fit_started = time.perf_counter()
+    model = new_model(max(1, best['trees']), best['params'], n_jobs=os.cpu_count())
+    model.fit(X, y)
+    candidate_loss = logloss(yh, model.predict_proba(Xh)[:, 1])
+    logger.info(f"⏱️ Lõplik treenimine {time.perf_counter() - fit_started:.1f}s")
+
+    current = models.get()
+    current_loss = current_holdout_loss(current, X, y, Xh, yh, holdout) if current is not None else None
+    summary = (f"holdout ({len(Xh)} rida) logloss {candidate_loss:.4f} vs praegune "
+               f"{'-' if current_loss is None else f'{current_loss:.4f}'}")
+    if current is not None and current_loss is None:
+        logger.error(f"⛔ Praegust mudelit ei saanud võrrelda, mudelit ei vahetata: {summary}")
+        return False
+    if current_loss is not None and candidate_loss > current_loss - MIN_GAIN:
+        logger.info(f"⛔ Kandidaat ei ole parem, mudelit ei vahetata: {summary} "
+                    f"({time.perf_counter() - started:.0f}s kokku)")
+        return False
+    version = publish_model(model, 'trading_brain_xgb.pkl')
+    # Jätkamine (train_ai_model) lisab puud holdout'i ja uuemate ridade põhjal
+    cache.save_meta(trained_rows=holdout, params=best['params'], trees=best['trees'])
+    logger.info(f"🚀 Uus mudel {version} avaldatud: {summary} ({time.perf_counter() - started:.0f}s kokku)")
+    return True
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [brain] %(message)s')
+    parser = argparse.ArgumentParser(description='Walk-forward hyperparameter search for the XGBoost model')
+    parser.add_argument('--search', action='store_true')
+    parser.add_argument('--candidates', type=int, default=SEARCH_CANDIDATES)
+    parser.add_argument('--folds', type=int, default=SEARCH_FOLDS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=SEARCH_BUDGET, help='sekundit')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(0 if search(args.candidates, args.folds, args.workers, args.budget, args.seed) else 1)
+
+
+if __name__ == "__main__" and '--search' in sys.argv:
+    main()
+elif __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [brain] %(message)s')
     logger.info("🚀 Brain.py V2 (Tolerantne režiim) on käivitatud...")
     
     while True:
@@ -0,0 +1,90 @@
+"""Candle-aligned tick timing for the live loop.
+
+The bot used to sleep a fixed 30 seconds after every tick, so ticks
+drifted against the candles, a slow tick delayed all later ones and half
+of the ticks saw the same closed candle. `CandleClock.wait()` instead
+returns at fixed points of every 1m candle on exchange time:
+
+* the candle close: as soon as the market stream has seen the close of
+  every symbol (`MarketStream.wait_closed`), or right after the boundary
+  when running on REST only;
+* `samples - 1` evenly spaced intra-candle points (`CANDLE_SAMPLES=2`
+  gives one extra decision in the middle of the candle).
+
+At a candle close `wait()` returns `candle_closed=True` and the tick
+decides on the closed candle (`bot.tick(..., close=point)` drops the
+candle that has just opened).
+
+If the loop was busy past a candle close, the next `wait()` returns at
+once for the latest close only (one catch-up tick, no burst) and counts
+the skipped ones in `metrics`.
+"""
+import os
+import time
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CANDLE_MS = 60_000
+SAMPLES = int(os.getenv('CANDLE_SAMPLES', '1'))
+REST_CLOSE_DELAY = 0.25   # sekundit pärast piiri, et börs jõuaks küünla sulgeda
+CLOSE_TIMEOUT = 3.0       # sekundit; kauem voo sulgemissõnumit ei oota
+OFFSET_REFRESH = 3600     # sekundit serveriaja nihke uuendamise vahel
+
+
+class CandleClock:
+    def __init__(self, client=None, stream=None, symbols=None, samples=SAMPLES):
+        self.client = client
+        self.stream = stream
+        self.symbols = symbols
+        self.samples = max(1, int(samples))
+        self.offset_ms = 0
+        self._offset_at = None
+        self._last = None  # viimane tagastatud punkt (ms, börsi aeg)
+
+    def now_ms(self):
+        """Exchange time in ms (local clock corrected by the server time offset)."""
+        if self.client is not None and (self._offset_at is None or time.monotonic() - self._offset_at > OFFSET_REFRESH):
+            self._sync_offset()
+        return int(time.time() * 1000) + self.offset_ms
+
+    def _sync_offset(self):
+        self._offset_at = time.monotonic()
+        try:
+            started = time.time()
+            server = self.client.get_server_time()['serverTime']
+            self.offset_ms = int(server - (started + time.time()) / 2 * 1000)
+        except Exception as e:
+            logger.warning(f"Serveriaja päring ebaõnnestus, kasutan kohalikku kella: {e}")
+
+    def _step(self):
+        return CANDLE_MS // self.samples
+
+    def wait(self):
+        """Block until the next tick point; returns (point_ms, candle_closed)."""
+        step = self._step()
+        now = self.now_ms()
+        latest = now - now % step
+        if self._last is not None and latest > self._last:
+            # Tikk jäi vahele: üks kohene järeletikk viimase punkti jaoks
+            missed = (latest - self._last) // step - 1
+            if missed:
+                metrics.inc('ticks_missed_total', missed)
+                logger.warning(f"⏭️ {missed} tikki jäi vahele, jätkan viimasest")
+            self._last = latest
+            return latest, latest % CANDLE_MS == 0
+        # Voog võib küünla sulgeda enne kohalikku piiri; sama punkti ei tagastata kaks korda
+        point = max(latest, self._last or latest) + step
+        closed = point % CANDLE_MS == 0
+        if closed and self.stream is not None and all(self.stream.is_live(s) for s in self.symbols or self.stream.symbols):
+            # Otsus kohe, kui voog on kõigi sümbolite küünla sulgenud
+            self.stream.wait_closed(point, (point - now) / 1000 + CLOSE_TIMEOUT, self.symbols)
+        else:
+            time.sleep(max(0.0, (point - now) / 1000 + (REST_CLOSE_DELAY if closed else 0.0)))
+        self._last = point
+        return point, closed
+
+    def latency(self, point_ms):
+        """Seconds from a tick point to now (decision latency)."""
+        return (self.now_ms() - point_ms) / 1000
@@ -1,36 +1,330 @@
+"""Tiered retention for `trade_logs`.
+
+HOLD rows are not deleted outright any more. Each retention tier rolls
+rows older than its age into per-interval aggregate rows (OHLC of the
+price, row count and mean indicators) and only then deletes them:
+
+    TIERS = [(3, '5min'), (30, '1h')]
+
+* HOLD rows in `trade_logs` older than 3 days become 5 minute rows in
+  `trade_logs_summary`;
+* 5 minute summary rows older than 30 days become 1 hour rows.
+
+BUY and SELL rows are never touched. The work is done in time windows
+aligned to the interval, so a bucket is never split between runs; rows
+are deleted by id in bounded batches. Rows that arrive late in a window
+that is already summarized (e.g. a replayed log spool) are merged into
+the existing aggregates: counts add up, high/low widen and the means are
+weighted by the row counts; open and close stay.
+
+`cleaner.checkpoint.json` holds a window's final aggregates before they
+are written, so an interrupted run writes exactly the same rows again
+and finishes that window's deletes instead of aggregating the remaining
+rows a second time.
+
+With `--archive DIR` the first tier writes its aggregates to
+`DIR/trade_logs_<interval>/<window start>.jsonl` instead of the summary
+table, one file per window replaced atomically (the further tiers need
+the table and are skipped).
+
+Summary table:
+    create table trade_logs_summary (
+        symbol text, interval text, bucket timestamptz, rows int,
+        open float8, high float8, low float8, close float8,
+        rsi float8, macd float8, macd_signal float8, vwap float8, stoch_k float8,
+        stoch_d float8, atr float8, ema200 float8, volume float8,
+        market_pressure float8, ai_prediction float8,
+        primary key (symbol, interval, bucket));
+
+Usage:
+    python cleaner.py
+    python cleaner.py --archive data/archive
+    CLEANER_TIERS=7:5min,90:1h python cleaner.py
+"""
 import os
+import sys
+import json
 import logging
-from datetime import datetime, timedelta
-from supabase import create_client
+from datetime import datetime, timedelta, timezone
+import pandas as pd
 from dotenv import load_dotenv
 
-# Logimine
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - [cleaner] %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+supabase = None  # luuakse init()-is
+
+LOG_TABLE = 'trade_logs'
+SUMMARY_TABLE = 'trade_logs_summary'
+# (vanus päevades, agregaadi intervall); iga järgmine tase koondab eelmise taseme read
+TIERS = [(int(age), interval) for age, interval in
+         (t.split(':') for t in os.getenv('CLEANER_TIERS', '3:5min,30:1h').split(','))]
+MEAN_COLUMNS = ['rsi', 'macd', 'macd_signal', 'vwap', 'stoch_k', 'stoch_d', 'atr', 'ema200',
+                'volume', 'market_pressure', 'ai_prediction']
+WINDOW = timedelta(hours=6)  # töödeldav ajaaken, intervallide täisarvkordne
+PAGE_SIZE = 1000
+DELETE_BATCH = 500
+CHECKPOINT_PATH = 'cleaner.checkpoint.json'
+
+
+def init():
+    global supabase
+    if supabase is None:
+        from supabase import create_client
+        supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+    return supabase
+
+
+def _load_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    return None
+
+
+def _save_checkpoint(state):
+    if state is None:
+        if os.path.exists(CHECKPOINT_PATH):
+            os.remove(CHECKPOINT_PATH)
+        return
+    tmp = CHECKPOINT_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def _floor(ts, step):
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + (ts - epoch) // step * step
+
+
+class Tier:
+    """One retention step: rows of `source` older than `age_days` -> `interval` aggregates."""
+
+    def __init__(self, age_days, interval, source_interval=None):
+        self.age_days = age_days
+        self.interval = interval
+        self.step = pd.Timedelta(interval).to_pytimedelta()
+        self.source_interval = source_interval  # None = toored HOLD read
+        self.table = LOG_TABLE if source_interval is None else SUMMARY_TABLE
+        self.time_column = 'created_at' if source_interval is None else 'bucket'
+        # Ühtne järjekord lehekülgedele: sama aja väärtusega read ei tohi lehe piiril vahele jääda ega korduda
+        self.order_columns = [self.time_column, 'id' if source_interval is None else 'symbol']
+
+    @property
+    def name(self):
+        return f"{self.source_interval or 'HOLD'} -> {self.interval}"
+
+    def query(self, columns):
+        q = supabase.table(self.table).select(columns)
+        if self.source_interval is None:
+            return q.eq('action', 'HOLD')
+        return q.eq('interval', self.source_interval)
+
+    def cutoff(self):
+        return _floor(datetime.now(timezone.utc) - timedelta(days=self.age_days), self.step)
 
-def run_smart_cleanup():
+    def oldest(self, cutoff):
+        res = self.query(self.time_column).lt(self.time_column, cutoff.isoformat()) \
+            .order(self.time_column).limit(1).execute()
+        return pd.Timestamp(res.data[0][self.time_column]).to_pydatetime() if res.data else None
+
+    def fetch(self, start, end):
+        """All rows in [start, end) as a DataFrame, page by page."""
+        if self.source_interval is None:
+            columns = ['id', 'created_at', 'symbol', 'price'] + MEAN_COLUMNS
+        else:
+            columns = ['symbol', 'bucket', 'rows', 'open', 'high', 'low', 'close'] + MEAN_COLUMNS
+        pages, offset = [], 0
+        while True:
+            q = self.query(','.join(columns)) \
+                .gte(self.time_column, start.isoformat()).lt(self.time_column, end.isoformat())
+            for column in self.order_columns:
+                q = q.order(column)
+            res = q.range(offset, offset + PAGE_SIZE - 1).execute()
+            pages += res.data or []
+            if len(res.data or []) < PAGE_SIZE:
+                return pd.DataFrame(pages, columns=columns)
+            offset += PAGE_SIZE
+
+    def archive_path(self, archive, start):
+        return os.path.join(archive, f"{LOG_TABLE}_{self.interval}", f"{start:%Y-%m-%dT%H%M}.jsonl")
+
+    def summarized(self, start, end, archive=None):
+        """This tier's aggregates already written for [start, end)."""
+        if archive:
+            path = self.archive_path(archive, start)
+            if not os.path.exists(path):
+                return []
+            with open(path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        # Väljundi read on järgmise taseme sisend: sama päring intervalli järgi
+        df = Tier(self.age_days, self.interval, self.interval).fetch(start, end)
+        return _records(df.assign(interval=self.interval))
+
+    def delete(self, start, end):
+        """Delete the window's rows in bounded batches; returns how many were removed.
+
+        Raises when a batch removes nothing (no delete permission, RLS), instead
+        of selecting the same rows again forever.
+        """
+        deleted = 0
+        key = 'id' if self.source_interval is None else 'bucket'
+        while True:
+            res = self.query(key).gte(self.time_column, start.isoformat()) \
+                .lt(self.time_column, end.isoformat()).limit(DELETE_BATCH).execute()
+            if not res.data:
+                return deleted
+            keys = [r[key] for r in res.data]
+            q = supabase.table(self.table).delete().in_(key, keys)
+            if self.source_interval is not None:
+                q = q.eq('interval', self.source_interval)
+            else:
+                q = q.eq('action', 'HOLD')
+            removed = len(q.execute().data or [])
+            if not removed:
+                raise RuntimeError(f"{self.name}: kustutamine ei eemaldanud ühtegi rida (õigused/RLS?)")
+            deleted += removed
+
+
+def _records(df):
+    # JSON-is pole NaN-i
+    return [{k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+            for row in df.to_dict('records')]
+
+
+def _key(row):
+    return row['symbol'], pd.Timestamp(row['bucket']).isoformat()
+
+
+def _extreme(f, *values):
+    values = [v for v in values if v is not None]
+    return f(values) if values else None
+
+
+def merge(existing, rows):
+    """All aggregates of a window: `existing` ones with the late `rows` folded in."""
+    out = {_key(row): row for row in existing}
+    for row in rows:
+        old = out.get(_key(row))
+        if old is None:
+            out[_key(row)] = row
+            continue
+        n_old, n_new = old['rows'] or 0, row['rows']
+        merged = dict(old, rows=n_old + n_new)
+        merged['high'] = _extreme(max, old['high'], row['high'])
+        merged['low'] = _extreme(min, old['low'], row['low'])
+        for col in MEAN_COLUMNS:
+            a, b = old.get(col), row.get(col)
+            merged[col] = a if b is None else b if a is None else (a * n_old + b * n_new) / (n_old + n_new)
+        out[_key(row)] = merged
+    return list(out.values())
+
+
+def aggregate(df, tier):
+    """Summary rows for every (symbol, bucket) in `df`."""
+    if tier.source_interval is None:
+        # Toored read samale kujule kui kokkuvõtte read: üks rida, hind = OHLC
+        df = df.rename(columns={'created_at': 'bucket'})
+        df['rows'] = 1
+        for col in ('open', 'high', 'low', 'close'):
+            df[col] = df['price']
+    df['bucket'] = pd.to_datetime(df['bucket'], utc=True, format='ISO8601')
+    df = df.sort_values('bucket')
+    for col in ['open', 'high', 'low', 'close', 'rows'] + MEAN_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    # Kaalutud keskmised, et 5m -> 1h koondamine annaks sama tulemuse kui toored read
+    weighted = df[MEAN_COLUMNS].mul(df['rows'], axis=0)
+    weights = df[MEAN_COLUMNS].notna().mul(df['rows'], axis=0)
+    keys = [df['symbol'], df['bucket'].dt.floor(tier.interval)]
+    grouped = df.groupby(keys)
+    out = pd.DataFrame({
+        'rows': grouped['rows'].sum(),
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+    })
+    means = weighted.groupby(keys).sum() / weights.groupby(keys).sum()
+    out = out.join(means).reset_index(names=['symbol', 'bucket'])
+    out['interval'] = tier.interval
+    out['bucket'] = out['bucket'].map(lambda t: t.isoformat())
+    out['rows'] = out['rows'].astype(int)
+    return _records(out)
+
+
+def write_summary(rows, tier, start, archive=None):
+    """Write a window's aggregates; writing the same rows twice leaves the same result."""
+    if archive:
+        if not rows:
+            return
+        path = tier.archive_path(archive, start)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return
+    for i in range(0, len(rows), PAGE_SIZE):
+        supabase.table(SUMMARY_TABLE).upsert(rows[i:i + PAGE_SIZE], on_conflict='symbol,interval,bucket').execute()
+
+
+def compact(tier, archive=None):
+    """Aggregate and delete everything older than the tier's cutoff, window by window."""
+    cutoff = tier.cutoff()
+    summarized = deleted = 0
+    state = _load_checkpoint()
+    while True:
+        if state and state.get('tier') == tier.name:
+            # Eelmine käivitus katkes: samad koondread uuesti (kirjutamine on korratav), siis kustutamine
+            start, end = (datetime.fromisoformat(state[k]) for k in ('start', 'end'))
+            rows = state.get('rows', [])
+            logger.info(f"↩️ {tier.name}: lõpetan akna {start:%Y-%m-%d %H:%M} ({len(rows)} koondrida)")
+        else:
+            oldest = tier.oldest(cutoff)
+            if oldest is None:
+                break
+            start = _floor(oldest, WINDOW)
+            end = min(start + WINDOW, cutoff)
+            df = tier.fetch(start, end)
+            new = aggregate(df, tier) if not df.empty else []
+            summarized += len(new)
+            # Hilinenud read juba koondatud aknas liidetakse olemasolevatele koondridadele
+            rows = merge(tier.summarized(start, end, archive), new)
+            # Kontrollpunkt enne kirjutamist: katkestuse järel kirjutatakse needsamad read, mitte uuesti liidetud
+            state = {'tier': tier.name, 'start': start.isoformat(), 'end': end.isoformat(), 'rows': rows}
+            _save_checkpoint(state)
+        write_summary(rows, tier, start, archive)
+        deleted += tier.delete(start, end)
+        state = None
+        _save_checkpoint(None)
+    logger.info(f"✅ {tier.name}: {summarized} koondrida, eemaldati {deleted} rida (vanemad kui {cutoff:%Y-%m-%d %H:%M})")
+    return summarized, deleted
+
+
+def run_smart_cleanup(archive=None):
+    init()
     logger.info("🧹 Alustan andmebaasi tarka puhastust...")
-    
+    tiers, source = [], None
+    for age_days, interval in TIERS:
+        tiers.append(Tier(age_days, interval, source))
+        source = interval
+    if archive:
+        tiers = tiers[:1]
+    # Pooleli jäänud akna tase enne teisi, et selle kontrollpunkt üle ei kirjutataks
+    pending = (_load_checkpoint() or {}).get('tier')
+    tiers.sort(key=lambda t: t.name != pending)
     try:
-        # 1. Arvutame kuupäeva (3 päeva tagasi)
-        cutoff_date = (datetime.now() - timedelta(days=3)).isoformat()
-        
-        # 2. KUSTUTAME: Ainult 'HOLD' read, mis on vanemad kui 3 päeva
-        # NB! 'BUY' ja 'SELL' read jäävad puutumata.
-        response = supabase.table("trade_logs") \
-            .delete() \
-            .eq("action", "HOLD") \
-            .lt("created_at", cutoff_date) \
-            .execute()
-        
-        deleted_count = len(response.data) if response.data else 0
-        logger.info(f"✅ Puhastus lõpetatud! Eemaldati {deleted_count} vana 'HOLD' rida.")
-
+        for tier in tiers:
+            compact(tier, archive)
     except Exception as e:
         logger.error(f"❌ Viga puhastamise käigus: {e}")
 
+
 if __name__ == "__main__":
-    run_smart_cleanup()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [cleaner] %(message)s')
+    archive = sys.argv[sys.argv.index('--archive') + 1] if '--archive' in sys.argv else None
+    run_smart_cleanup(archive)
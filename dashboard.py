@@ -1,33 +1,54 @@
 import streamlit as st
 import pandas as pd
+from datetime import timedelta
 from supabase import create_client
 import os
 from dotenv import load_dotenv
 import plotly.graph_objects as go
+from dashboard_data import LogStore
 
 load_dotenv()
-supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
 
 st.set_page_config(page_title="AI Crypto Bot Dashboard", layout="wide")
 st.title("🤖 AI Trading Bot V2 - Real-time Analysis")
 
+HORIZONS = {"1h": timedelta(hours=1), "24h": timedelta(days=1), "7d": timedelta(days=7), "30d": timedelta(days=30)}
+
+@st.cache_resource
+def get_store():
+    # Üks andmekiht kõigile vaatajatele ja uuesti käivitamistele (TTL + inkrementaalne tõmbamine)
+    return LogStore(create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY')))
+
+store = get_store()
+
 # 1. Tõmba andmed
-res = supabase.table("trade_logs").select("*").order("created_at", desc=True).limit(50).execute()
-df = pd.DataFrame(res.data)
+df = store.frame()
+if df.empty:
+    st.info("trade_logs tabelis pole veel andmeid.")
+    st.stop()
+
+symbols = sorted(df['symbol'].dropna().unique())
+left, right = st.columns(2)
+symbol = left.selectbox("Sümbol", symbols) if len(symbols) > 1 else (symbols[0] if symbols else None)
+horizon = right.radio("Periood", list(HORIZONS), horizontal=True)
 
 # 2. Peamised indikaatorid (KPI-d)
-curr = df.iloc[0]
+curr = store.latest(symbol)
 col1, col2, col3, col4 = st.columns(4)
 col1.metric("Current Price", f"${curr['price']:,}")
-col2.metric("AI Confidence", f"{curr['ai_prediction']*100:.1f}%")
-col3.metric("RSI", f"{curr['rsi']:.1f}")
-col4.metric("Market Pressure", f"{curr['market_pressure']:.2f}")
+col2.metric("AI Confidence", f"{curr['ai_prediction']*100:.1f}%" if pd.notna(curr['ai_prediction']) else "-")
+col3.metric("RSI", f"{curr['rsi']:.1f}" if pd.notna(curr['rsi']) else "-")
+col4.metric("Market Pressure", f"{curr['market_pressure']:.2f}" if pd.notna(curr['market_pressure']) else "-")
 
-# 3. AI Ennustuse graafik
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=df['created_at'], y=df['ai_prediction'], name="AI Confidence", line=dict(color='gold')))
-st.plotly_chart(fig, use_container_width=True)
+# 3. AI Ennustuse ja hinna graafik (pikemad perioodid kokkuvõtte tabelist, hõrendatud)
+for column, name, color in (("ai_prediction", "AI Confidence", "gold"), ("price", "Price", "royalblue")):
+    series = store.series(column, HORIZONS[horizon], symbol)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=series['time'], y=series['value'], name=name, line=dict(color=color)))
+    fig.update_layout(title=name, height=320, margin=dict(t=40, b=20))
+    st.plotly_chart(fig, use_container_width=True)
 
 # 4. Tabel viimaste logidega
 st.subheader("Viimased tehingud ja analüüs")
-st.write(df[['created_at', 'action', 'price', 'analysis_summary', 'pnl']])
\ No newline at end of file
+recent = df[df['symbol'] == symbol] if symbol is not None else df
+st.write(recent[['created_at', 'action', 'price', 'analysis_summary', 'pnl']].tail(50).iloc[::-1])
@@ -0,0 +1,151 @@
+"""Shared, incremental data layer for `dashboard.py`.
+
+One `LogStore` per process (the dashboard keeps it in
+`st.cache_resource`), so every viewer and every Streamlit rerun reads
+the same in-memory window instead of querying Supabase:
+
+* `refresh()` fetches only rows after the last seen `(created_at, id)`,
+  at most once per `ttl` seconds, and only the columns the dashboard
+  shows;
+* the window is bounded by age (`WINDOW`, the raw rows `cleaner.py`
+  keeps in `trade_logs`) and by `MAX_ROWS`;
+* `series()` downsamples to at most `MAX_POINTS` points; horizons longer
+  than the window are served from the `trade_logs_summary` aggregates,
+  cached for `SUMMARY_TTL` seconds.
+"""
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from log_cursor import cursor_filter
+
+COLUMNS = ['created_at', 'symbol', 'action', 'price', 'rsi', 'ai_prediction', 'market_pressure',
+           'pnl', 'analysis_summary']
+WINDOW = timedelta(days=3)  # sama mis cleaner.py esimene tase: vanemad HOLD read on kokkuvõttes
+MAX_ROWS = 200_000
+MAX_POINTS = 1500
+PAGE_SIZE = 1000
+TTL = 5.0            # sekundit
+SUMMARY_TTL = 300.0  # sekundit
+SUMMARY_TABLE = 'trade_logs_summary'
+
+
+class LogStore:
+    def __init__(self, supabase, window=WINDOW, ttl=TTL, max_rows=MAX_ROWS):
+        self.supabase = supabase
+        self.window = window
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.watermark = None
+        self.queries = 0
+        self._df = pd.DataFrame(columns=COLUMNS).astype({'created_at': 'datetime64[ns, UTC]'})
+        self._fetched_at = 0.0
+        self._summary = {}  # algus -> (aeg, DataFrame)
+        self._lock = threading.Lock()
+
+    def frame(self):
+        """The current window (oldest first); refreshed if older than `ttl`."""
+        if time.monotonic() - self._fetched_at >= self.ttl:
+            with self._lock:
+                # Teine vaataja võis samal ajal juba uuendada
+                if time.monotonic() - self._fetched_at >= self.ttl:
+                    self.refresh()
+        return self._df
+
+    def latest(self, symbol=None):
+        df = self.frame()
+        if symbol is not None:
+            df = df[df['symbol'] == symbol]
+        return None if df.empty else df.iloc[-1]
+
+    def refresh(self):
+        cursor = self.watermark  # (created_at, id); sama created_at-iga read ei jää lehe piiril vahele
+        pages = []
+        while True:
+            query = self.supabase.table("trade_logs").select(','.join(['id'] + COLUMNS))
+            if cursor:
+                query = query.or_(cursor_filter(*cursor))
+            else:
+                query = query.gt("created_at", (datetime.now(timezone.utc) - self.window).isoformat())
+            res = query.order("created_at").order("id").limit(PAGE_SIZE).execute()
+            self.queries += 1
+            rows = res.data or []
+            pages += rows
+            if len(rows) < PAGE_SIZE:
+                break
+            cursor = (rows[-1]['created_at'], rows[-1]['id'])
+        self._fetched_at = time.monotonic()
+        if not pages:
+            return 0
+        self.watermark = (pages[-1]['created_at'], pages[-1]['id'])
+        new = pd.DataFrame(pages, columns=COLUMNS)
+        new['created_at'] = pd.to_datetime(new['created_at'], utc=True, format='ISO8601')
+        df = pd.concat([self._df, new], ignore_index=True) if len(self._df) else new
+        df = df[df['created_at'] >= pd.Timestamp.now(tz='UTC') - self.window].tail(self.max_rows)
+        # Uus objekt, et parajasti joonistavad vaatajad näeksid terviklikku akent
+        self._df = df.reset_index(drop=True)
+        return len(new)
+
+    def series(self, column, horizon, symbol=None, points=MAX_POINTS):
+        """`column` over the last `horizon` as (time, value), downsampled to <= `points`."""
+        now = pd.Timestamp.now(tz='UTC')
+        start = now - horizon
+        step = pd.Timedelta(horizon) / points
+        df = self.frame()
+        if symbol is not None:
+            df = df[df['symbol'] == symbol]
+        raw = df.loc[df['created_at'] >= start, ['created_at', column]] \
+            .rename(columns={'created_at': 'time', column: 'value'})
+        raw['value'] = pd.to_numeric(raw['value'], errors='coerce')
+        out = raw
+        if horizon > self.window:
+            # Kokkuvõttes on 5min ja vanemad 1h read; mõlemad lähevad samasse hõrendusse
+            older = self._summary_series(column, start, now - self.window, symbol)
+            if not older.empty:
+                out = pd.concat([older, raw], ignore_index=True) if not raw.empty else older
+        if len(out) > points:
+            out = out.set_index('time')['value'].resample(step).mean().dropna().reset_index()
+        return out
+
+    def _summary_series(self, column, start, end, symbol):
+        # Algus ümardatud tunnile, et kõik vaatajad ja käivitused jagaksid sama vahemälu kirjet
+        key = start.floor('1h')
+        cached = self._summary.get(key)
+        if cached is None or time.monotonic() - cached[0] >= SUMMARY_TTL:
+            with self._lock:
+                cached = self._summary.get(key)
+                if cached is None or time.monotonic() - cached[0] >= SUMMARY_TTL:
+                    cached = (time.monotonic(), self._fetch_summary(key))
+                    # Hoiame ainult viimase perioodi kirjed, et mälu ei kasvaks
+                    self._summary = {k: v for k, v in self._summary.items()
+                                     if time.monotonic() - v[0] < SUMMARY_TTL}
+                    self._summary[key] = cached
+        df = cached[1]
+        column = 'close' if column == 'price' else column  # kokkuvõttes on hinna OHLC
+        if df.empty or column not in df:
+            return pd.DataFrame(columns=['time', 'value'])
+        if symbol is not None:
+            df = df[df['symbol'] == symbol]
+        out = pd.DataFrame({'time': df['bucket'], 'value': pd.to_numeric(df[column], errors='coerce')})
+        return out[(out['time'] >= start) & (out['time'] < end)]
+
+    def _fetch_summary(self, start):
+        rows, offset = [], 0
+        while True:
+            try:
+                res = self.supabase.table(SUMMARY_TABLE).select("*") \
+                    .gte("bucket", start.isoformat()).order("bucket") \
+                    .range(offset, offset + PAGE_SIZE - 1).execute()
+            except Exception:
+                # Kokkuvõtte tabelit pole (cleaner.py pole veel jooksnud)
+                break
+            self.queries += 1
+            rows += res.data or []
+            if len(res.data or []) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df['bucket'] = pd.to_datetime(df['bucket'], utc=True, format='ISO8601')
+            df = df.sort_values('bucket')
+        return df
@@ -0,0 +1,164 @@
+"""Local stand-in for the Binance endpoints the bot uses.
+
+Serves a deterministic synthetic market so the streaming ingestion can be
+run and tested offline:
+
+* REST (`/api/v3/ping`, `/api/v3/time`, `/api/v3/klines`, `/api/v3/depth`)
+* websocket combined streams (`/stream?streams=btcusdt@kline_1m/btcusdt@depth10@100ms`)
+
+`--drop-every` closes all websocket connections periodically to exercise
+the reconnect and resync path.
+
+Usage:
+    python fake_exchange.py --rest-port 9080 --ws-port 9443
+    BINANCE_API_URL=http://127.0.0.1:9080/api BINANCE_WS_URL=ws://127.0.0.1:9443 python bot.py
+"""
+import json
+import math
+import time
+import asyncio
+import argparse
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import websockets
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60_000
+
+
+def _price(ms):
+    """Deterministic price path (a few overlapping waves around 30k)."""
+    m = ms / MINUTE_MS
+    return 30000 + 400 * math.sin(m / 97.0) + 120 * math.sin(m / 13.1) + 25 * math.sin(m * 1.7)
+
+
+def kline(open_ms, now_ms=None):
+    """Binance kline row for the candle opening at `open_ms`.
+
+    If the candle is still forming at `now_ms` it only covers the part
+    that has elapsed, like the real exchange.
+    """
+    end = open_ms + MINUTE_MS - 1
+    if now_ms is not None:
+        end = min(end, now_ms)
+    points = [_price(open_ms + (end - open_ms) * i / 4) for i in range(5)]
+    volume = 1 + abs(math.sin(open_ms / MINUTE_MS / 3.3)) * 5
+    return [open_ms, f"{points[0]:.2f}", f"{max(points):.2f}", f"{min(points):.2f}", f"{points[-1]:.2f}",
+            f"{volume:.5f}", open_ms + MINUTE_MS - 1, "0", 0, "0", "0", "0"]
+
+
+def klines(limit=500, start_ms=None, end_ms=None, now_ms=None):
+    now_ms = now_ms or int(time.time() * 1000)
+    last_open = now_ms - now_ms % MINUTE_MS
+    end_open = min(last_open, end_ms - end_ms % MINUTE_MS if end_ms else last_open)
+    if start_ms is not None:
+        first = max(start_ms + (-start_ms) % MINUTE_MS, end_open - 10_000 * MINUTE_MS)
+    else:
+        first = end_open - (limit - 1) * MINUTE_MS
+    opens = range(first, end_open + 1, MINUTE_MS)
+    return [kline(t, now_ms) for t in opens][:limit]
+
+
+def depth(limit=10, now_ms=None):
+    now_ms = now_ms or int(time.time() * 1000)
+    mid = _price(now_ms)
+    tilt = 1 + 0.5 * math.sin(now_ms / 45_000)
+    bids = [[f"{mid - 0.5 - i:.2f}", f"{(0.3 + 0.1 * i) * tilt:.5f}"] for i in range(limit)]
+    asks = [[f"{mid + 0.5 + i:.2f}", f"{(0.3 + 0.1 * i) / tilt:.5f}"] for i in range(limit)]
+    return {"lastUpdateId": now_ms, "bids": bids, "asks": asks}
+
+
+class RestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path.endswith('/v3/ping'):
+            body = {}
+        elif url.path.endswith('/v3/time'):
+            body = {"serverTime": int(time.time() * 1000)}
+        elif url.path.endswith('/v3/klines'):
+            body = klines(int(q.get('limit', 500)),
+                          int(q['startTime']) if 'startTime' in q else None,
+                          int(q['endTime']) if 'endTime' in q else None)
+        elif url.path.endswith('/v3/depth'):
+            body = depth(int(q.get('limit', 10)))
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _streams_from_path(path):
+    query = parse_qs(urlparse(path).query)
+    return [s for s in query.get('streams', [''])[0].split('/') if s]
+
+
+async def _serve_streams(ws, interval, connections):
+    path = ws.request.path if hasattr(ws, 'request') else ws.path
+    streams = _streams_from_path(path)
+    connections.add(ws)
+    try:
+        while True:
+            now = int(time.time() * 1000)
+            for name in streams:
+                symbol, kind = name.split('@', 1)
+                if kind.startswith('kline'):
+                    k = kline(now - now % MINUTE_MS, now)
+                    data = {"e": "kline", "E": now, "s": symbol.upper(),
+                            "k": {"t": k[0], "T": k[6], "s": symbol.upper(), "i": "1m",
+                                  "o": k[1], "h": k[2], "l": k[3], "c": k[4], "v": k[5],
+                                  "x": now - now % MINUTE_MS + MINUTE_MS - now <= interval * 1000}}
+                else:
+                    data = depth(int(kind[5:].split('@')[0] or 10), now)
+                await ws.send(json.dumps({"stream": name, "data": data}))
+            await asyncio.sleep(interval)
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        connections.discard(ws)
+
+
+async def _run_ws(host, port, interval, drop_every):
+    connections = set()
+    async with websockets.serve(lambda ws, *_: _serve_streams(ws, interval, connections), host, port):
+        logger.info(f"🛰️ Websocket ws://{host}:{port}")
+        while True:
+            await asyncio.sleep(drop_every or 3600)
+            if drop_every:
+                logger.info(f"✂️ Katkestan {len(connections)} ühendust")
+                for ws in list(connections):
+                    await ws.close()
+
+
+def serve(host='127.0.0.1', rest_port=9080, ws_port=9443, interval=0.1, drop_every=0):
+    """Start the REST server in a thread and run the websocket server (blocking)."""
+    rest = ThreadingHTTPServer((host, rest_port), RestHandler)
+    threading.Thread(target=rest.serve_forever, daemon=True).start()
+    logger.info(f"🌐 REST http://{host}:{rest_port}/api")
+    try:
+        asyncio.run(_run_ws(host, ws_port, interval, drop_every))
+    finally:
+        rest.shutdown()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [fake_exchange] %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rest-port', type=int, default=9080)
+    parser.add_argument('--ws-port', type=int, default=9443)
+    parser.add_argument('--interval', type=float, default=0.1, help='sekundeid voo sõnumite vahel')
+    parser.add_argument('--drop-every', type=float, default=0, help='katkesta ühendused iga N sekundi järel')
+    args = parser.parse_args()
+    serve(args.host, args.rest_port, args.ws_port, args.interval, args.drop_every)
@@ -0,0 +1,112 @@
+"""Local append-only cache of training features from `trade_logs`.
+
+`sync` pulls only rows after the stored `(created_at, id)` watermark,
+selecting just the feature columns, page by page. Rows are appended as
+float32 to `features.f32` and read back through `np.memmap`, so neither
+the transfer nor the memory use grows with the size of the history that
+is already cached.
+
+Layout (default `data/feature_cache/<symbol>/`):
+    features.f32   raw float32 rows, len(FEATURES) columns
+    meta.json      {"watermark": ..., "rows": ..., "columns": [...]}
+
+The columns come from the `features` registry; when they change
+(`FEATURE_TIMEFRAMES`), the cache is rebuilt from the start.
+"""
+import os
+import json
+import logging
+import numpy as np
+import features
+from log_cursor import cursor_filter
+
+logger = logging.getLogger(__name__)
+
+# NB! Sama järjekord mis bot.analyze_signals (features registrist, trade_logs veerunimedega)
+FEATURES = features.log_columns()
+CACHE_DIR = os.getenv('FEATURE_CACHE_DIR', os.path.join('data', 'feature_cache'))
+PAGE_SIZE = 1000  # Supabase vaikimisi maksimum päringu kohta
+
+
+class FeatureCache:
+    def __init__(self, symbol, root=CACHE_DIR):
+        self.dir = os.path.join(root, symbol)
+        self.symbol = symbol
+        self.data_path = os.path.join(self.dir, 'features.f32')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        os.makedirs(self.dir, exist_ok=True)
+        self.meta = {'watermark': None, 'rows': 0}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta.update(json.load(f))
+        if self.meta.get('columns', FEATURES[:10]) != FEATURES:
+            # Teised veerud -> vana fail ei sobi, laeme kõik uuesti
+            logger.info(f"🔁 Tunnuste veerud muutusid, tunnuste vahemälu ehitatakse uuesti ({symbol})")
+            if os.path.exists(self.data_path):
+                os.remove(self.data_path)
+            keep = {k: self.meta[k] for k in ('params', 'trees') if k in self.meta}  # brain.py otsingu tulemus
+            self.meta = {'watermark': None, 'rows': 0, **keep}
+            self.save_meta(columns=FEATURES)
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def matrix(self, start=0, stop=None):
+        """Rows [start, stop) as a read-only float32 view (memmap)."""
+        if len(self) == 0:
+            return np.empty((0, len(FEATURES)), dtype=np.float32)
+        data = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(len(self), len(FEATURES)))
+        return data[start:stop]
+
+    def append(self, rows, watermark):
+        values = np.array([[np.nan if r.get(c) is None else r[c] for c in FEATURES] for r in rows],
+                          dtype=np.float32)
+        with open(self.data_path, 'ab') as f:
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        # meta kirjutatakse alles pärast andmeid; katkestuse korral loeme ainult 'rows' rida
+        self.save_meta(watermark=watermark, rows=len(self) + len(values))
+
+    def save_meta(self, **values):
+        self.meta.update(values)
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def _truncate_partial_write(self):
+        expected = len(self) * len(FEATURES) * 4
+        if os.path.getsize(self.data_path) > expected:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(expected)
+
+    def sync(self, supabase):
+        """Fetch rows newer than the watermark; returns how many were added."""
+        if os.path.exists(self.data_path):
+            self._truncate_partial_write()
+        added = 0
+        while True:
+            query = supabase.table("trade_logs") \
+                .select(",".join(['id', 'created_at'] + FEATURES)) \
+                .eq("symbol", self.symbol) \
+                .not_.is_("macd", "null") \
+                .not_.is_("stoch_k", "null") \
+                .not_.is_("vwap", "null")
+            watermark = self.meta['watermark']
+            if isinstance(watermark, list):
+                query = query.or_(cursor_filter(*watermark))
+            elif watermark:
+                query = query.gt("created_at", watermark)  # vanem vahemälu: ainult created_at
+            # id järjekorra määrajana: sama created_at-iga read tulevad alati samas järjekorras
+            res = query.order("created_at").order("id").limit(PAGE_SIZE).execute()
+            rows = res.data or []
+            if not rows:
+                break
+            self.append(rows, [rows[-1]['created_at'], rows[-1]['id']])
+            added += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+        if added:
+            logger.info(f"📥 Tunnuste vahemälu: +{added} rida, kokku {len(self)}")
+        return added
@@ -0,0 +1,162 @@
+"""Feature registry and multi-timeframe features.
+
+`COLUMNS` is the one model input order shared by `bot.analyze_signals`,
+`brain.py` (through `feature_cache`), `backtester.py` and `backtest.py`.
+The 1m columns come first and `market_pressure` stays the tenth, so
+every configuration starts with the original ten: a model trained on
+fewer columns (`n_features_in_`) simply uses the prefix, see `columns()`.
+
+Higher-timeframe columns (`rsi_5m`, `macd_15m`, ...) are derived from
+the 1m candles the bot already has, no extra API calls per tick:
+
+* live, `TimeframeStream` adds every closed 1m candle to the forming
+  5m/15m/1h candle and pushes that candle into an `IndicatorStream` when
+  it closes, so each tick costs a constant amount of work;
+* in backtests, `add_timeframes` resamples the 1m frame in one pass.
+
+Both only use closed higher-timeframe candles: a 1m row sees the last
+5m candle that had closed by the end of that minute, so the values do
+not change while a candle forms and there is no lookahead.
+
+Enable with `FEATURE_TIMEFRAMES=5m,15m,1h` (empty = only the original
+columns). The bot logs the new columns, so `trade_logs` needs them
+first, and the model has to be retrained (`python brain.py`):
+
+    alter table trade_logs
+        add column rsi_5m float8, add column macd_5m float8, add column stoch_k_5m float8,
+        ...;   -- one per name in features.TIMEFRAME_COLUMNS
+"""
+import os
+import logging
+import numpy as np
+import indicators
+from indicator_stream import IndicatorStream
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60_000
+UNIT_MS = {'m': MINUTE_MS, 'h': 60 * MINUTE_MS, 'd': 1440 * MINUTE_MS, 'w': 10080 * MINUTE_MS}
+BASE = ['close', 'rsi', 'macd', 'macd_signal', 'vwap', 'stoch_k', 'stoch_d', 'atr', 'ema200', 'market_pressure']
+TIMEFRAMES = [tf.strip() for tf in os.getenv('FEATURE_TIMEFRAMES', '').split(',') if tf.strip()]
+TIMEFRAME_INDICATORS = ['rsi', 'macd', 'stoch_k']
+TIMEFRAME_COLUMNS = [f'{c}_{tf}' for tf in TIMEFRAMES for c in TIMEFRAME_INDICATORS]
+COLUMNS = BASE + TIMEFRAME_COLUMNS
+LOG_NAMES = {'close': 'price'}  # trade_logs veeru nimi, kui see erineb
+SEED_CANDLES = 250  # kõrgema ajaraami küünlaid käivitusel (MACD/RSI soojendus)
+WARMUP_CANDLES = 100  # partiiarvutuse soojendus kõrgema ajaraami küünaldes
+STREAM_SIZE = 64
+
+
+def columns(n=None):
+    """Model input columns; `n` = the model's feature count (older models use a prefix)."""
+    if n is None or n == len(COLUMNS):
+        return COLUMNS
+    if n > len(COLUMNS):
+        raise ValueError(f"mudel ootab {n} tunnust, registris on {len(COLUMNS)} (FEATURE_TIMEFRAMES?)")
+    return COLUMNS[:n]
+
+
+def log_columns(cols=None):
+    """The same columns under their `trade_logs` names."""
+    return [LOG_NAMES.get(c, c) for c in (cols or COLUMNS)]
+
+
+def step_ms(timeframe):
+    """Binance interval ('5m', '1h', '1d', '1w') in milliseconds."""
+    return int(timeframe[:-1]) * UNIT_MS[timeframe[-1]]
+
+
+def warmup_minutes(timeframes=None):
+    """1m history needed before a range so the higher-timeframe indicators have settled."""
+    timeframes = TIMEFRAMES if timeframes is None else timeframes
+    return max((step_ms(tf) for tf in timeframes), default=0) * WARMUP_CANDLES // MINUTE_MS
+
+
+def add_timeframes(df, timeframes=None):
+    """Add the higher-timeframe columns to a 1m frame (`time` in ms, sorted)."""
+    timeframes = TIMEFRAMES if timeframes is None else timeframes
+    if not timeframes or df.empty:
+        return df
+    time = df['time'].to_numpy(dtype=np.int64)
+    cols = {}
+    for tf in timeframes:
+        step = step_ms(tf)
+        bucket = time // step * step
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], len(time)] - 1
+        # Andmete alguses poolik küünal jääb välja (live saab selle tervena Binance'ist)
+        if time[0] != bucket[0]:
+            starts, ends = starts[1:], ends[1:]
+        values = np.full((len(TIMEFRAME_INDICATORS), len(time)), np.nan)
+        if len(starts):
+            first = starts[0]
+            h = np.maximum.reduceat(df['high'].to_numpy(dtype=np.float64)[first:], starts - first)
+            l = np.minimum.reduceat(df['low'].to_numpy(dtype=np.float64)[first:], starts - first)
+            c = df['close'].to_numpy(dtype=np.float64)[ends]
+            v = np.add.reduceat(df['volume'].to_numpy(dtype=np.float64)[first:], starts - first)
+            out = indicators.compute(bucket[starts], h, l, c, v)
+            # Küünal on kasutatav oma viimase minuti lõpust, puuduva viimase minuti korral järgmise küünla algusest
+            closing = time[ends] == bucket[starts] + step - MINUTE_MS
+            available = np.where(closing, time[ends], np.r_[time[starts[1:]], np.iinfo(np.int64).max])
+            idx = np.searchsorted(available, time, side='right') - 1
+            seen = idx >= 0
+            for i, name in enumerate(TIMEFRAME_INDICATORS):
+                values[i, seen] = out[indicators.COLUMNS.index(name)][idx[seen]]
+        for i, name in enumerate(TIMEFRAME_INDICATORS):
+            cols[f'{name}_{tf}'] = values[i]
+    return df.assign(**cols)
+
+
+class TimeframeStream:
+    """Higher-timeframe indicators of one symbol, fed with closed 1m candles."""
+
+    def __init__(self, timeframes=None, size=STREAM_SIZE):
+        self.timeframes = TIMEFRAMES if timeframes is None else timeframes
+        self.steps = {tf: step_ms(tf) for tf in self.timeframes}
+        self.streams = {tf: IndicatorStream(size=size) for tf in self.timeframes}
+        self.forming = {tf: None for tf in self.timeframes}  # [avamisaeg, o, h, l, c, v]
+        self.until = {tf: 0 for tf in self.timeframes}  # nendest vanemad 1m küünlad on juba sees
+        self.last_time = None  # viimase lisatud 1m küünla avamisaeg
+
+    def seed(self, client, symbol, now_ms):
+        """Load closed higher-timeframe candles once (at start), instead of hours of 1m history."""
+        for tf in self.timeframes:
+            try:
+                klines = client.get_klines(symbol=symbol, interval=tf, limit=SEED_CANDLES)
+            except Exception as e:
+                logger.warning(f"⚠️ {symbol} {tf} küünlad puuduvad ({e}), soojeneb 1m küünaldest")
+                continue
+            closed = [k for k in klines if int(k[0]) + self.steps[tf] <= now_ms]
+            self.streams[tf].extend(closed)
+            if closed:
+                self.until[tf] = int(closed[-1][0]) + self.steps[tf]
+        return self
+
+    def update(self, kline):
+        """Add one closed 1m candle (time, open, high, low, close, volume)."""
+        t = int(kline[0])
+        if self.last_time is not None and t <= self.last_time:
+            return
+        self.last_time = t
+        o, h, l, c, v = (float(x) for x in kline[1:6])
+        for tf, step in self.steps.items():
+            if t < self.until[tf]:
+                continue
+            bucket = t - t % step
+            forming = self.forming[tf]
+            if forming is not None and forming[0] != bucket:
+                # 1m küünal puudus: eelmine küünal sulgus alles nüüd
+                self.streams[tf].update(forming)
+                forming = None
+            if forming is None:
+                forming = self.forming[tf] = [bucket, o, h, l, c, v]
+            else:
+                forming[2], forming[3], forming[4] = max(forming[2], h), min(forming[3], l), c
+                forming[5] += v
+            if t + MINUTE_MS == bucket + step:
+                self.streams[tf].update(forming)
+                self.forming[tf] = None
+
+    def values(self):
+        return {f'{name}_{tf}': self.streams[tf].last(name)
+                for tf in self.timeframes for name in TIMEFRAME_INDICATORS}
@@ -0,0 +1,233 @@
+"""Streaming indicator engine for the live loop.
+
+`bot.get_market_data` used to download 500 klines and rebuild every
+indicator with pandas_ta on each tick. `IndicatorStream` keeps a fixed
+size ring buffer of OHLCV rows together with the running EMA, Wilder
+(RMA), rolling-window and VWAP state, so a new or revised candle costs a
+constant amount of work.
+
+The formulas follow pandas_ta (0.3.14b) exactly, so streaming a history
+candle by candle gives the same columns as running pandas_ta over that
+whole history. Note that the old code recomputed over a sliding 500
+candle window, so long EMAs (ema200) differed slightly from tick to
+tick; the stream keeps its state across the window instead.
+
+Usage (compare against pandas_ta on recent history):
+    python indicator_stream.py [klines.csv]
+"""
+import sys
+import logging
+import numpy as np
+import pandas as pd
+from indicators import (RSI_LEN, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_LEN, BB_STD,
+                        STOCH_K, STOCH_D, STOCH_SMOOTH, ATR_LEN, DAY_MS, EPS)
+
+logger = logging.getLogger(__name__)
+
+OHLCV = ['time', 'open', 'high', 'low', 'close', 'volume']
+INDICATORS = ['rsi', 'macd', 'macd_signal', 'bb_lower', 'bb_upper', 'vwap',
+              'stoch_k', 'stoch_d', 'atr', 'ema200']
+COLUMNS = OHLCV + INDICATORS
+# abiveerud, mida välja ei anta
+_STOCH_RAW = len(COLUMNS)
+_WIDTH = len(COLUMNS) + 1
+_COL = {c: i for i, c in enumerate(COLUMNS)}
+
+EMA_LEN = 200
+
+
+def _ema_step(st, key, x, length):
+    """pandas_ta.ema: SMA of the first `length` values, then adjust=False EMA."""
+    n = st[key + '_n'] + 1
+    st[key + '_n'] = n
+    if n < length:
+        st[key + '_sum'] += x
+        return np.nan
+    if n == length:
+        st[key] = (st[key + '_sum'] + x) / length
+    else:
+        alpha = 2.0 / (length + 1)
+        st[key] = alpha * x + (1.0 - alpha) * st[key]
+    return st[key]
+
+
+def _rma_step(st, key, x, length):
+    """pandas_ta.rma: ewm(alpha=1/length, min_periods=length), adjust=True."""
+    decay = 1.0 - 1.0 / length
+    st[key + '_num'] = x + decay * st[key + '_num']
+    st[key + '_den'] = 1.0 + decay * st[key + '_den']
+    st[key + '_n'] += 1
+    if st[key + '_n'] < length:
+        return np.nan
+    return st[key + '_num'] / st[key + '_den']
+
+
+def _new_state():
+    st = {'count': 0, 'prev_close': np.nan, 'day': -1, 'vwap_pv': 0.0, 'vwap_v': 0.0,
+          'stoch_raw_n': 0, 'stoch_k_n': 0}
+    for key in ('ema_fast', 'ema_slow', 'signal', 'ema200'):
+        st.update({key: np.nan, key + '_n': 0, key + '_sum': 0.0})
+    for key in ('rsi_up', 'rsi_down', 'atr'):
+        st.update({key + '_num': 0.0, key + '_den': 0.0, key + '_n': 0})
+    return st
+
+
+class IndicatorStream:
+    """Ring buffer of 1m candles with incrementally maintained indicators.
+
+    `update(kline)` accepts a Binance kline row (list or tuple, the first
+    six fields are used). A kline with a newer open time appends a row,
+    one with the same open time as the last row revises it (the forming
+    candle) and anything older is ignored.
+    """
+
+    def __init__(self, size=500):
+        self.size = size
+        self._buf = np.full((size, _WIDTH), np.nan)
+        self._pos = -1
+        self._state = _new_state()
+        self._prev_state = None
+
+    def __len__(self):
+        return min(self._state['count'], self.size)
+
+    @property
+    def last_time(self):
+        """Open time (ms) of the newest candle, None when empty."""
+        if self._state['count'] == 0:
+            return None
+        return int(self._buf[self._pos, 0])
+
+    def last(self, column):
+        """Value of `column` in the newest row (NaN when empty)."""
+        if self._state['count'] == 0:
+            return np.nan
+        return float(self._buf[self._pos, _COL[column]])
+
+    def update(self, kline):
+        t = int(kline[0])
+        last = self.last_time
+        if last is not None and t < last:
+            return False
+        if last is not None and t == last:
+            # Küünal veel kujuneb: taastame oleku enne seda küünalt ja arvutame uuesti
+            self._state = dict(self._prev_state)
+        else:
+            self._pos = (self._pos + 1) % self.size
+        self._prev_state = dict(self._state)
+        self._apply(self._pos, t, [float(v) for v in kline[1:6]])
+        return True
+
+    def extend(self, klines):
+        for k in klines:
+            self.update(k)
+        return self
+
+    def _window(self, col, length):
+        """Last `length` values of a column, oldest first."""
+        idx = (self._pos - np.arange(length - 1, -1, -1)) % self.size
+        return self._buf[idx, col]
+
+    def _apply(self, pos, t, ohlcv):
+        st = self._state
+        row = self._buf[pos]
+        row[:] = np.nan
+        o, h, l, c, v = ohlcv
+        row[:6] = (t, o, h, l, c, v)
+        st['count'] += 1
+        n = st['count']
+        prev_close = st['prev_close']
+        st['prev_close'] = c
+
+        # RSI ja ATR (Wilderi silumine, esimene diff on NaN)
+        if n > 1:
+            diff = c - prev_close
+            up = _rma_step(st, 'rsi_up', max(diff, 0.0), RSI_LEN)
+            down = _rma_step(st, 'rsi_down', min(diff, 0.0), RSI_LEN)
+            if not np.isnan(up) and up + abs(down) > 0:
+                row[_COL['rsi']] = 100.0 * up / (up + abs(down))
+            tr = max(h - l, abs(h - prev_close), abs(prev_close - l))
+            row[_COL['atr']] = _rma_step(st, 'atr', tr, ATR_LEN)
+
+        # MACD
+        fast = _ema_step(st, 'ema_fast', c, MACD_FAST)
+        slow = _ema_step(st, 'ema_slow', c, MACD_SLOW)
+        if not np.isnan(slow):
+            macd = fast - slow
+            row[_COL['macd']] = macd
+            row[_COL['macd_signal']] = _ema_step(st, 'signal', macd, MACD_SIGNAL)
+
+        row[_COL['ema200']] = _ema_step(st, 'ema200', c, EMA_LEN)
+
+        # Bollinger Bands (ddof=0 nagu pandas_ta)
+        if n >= BB_LEN:
+            closes = self._window(_COL['close'], BB_LEN)
+            mid = closes.mean()
+            dev = BB_STD * closes.std()
+            row[_COL['bb_lower']] = mid - dev
+            row[_COL['bb_upper']] = mid + dev
+
+        # VWAP, ankurdatud UTC päevale
+        day = t // DAY_MS
+        if day != st['day']:
+            st.update(day=day, vwap_pv=0.0, vwap_v=0.0)
+        st['vwap_pv'] += (h + l + c) / 3.0 * v
+        st['vwap_v'] += v
+        if st['vwap_v'] > 0:
+            row[_COL['vwap']] = st['vwap_pv'] / st['vwap_v']
+
+        # Stochastic: toores %K, siis SMA(3) ja SMA(3)
+        if n >= STOCH_K:
+            ll = self._window(_COL['low'], STOCH_K).min()
+            hh = self._window(_COL['high'], STOCH_K).max()
+            rng = hh - ll if hh != ll else EPS
+            row[_STOCH_RAW] = 100.0 * (c - ll) / rng
+            st['stoch_raw_n'] += 1
+            if st['stoch_raw_n'] >= STOCH_SMOOTH:
+                row[_COL['stoch_k']] = self._window(_STOCH_RAW, STOCH_SMOOTH).mean()
+                st['stoch_k_n'] += 1
+                if st['stoch_k_n'] >= STOCH_D:
+                    row[_COL['stoch_d']] = self._window(_COL['stoch_k'], STOCH_D).mean()
+
+    def to_frame(self, last=None):
+        """Buffer contents (oldest first) with the columns `bot.get_market_data` returns."""
+        rows = len(self) if last is None else min(last, len(self))
+        idx = (self._pos - np.arange(rows - 1, -1, -1)) % self.size
+        df = pd.DataFrame(self._buf[idx, :len(COLUMNS)], columns=COLUMNS)
+        df['time'] = df['time'].astype('int64')
+        df.insert(0, 'time_dt', pd.to_datetime(df['time'], unit='ms'))
+        return df
+
+
+def verify(klines, tolerance=1e-6):
+    """Stream `klines` and compare every indicator against pandas_ta.
+
+    Returns a dict of the largest absolute difference per column
+    (positions where either side is NaN must match as well).
+    """
+    import indicators
+
+    ref = pd.DataFrame([k[:6] for k in klines], columns=OHLCV).apply(pd.to_numeric)
+    ref = indicators.reference_pandas_ta(ref)
+    got = IndicatorStream(size=len(klines)).extend(klines).to_frame()
+
+    report = {}
+    for col in INDICATORS:
+        a, b = ref[col].to_numpy(dtype=float), got[col].to_numpy(dtype=float)
+        nan_mismatch = int((np.isnan(a) != np.isnan(b)).sum())
+        both = ~np.isnan(a) & ~np.isnan(b)
+        report[col] = float(np.abs(a[both] - b[both]).max()) if both.any() else 0.0
+        status = '✅' if nan_mismatch == 0 and report[col] <= tolerance * max(1.0, np.nanmax(np.abs(a))) else '❌'
+        logger.info(f"{status} {col}: max erinevus {report[col]:.3e}, NaN erinevusi {nan_mismatch}")
+    return report
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [stream] %(message)s')
+    if len(sys.argv) > 1:
+        klines = pd.read_csv(sys.argv[1]).iloc[:, :6].values.tolist()
+    else:
+        import bot
+        bot.init(database=False)  # kliendid luuakse init()-is, importimisel on bot.client None
+        klines = bot.client.get_historical_klines(bot.SYMBOL, '1m', "2000 minutes ago UTC")
+    verify(klines)
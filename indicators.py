@@ -0,0 +1,298 @@
+"""Shared indicator library (NumPy kernels, optionally Numba).
+
+One implementation of every feature used by the bot, the backtester and
+the log backfill, replacing the three pandas_ta copies that had drifted
+apart (VWAP only worked with a DatetimeIndex, ema50 existed in two of
+them, the fallbacks differed). The formulas match pandas_ta 0.3.14b:
+
+* rsi, atr: Wilder RMA (`ewm(alpha=1/n, min_periods=n)`)
+* macd, ema: SMA seeded, then `ewm(span=n, adjust=False)`
+* bbands: SMA +- 2 * population std (ddof=0)
+* stoch: raw %K over 14 candles, SMA(3) smoothing, SMA(3) %D
+* vwap: typical price, anchored to the UTC day of `time`
+
+`compute` fills one preallocated (len(COLUMNS), n) float64 array. The
+recursive filters and window kernels use Numba when it is installed;
+otherwise the filters fall back to pandas' compiled ewm and the windows
+to chunked `sliding_window_view` reductions.
+
+`bench_indicators.py` checks the results against pandas_ta and reports
+the speedup.
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if os.getenv('INDICATORS_NUMBA', '1') == '0':
+    njit = None
+
+RSI_LEN = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_LEN, BB_STD = 20, 2.0
+STOCH_K, STOCH_D, STOCH_SMOOTH = 14, 3, 3
+ATR_LEN = 14
+EMA_LENGTHS = (50, 200)
+DAY_MS = 86_400_000
+EPS = sys.float_info.epsilon
+
+COLUMNS = ['rsi', 'macd', 'macd_signal', 'bb_lower', 'bb_upper', 'vwap',
+           'stoch_k', 'stoch_d', 'atr', 'ema50', 'ema200']
+_ROW = {c: i for i, c in enumerate(COLUMNS)}
+
+
+def _first_valid(x):
+    """Index of the first non-NaN value (len(x) when there is none)."""
+    nan = np.isnan(x)
+    first = int(nan.argmin())
+    return x.shape[0] if nan[first] else first
+
+
+# --- rekursiivsed filtrid ---
+
+def _ema_loop(x, length, out):
+    """pandas_ta.ema from the first non-NaN value: SMA seed, then adjust=False."""
+    alpha = 2.0 / (length + 1)
+    n = x.shape[0]
+    start = 0
+    while start < n and x[start] != x[start]:
+        start += 1
+    out[:] = np.nan
+    if n - start < length:
+        return out
+    seed = start + length - 1
+    value = x[start:seed + 1].mean()
+    out[seed] = value
+    for i in range(seed + 1, n):
+        value = alpha * x[i] + (1.0 - alpha) * value
+        out[i] = value
+    return out
+
+
+def _rma_loop(x, length, out):
+    """pandas_ta.rma: ewm(alpha=1/length, min_periods=length), adjust=True, NaN skipped."""
+    decay = 1.0 - 1.0 / length
+    num = 0.0
+    den = 0.0
+    nobs = 0
+    started = False
+    for i in range(x.shape[0]):
+        v = x[i]
+        if v == v:
+            num = v + decay * num
+            den = 1.0 + decay * den
+            nobs += 1
+            started = True
+        elif started:
+            num *= decay
+            den *= decay
+        out[i] = num / den if nobs >= length else np.nan
+    return out
+
+
+def _window_stats_loop(x, length, mean_out, std_out):
+    """Rolling mean and population std, two passes per window."""
+    for i in range(length - 1, x.shape[0]):
+        m = 0.0
+        for j in range(i - length + 1, i + 1):
+            m += x[j]
+        m /= length
+        ss = 0.0
+        for j in range(i - length + 1, i + 1):
+            ss += (x[j] - m) ** 2
+        mean_out[i] = m
+        std_out[i] = (ss / length) ** 0.5
+
+
+def _window_min_max_loop(low, high, length, min_out, max_out):
+    for i in range(length - 1, low.shape[0]):
+        lo = low[i]
+        hi = high[i]
+        for j in range(i - length + 1, i):
+            lo = min(lo, low[j])
+            hi = max(hi, high[j])
+        min_out[i] = lo
+        max_out[i] = hi
+
+
+CHUNK = 1 << 20  # NumPy varuvariandi plokk, hoiab ajutised massiivid vahemälus
+
+
+def _window_stats_numpy(x, length, mean_out, std_out):
+    for start in range(length - 1, x.shape[0], CHUNK):
+        stop = min(start + CHUNK, x.shape[0])
+        windows = sliding_window_view(x[start - length + 1:stop], length)
+        np.mean(windows, axis=1, out=mean_out[start:stop])
+        np.std(windows, axis=1, out=std_out[start:stop])
+
+
+def _window_min_max_numpy(low, high, length, min_out, max_out):
+    for start in range(length - 1, low.shape[0], CHUNK):
+        stop = min(start + CHUNK, low.shape[0])
+        np.min(sliding_window_view(low[start - length + 1:stop], length), axis=1, out=min_out[start:stop])
+        np.max(sliding_window_view(high[start - length + 1:stop], length), axis=1, out=max_out[start:stop])
+
+
+if njit is not None:
+    ema = njit(cache=True)(_ema_loop)
+    rma = njit(cache=True)(_rma_loop)
+    _window_stats_kernel = njit(cache=True)(_window_stats_loop)
+    _window_min_max_kernel = njit(cache=True)(_window_min_max_loop)
+else:
+    _window_stats_kernel = _window_stats_numpy
+    _window_min_max_kernel = _window_min_max_numpy
+
+    def ema(x, length, out):
+        start = _first_valid(x)
+        out[:] = np.nan
+        if x.shape[0] - start < length:
+            return out
+        seeded = x[start:].copy()
+        seeded[:length - 1] = np.nan
+        seeded[length - 1] = x[start:start + length].mean()
+        out[start:] = pd.Series(seeded).ewm(span=length, adjust=False).mean().to_numpy()
+        return out
+
+    def rma(x, length, out):
+        out[:] = pd.Series(x).ewm(alpha=1.0 / length, min_periods=length).mean().to_numpy()
+        return out
+
+
+# --- akna funktsioonid ---
+
+def window_stats(x, length, mean_out, std_out):
+    mean_out[:length - 1] = np.nan
+    std_out[:length - 1] = np.nan
+    if x.shape[0] >= length:
+        _window_stats_kernel(x, length, mean_out, std_out)
+    return mean_out, std_out
+
+
+def window_min_max(low, high, length, min_out, max_out):
+    min_out[:length - 1] = np.nan
+    max_out[:length - 1] = np.nan
+    if low.shape[0] >= length:
+        _window_min_max_kernel(low, high, length, min_out, max_out)
+    return min_out, max_out
+
+
+def _sma_from_first_valid(x, length, out):
+    """SMA applied to `x` starting at its first non-NaN value (pandas_ta ma on .loc[first_valid:])."""
+    out[:] = np.nan
+    start = _first_valid(x)
+    if x.shape[0] - start >= length:
+        window = x[start:]
+        dst = out[start + length - 1:]
+        dst[:] = window[length - 1:]
+        for lag in range(1, length):
+            dst += window[length - 1 - lag:window.shape[0] - lag]
+        dst /= length
+    return out
+
+
+# --- põhifunktsioon ---
+
+def compute(time, high, low, close, volume, out=None):
+    """All indicators for float arrays of equal length.
+
+    Returns (and fills) `out`, a (len(COLUMNS), n) float64 array; row
+    `COLUMNS.index(name)` holds that indicator.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    volume = np.ascontiguousarray(volume, dtype=np.float64)
+    n = close.shape[0]
+    if out is None:
+        out = np.empty((len(COLUMNS), n))
+    tmp = np.empty((3, n))
+
+    # RSI: Wilderi keskmised tõusudest ja langustest
+    diff = tmp[0]
+    diff[0] = np.nan
+    np.subtract(close[1:], close[:-1], out=diff[1:])
+    up = rma(np.clip(diff, 0.0, None), RSI_LEN, tmp[1])  # clip jätab NaN alles
+    down = rma(np.clip(diff, None, 0.0), RSI_LEN, tmp[2])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(100.0 * up, up + np.abs(down), out=out[_ROW['rsi']])
+
+    # MACD
+    fast = ema(close, MACD_FAST, tmp[1])
+    slow = ema(close, MACD_SLOW, tmp[2])
+    macd = np.subtract(fast, slow, out=out[_ROW['macd']])
+    ema(macd, MACD_SIGNAL, out[_ROW['macd_signal']])
+
+    for length in EMA_LENGTHS:
+        ema(close, length, out[_ROW[f'ema{length}']])
+
+    # Bollinger Bands (ddof=0)
+    mid, dev = window_stats(close, BB_LEN, tmp[0], tmp[1])
+    dev *= BB_STD
+    np.subtract(mid, dev, out=out[_ROW['bb_lower']])
+    np.add(mid, dev, out=out[_ROW['bb_upper']])
+
+    # ATR: true range, esimene on NaN
+    tr = tmp[0]
+    tr[0] = np.nan
+    prev_close = close[:-1]
+    np.maximum(high[1:] - low[1:], np.abs(high[1:] - prev_close), out=tr[1:])
+    np.maximum(tr[1:], np.abs(prev_close - low[1:]), out=tr[1:])
+    rma(tr, ATR_LEN, out[_ROW['atr']])
+
+    # Stochastic
+    lowest, highest = window_min_max(low, high, STOCH_K, tmp[0], tmp[1])
+    rng = highest - lowest
+    rng[rng == 0] = EPS
+    raw = np.divide(100.0 * (close - lowest), rng, out=tmp[2])
+    k = _sma_from_first_valid(raw, STOCH_SMOOTH, out[_ROW['stoch_k']])
+    _sma_from_first_valid(k, STOCH_D, out[_ROW['stoch_d']])
+
+    # VWAP, iga UTC päev algab nullist
+    day = np.asarray(time, dtype=np.int64) // DAY_MS
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    pv = np.cumsum((high + low + close) / 3.0 * volume)
+    vol = np.cumsum(volume)
+    lengths = np.diff(np.r_[starts, n])
+    pv -= np.repeat(np.r_[0.0, pv[starts[1:] - 1]], lengths)
+    vol -= np.repeat(np.r_[0.0, vol[starts[1:] - 1]], lengths)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(pv, vol, out=out[_ROW['vwap']])
+    return out
+
+
+def add_indicators(df):
+    """Add every indicator column to an OHLCV DataFrame (time in ms)."""
+    values = compute(df['time'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                     df['close'].to_numpy(), df['volume'].to_numpy())
+    for i, name in enumerate(COLUMNS):
+        df[name] = values[i]
+    return df
+
+
+def reference_pandas_ta(df):
+    """The original pandas_ta computation, kept only for correctness checks."""
+    import pandas_ta as ta
+    df = df.copy()
+    df['rsi'] = ta.rsi(df['close'], length=RSI_LEN)
+    macd = ta.macd(df['close'])
+    df['macd'] = macd.iloc[:, 0]
+    df['macd_signal'] = macd.iloc[:, 2]
+    bbands = ta.bbands(df['close'], length=BB_LEN, std=BB_STD)
+    df['bb_lower'] = bbands.iloc[:, 0]
+    df['bb_upper'] = bbands.iloc[:, 2]
+    idx = pd.DatetimeIndex(pd.to_datetime(df['time'], unit='ms'))
+    df['vwap'] = ta.vwap(df['high'].set_axis(idx), df['low'].set_axis(idx),
+                         df['close'].set_axis(idx), df['volume'].set_axis(idx)).to_numpy()
+    stoch = ta.stoch(df['high'], df['low'], df['close'])
+    df['stoch_k'] = stoch.iloc[:, 0]
+    df['stoch_d'] = stoch.iloc[:, 1]
+    df['atr'] = ta.atr(df['high'], df['low'], df['close'], length=ATR_LEN)
+    for length in EMA_LENGTHS:
+        df[f'ema{length}'] = ta.ema(df['close'], length=length)
+    return df
@@ -0,0 +1,191 @@
+"""Fast model inference for the live bot and the backtesters.
+
+`analyze_signals` used to build a Python list of floats and call the
+sklearn wrapper's `predict_proba` on a nested list, which costs several
+hundred microseconds per decision. `Predictor` wraps a trained model
+once (per model version) and offers:
+
+* `predict_one(values)` for the live tick: scores one float32 row the
+  caller owns (the scheduler ticks symbols in parallel on one
+  `Predictor`, so it keeps no shared row buffer), no DataFrame is built;
+* `predict(X)` for backtests: one call over a float32 matrix.
+
+Backends:
+
+* `numba`: the XGBoost trees are flattened into arrays and walked by a
+  compiled kernel (float32, like XGBoost itself). Used when Numba is
+  installed; `INFERENCE_BACKEND=booster` turns it off.
+* `booster`: the native booster's `inplace_predict`, no DMatrix copy.
+* `sklearn`: plain `predict_proba`, for models that are not XGBoost
+  (e.g. the RandomForest fallback).
+
+`python inference.py [model.pkl]` checks every backend against
+`predict_proba` and reports the per-row and batch speed.
+"""
+import os
+import sys
+import json
+import time
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+BACKEND = os.getenv('INFERENCE_BACKEND', 'auto')
+TOLERANCE = 1e-6
+
+
+def _walk(x, left, right, feature, value, default_left, roots):
+    """Sum of leaf values over all trees for one float32 row."""
+    margin = np.float32(0.0)
+    for t in range(roots.shape[0]):
+        node = roots[t]
+        while left[node] != -1:
+            v = x[feature[node]]
+            if v != v:
+                node = left[node] if default_left[node] else right[node]
+            elif v < value[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        margin += value[node]
+    return margin
+
+
+if njit is not None:
+    _walk = njit(cache=True, inline='always')(_walk)
+
+    @njit(cache=True)
+    def _predict_one(x, left, right, feature, value, default_left, roots, base_margin):
+        margin = base_margin + _walk(x, left, right, feature, value, default_left, roots)
+        return np.float32(1.0) / (np.float32(1.0) + np.exp(-margin))
+
+    @njit(cache=True, parallel=True)
+    def _predict_batch(X, left, right, feature, value, default_left, roots, base_margin, out):
+        for r in prange(X.shape[0]):
+            margin = base_margin + _walk(X[r], left, right, feature, value, default_left, roots)
+            out[r] = np.float32(1.0) / (np.float32(1.0) + np.exp(-margin))
+        return out
+
+
+def _flatten_trees(booster, rounds):
+    """XGBoost JSON dump -> node arrays of the first `rounds` rounds (global child indices)."""
+    model = json.loads(booster.save_raw('json'))['learner']
+    gbtree = model['gradient_booster']['model']
+    trees = gbtree['trees'][:gbtree['iteration_indptr'][rounds]]
+    left, right, feature, value, default_left, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        l = np.asarray(tree['left_children'], dtype=np.int32)
+        r = np.asarray(tree['right_children'], dtype=np.int32)
+        roots.append(offset)
+        left.append(np.where(l == -1, -1, l + offset))
+        right.append(np.where(r == -1, -1, r + offset))
+        feature.append(np.asarray(tree['split_indices'], dtype=np.int32))
+        # lehtedes on split_conditions lehe väärtus (learning rate juba sees)
+        value.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+        default_left.append(np.asarray(tree['default_left'], dtype=np.bool_))
+        offset += len(l)
+    base_score = float(model['learner_model_param']['base_score'].strip('[]'))
+    base_margin = np.float32(np.log(base_score / (1.0 - base_score)))
+    return (np.concatenate(left), np.concatenate(right), np.concatenate(feature),
+            np.concatenate(value), np.concatenate(default_left), np.asarray(roots, dtype=np.int32)), base_margin
+
+
+class Predictor:
+    """Probability of the positive class from one model, via the fastest backend."""
+
+    def __init__(self, model, backend=BACKEND):
+        self.model = model
+        self.n_features = int(getattr(model, 'n_features_in_', 0)) or None
+        self.booster = None
+        self.iteration_range = (0, 0)
+        if hasattr(model, 'get_booster'):
+            self.booster = model.get_booster()
+            # sama puude arv, mida predict_proba kasutaks (early stopping)
+            best = getattr(model, 'best_iteration', None) if _has_best_iteration(model) else None
+            self.iteration_range = (0, best + 1) if best is not None else (0, 0)
+        self.backend = self._choose(backend)
+        if self.backend == 'numba':
+            rounds = self.iteration_range[1] or self.booster.num_boosted_rounds()
+            self._trees, self._base_margin = _flatten_trees(self.booster, rounds)
+            # kompileerimine/soojendus enne esimest päris otsust
+            self.predict_one(self.new_row())
+
+    def _choose(self, backend):
+        if self.booster is None:
+            return 'sklearn'
+        config = json.loads(self.booster.save_config())['learner']
+        numba_ok = (njit is not None and config['objective']['name'] == 'binary:logistic'
+                    and config['gradient_booster']['name'] == 'gbtree')
+        if backend == 'auto':
+            return 'numba' if numba_ok else 'booster'
+        if backend == 'numba' and not numba_ok:
+            return 'booster'
+        return backend
+
+    def new_row(self):
+        """A fresh all-NaN float32 row for `predict_one` (one per call, not shared between threads)."""
+        return np.full(self.n_features or 0, np.nan, dtype=np.float32)
+
+    def predict_one(self, values):
+        """Probability for one row of `n_features` values."""
+        x = np.ascontiguousarray(values, dtype=np.float32)
+        if self.backend == 'numba':
+            return float(_predict_one(x, *self._trees, self._base_margin))
+        return float(self.predict(x.reshape(1, -1))[0])
+
+    def predict(self, X):
+        """Probabilities for every row of a (n, n_features) matrix."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if self.backend == 'numba':
+            return _predict_batch(X, *self._trees, self._base_margin, np.empty(len(X), dtype=np.float32))
+        if self.backend == 'booster':
+            return self.booster.inplace_predict(X, iteration_range=self.iteration_range)
+        return self.model.predict_proba(X)[:, 1]
+
+
+def _has_best_iteration(model):
+    # XGBClassifier.best_iteration tõstab AttributeError-i, kui early stopping'ut polnud
+    try:
+        return model.best_iteration is not None
+    except AttributeError:
+        return False
+
+
+def _bench(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == '__main__':
+    import joblib
+    path = sys.argv[1] if len(sys.argv) > 1 else 'trading_brain_xgb.pkl'
+    model = joblib.load(path)
+    n_features = model.n_features_in_
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(1_000_000, n_features)).astype(np.float32) * 50
+    X[rng.random(X.shape) < 0.01] = np.nan
+    reference = model.predict_proba(X[:100_000])[:, 1]
+
+    ok = True
+    for backend in ('sklearn', 'booster', 'numba'):
+        p = Predictor(model, backend)
+        if p.backend != backend:
+            print(f"{backend:<8} ei ole saadaval (kasutaks {p.backend})")
+            continue
+        batch = p.predict(X[:100_000])
+        single = np.array([p.predict_one(x) for x in X[:2000]])
+        diff = max(float(np.abs(batch - reference).max()), float(np.abs(single - reference[:2000]).max()))
+        ok &= diff <= TOLERANCE
+        one = _bench(lambda: [p.predict_one(x) for x in X[:2000]], 3) / 2000
+        rows = len(X) / _bench(lambda: p.predict(X), 3)
+        print(f"{backend:<8} {'OK ' if diff <= TOLERANCE else 'FAIL'} max diff {diff:.1e} | "
+              f"üks rida {one * 1e6:8.1f} µs | partii {rows / 1e6:6.2f} M rida/s")
+    sys.exit(0 if ok else 1)
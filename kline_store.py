@@ -0,0 +1,218 @@
+"""Local on-disk kline store.
+
+Closed klines are kept as one NumPy file per symbol, interval and UTC day:
+
+    data/klines/BTCUSDT/1m/2026-02-23.npy
+
+Each file holds a float64 array of shape (6, n): time, open, high, low,
+close, volume, so every column is contiguous on disk. Reads use
+`np.load(mmap_mode='r')`, which means a range read only touches the pages
+it needs and single-day reads are zero-copy views. `sync` detects missing
+candles per day and fetches only those ranges from Binance.
+
+Candles the exchange never produced (outages) would look missing on
+every run. When a fetch returns nothing for settled candles (closed at
+least an hour ago), their open times are kept in a per-day marker,
+`2026-02-23.empty.npy`, and `gaps` no longer reports them, so repeated
+backtests stay offline.
+
+Usage:
+    python kline_store.py BTCUSDT "365 days ago UTC"
+"""
+import os
+import sys
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+KLINE_DIR = os.getenv('KLINE_DIR', os.path.join('data', 'klines'))
+COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+DAY_MS = 86_400_000
+UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': DAY_MS, 'w': 7 * DAY_MS}
+SETTLE_MS = 3_600_000  # alles nii ammu sulgunud küünla puudumist loetakse börsi katkestuseks
+_write_lock = threading.Lock()  # päevafaili loe-liida-kirjuta ei tohi lõimede vahel põimuda
+
+
+def _to_ms(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # binance pakett (ja dateparser) laaditakse alles tekstilise kuupäeva korral
+        from binance.helpers import date_to_milliseconds
+        return date_to_milliseconds(value)
+    return int(value)
+
+
+def _interval_ms(interval):
+    """Binance interval ('1m', '1h', '1d', '1w') in milliseconds."""
+    return int(interval[:-1]) * UNIT_MS[interval[-1]]
+
+
+def _day_path(symbol, interval, day, root=KLINE_DIR):
+    name = datetime.fromtimestamp(day * DAY_MS / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+    return os.path.join(root, symbol, interval, name + '.npy')
+
+
+def _empty_path(symbol, interval, day, root=KLINE_DIR):
+    return _day_path(symbol, interval, day, root)[:-len('.npy')] + '.empty.npy'
+
+
+def _read_day(symbol, interval, day, root=KLINE_DIR):
+    path = _day_path(symbol, interval, day, root)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def _read_empty(symbol, interval, day, root=KLINE_DIR):
+    """Open times the exchange has no candle for (checked by an earlier `sync`)."""
+    path = _empty_path(symbol, interval, day, root)
+    return np.load(path) if os.path.exists(path) else None
+
+
+def _write_day(symbol, interval, day, data, root=KLINE_DIR, path=None):
+    path = path or _day_path(symbol, interval, day, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, np.ascontiguousarray(data, dtype=np.float64))
+    os.replace(tmp, path)
+
+
+def append(symbol, interval, klines, root=KLINE_DIR):
+    """Merge Binance kline rows into the day partitions (dedupe by open time)."""
+    if len(klines) == 0:
+        return 0
+    rows = np.array([k[:6] for k in klines], dtype=np.float64).T
+    days = (rows[0] // DAY_MS).astype(np.int64)
+    with _write_lock:
+        _append_days(symbol, interval, rows, days, root)
+    return rows.shape[1]
+
+
+def _append_days(symbol, interval, rows, days, root):
+    for day in np.unique(days):
+        new = rows[:, days == day]
+        old = _read_day(symbol, interval, day, root)
+        merged = new if old is None else np.concatenate([np.asarray(old), new], axis=1)
+        # Uuem rida võidab, kui sama aeg on mõlemas
+        _, keep = np.unique(merged[0][::-1], return_index=True)
+        merged = merged[:, merged.shape[1] - 1 - keep]
+        _write_day(symbol, interval, day, merged, root)
+
+
+def _mark_empty(symbol, interval, times, root=KLINE_DIR):
+    """Remember open times the exchange returned no candle for."""
+    times = np.asarray(times, dtype=np.int64)
+    days = times // DAY_MS
+    with _write_lock:
+        for day in np.unique(days):
+            old = _read_empty(symbol, interval, day, root)
+            merged = np.union1d(times[days == day], old if old is not None else [])
+            _write_day(symbol, interval, day, merged, root, path=_empty_path(symbol, interval, day, root))
+
+
+def gaps(symbol, interval, start, end=None, root=KLINE_DIR):
+    """Missing (start_ms, end_ms) ranges of closed candles between start and end."""
+    step = _interval_ms(interval)
+    start_ms = _to_ms(start)
+    start_ms += -start_ms % step
+    last_closed = (_to_ms(end) if end is not None else _now_ms()) // step * step - step
+    ranges = []
+    for day in range(start_ms // DAY_MS, last_closed // DAY_MS + 1):
+        expected = np.arange(max(start_ms, day * DAY_MS), min(last_closed, (day + 1) * DAY_MS - 1) + 1, step)
+        stored = _read_day(symbol, interval, day, root)
+        missing = expected if stored is None else expected[~np.isin(expected, stored[0])]
+        empty = _read_empty(symbol, interval, day, root) if missing.size else None
+        if empty is not None:
+            missing = missing[~np.isin(missing, empty)]
+        if missing.size == 0:
+            continue
+        # Järjestikused puuduvad küünlad üheks vahemikuks
+        breaks = np.flatnonzero(np.diff(missing) != step)
+        for lo, hi in zip(np.r_[0, breaks + 1], np.r_[breaks, missing.size - 1]):
+            if ranges and ranges[-1][1] + step == missing[lo]:
+                ranges[-1] = (ranges[-1][0], int(missing[hi]))
+            else:
+                ranges.append((int(missing[lo]), int(missing[hi])))
+    return ranges
+
+
+def sync(client, symbol, interval, start, end=None, root=KLINE_DIR):
+    """Fetch only the missing closed candles from Binance into the store."""
+    fetched = empty = 0
+    step = _interval_ms(interval)
+    for lo, hi in gaps(symbol, interval, start, end, root):
+        klines = client.get_historical_klines(symbol, interval, lo, hi)
+        # Ainult suletud küünlad, kujunev küünal tuleks hiljem uuesti
+        klines = [k for k in klines if int(k[0]) + step <= _now_ms()]
+        fetched += append(symbol, interval, klines, root)
+        # Settinud küünlad, mida börs ei tagastanud, on katkestus: neid ei küsita uuesti
+        settled = np.arange(lo, min(hi, _now_ms() - SETTLE_MS - step) + 1, step)
+        absent = settled[~np.isin(settled, [int(k[0]) for k in klines])]
+        if absent.size:
+            _mark_empty(symbol, interval, absent, root)
+            empty += absent.size
+    if fetched:
+        logger.info(f"📥 {symbol} {interval}: lisatud {fetched} küünalt")
+    if empty:
+        logger.info(f"🕳️ {symbol} {interval}: {empty} küünalt puudub ka börsil, märgitud tühjaks")
+    return fetched
+
+
+def iter_days(symbol, interval, start, end=None, root=KLINE_DIR):
+    """Yield (6, n) memory-mapped views per day within [start, end]."""
+    start_ms, end_ms = _to_ms(start), _to_ms(end) if end is not None else _now_ms()
+    for day in range(start_ms // DAY_MS, end_ms // DAY_MS + 1):
+        data = _read_day(symbol, interval, day, root)
+        if data is None:
+            continue
+        lo = np.searchsorted(data[0], start_ms, side='left')
+        hi = np.searchsorted(data[0], end_ms, side='right')
+        if hi > lo:
+            yield data[:, lo:hi]
+
+
+def load_arrays(symbol, interval, start, end=None, root=KLINE_DIR):
+    """Columns as 1-D float64 arrays; a single-day range is a view of the mmap."""
+    parts = list(iter_days(symbol, interval, start, end, root))
+    if not parts:
+        return {c: np.empty(0) for c in COLUMNS}
+    data = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+    return dict(zip(COLUMNS, data))
+
+
+def load(symbol, interval, start, end=None, root=KLINE_DIR):
+    """Range read into a DataFrame with the same OHLCV columns as the bot."""
+    arrays = load_arrays(symbol, interval, start, end, root)
+    df = pd.DataFrame(arrays, copy=False)
+    df['time'] = df['time'].astype('int64')
+    return df
+
+
+def get_klines(client, symbol, interval, start, end=None, root=KLINE_DIR):
+    """Sync missing candles, then read the range from disk."""
+    sync(client, symbol, interval, start, end, root)
+    return load(symbol, interval, start, end, root)
+
+
+def _now_ms():
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [klines] %(message)s')
+    from binance.client import Client
+    from dotenv import load_dotenv
+    load_dotenv()
+    symbol = sys.argv[1] if len(sys.argv) > 1 else 'BTCUSDT'
+    start = sys.argv[2] if len(sys.argv) > 2 else '30 days ago UTC'
+    client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
+    sync(client, symbol, '1m', start)
+    remaining = gaps(symbol, '1m', start)
+    logger.info(f"✅ {symbol}: {len(remaining)} auku alles (börsi katkestused)")
@@ -0,0 +1,11 @@
+"""Keyset paging through `trade_logs` by a `(created_at, id)` cursor.
+
+Shared by the readers (`feature_cache`, `dashboard_data`, `backtest`):
+one batch insert gives many rows the same `created_at`, so the time alone
+would skip or repeat rows at a page boundary.
+"""
+
+
+def cursor_filter(created_at, row_id):
+    """PostgREST `or` filter for `trade_logs` rows after the (created_at, id) cursor."""
+    return f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id})'
@@ -0,0 +1,156 @@
+"""Batched background writer for `trade_logs`.
+
+`TradeLogWriter.write(row)` only puts the row on a queue, so the trading
+loop never waits on Supabase. A background thread flushes the queue as
+multi-row inserts when `batch_size` rows are waiting or `flush_interval`
+seconds have passed. If an insert fails, the batch is appended to a local
+JSON-lines spool file; the spool is replayed after the next successful
+insert, so a database outage does not lose rows. The replay records how
+many rows it has sent after every batch, so a restart in the middle of a
+replay continues from there instead of inserting the sent rows twice.
+Rows carry their own
+`created_at` (set by `bot.log_to_supabase`), so replayed rows keep the
+time they were logged instead of the database default at insert.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = 'trade_logs.spool.jsonl'
+STATS_EVERY = 300  # sekundit
+
+
+class TradeLogWriter:
+    def __init__(self, insert, batch_size=50, flush_interval=2.0, spool_path=SPOOL_PATH):
+        """`insert(rows)` performs one multi-row insert and raises on failure."""
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.flushed = 0
+        self.spooled = 0
+        self.last_flush_ms = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def write(self, row):
+        if self._thread is None:
+            self._start()
+        self._queue.put(row)
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'flushed': self.flushed,
+            'spooled': self.spooled,
+            'spool_bytes': os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0,
+            'last_flush_ms': self.last_flush_ms,
+        }
+
+    def close(self, timeout=10):
+        """Flush what is queued and stop the thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='trade-log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _take_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.2)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self):
+        next_report = time.monotonic() + STATS_EVERY
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch and self._flush(batch) and self._has_spool():
+                self._replay_spool()
+            if time.monotonic() >= next_report:
+                logger.info(f"📊 Logikirjutaja: {self.stats()}")
+                next_report = time.monotonic() + STATS_EVERY
+
+    def _flush(self, rows, spool=True):
+        started = time.perf_counter()
+        try:
+            self.insert(rows)
+        except Exception as e:
+            if not spool:
+                logger.error(f"❌ Logimise viga kettalt saatmisel, jätkan hiljem: {e}")
+                return False
+            logger.error(f"❌ Logimise viga, {len(rows)} rida kettale: {e}")
+            self._spool(rows)
+            return False
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.flushed += len(rows)
+        return True
+
+    def _has_spool(self):
+        return os.path.exists(self.spool_path) or os.path.exists(self.spool_path + '.replay')
+
+    def _spool(self, rows):
+        with open(self.spool_path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.spooled += len(rows)
+
+    @staticmethod
+    def _save_offset(path, sent):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(sent))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _replay_spool(self):
+        # Nimetame faili ümber, et uued vead kirjutaksid värskesse faili
+        replay_path = self.spool_path + '.replay'
+        offset_path = replay_path + '.offset'
+        if not os.path.exists(replay_path):
+            if os.path.exists(offset_path):
+                os.remove(offset_path)  # eelmise, lõpuni saadetud faili oma
+            os.replace(self.spool_path, replay_path)
+        with open(replay_path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        sent = 0
+        if os.path.exists(offset_path):
+            with open(offset_path) as f:
+                sent = int(f.read().strip() or 0)
+        logger.info(f"♻️ Saadan kettalt {len(rows) - sent} puhverdatud rida"
+                    + (f" ({sent} saadeti enne katkestust)" if sent else ""))
+        for i in range(sent, len(rows), self.batch_size):
+            batch = rows[i:i + self.batch_size]
+            if not self._flush(batch, spool=False):
+                # Fail ja nihe jäävad alles: järgmine õnnestunud insert jätkab samast reast
+                return
+            self._save_offset(offset_path, i + len(batch))
+        os.remove(replay_path)
+        if os.path.exists(offset_path):
+            os.remove(offset_path)
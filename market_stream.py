@@ -0,0 +1,172 @@
+"""Websocket market data ingestion (kline + partial depth).
+
+`MarketStream` subscribes to the `<symbol>@kline_1m` and
+`<symbol>@depth10@100ms` combined streams in a background thread and
+keeps, per symbol, an `IndicatorStream` candle buffer and the latest
+top-of-book snapshot. `bot.get_market_data` and
+`bot.get_order_book_status` read from this state instead of calling the
+REST API on every tick.
+
+After every (re)connect the candle buffer is resynced from a REST
+snapshot (only the candles missing since the last one seen) together
+with the order book, then the buffered stream messages take over.
+`wait_closed` lets `candle_clock` start a tick as soon as the stream has
+seen a candle close.
+`fake_exchange.py` provides a local server for offline runs.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from indicator_stream import IndicatorStream
+
+logger = logging.getLogger(__name__)
+
+WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')
+DEPTH_LEVELS = 10
+STALE_AFTER = 10  # sekundit ilma sõnumita -> voog loetakse aegunuks
+MAX_BACKOFF = 30
+
+
+class MarketStream:
+    def __init__(self, client, symbols, ws_url=WS_URL, history=500):
+        self.client = client
+        self.symbols = [s.upper() for s in symbols]
+        self.ws_url = ws_url.rstrip('/')
+        self.history = history
+        self.candles = {s: IndicatorStream(size=history) for s in self.symbols}
+        self.books = {s: {'bids': [], 'asks': []} for s in self.symbols}
+        self.last_message = {s: 0.0 for s in self.symbols}
+        self.closed_until = {s: 0 for s in self.symbols}  # ms; kõik enne seda algavad küünlad on suletud
+        self.reconnects = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._ws = None
+
+    # --- avalik API ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self._thread_main, name='market-stream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def is_live(self, symbol):
+        symbol = symbol.upper()
+        return (symbol in self.candles and len(self.candles[symbol]) > 0
+                and time.time() - self.last_message[symbol] < STALE_AFTER)
+
+    def frame(self, symbol):
+        with self._lock:
+            return self.candles[symbol.upper()].to_frame()
+
+    def wait_closed(self, boundary_ms, timeout, symbols=None):
+        """Wait until the candle ending at `boundary_ms` has closed for all symbols."""
+        symbols = [s.upper() for s in symbols] if symbols else self.symbols
+        with self._closed:
+            return self._closed.wait_for(
+                lambda: all(self.closed_until[s] >= boundary_ms for s in symbols), max(0.0, timeout))
+
+    def pressure(self, symbol):
+        """Bid/ask notional ratio of the local book (same as get_order_book_status)."""
+        with self._lock:
+            book = self.books[symbol.upper()]
+            bids = sum(p * q for p, q in book['bids'])
+            asks = sum(p * q for p, q in book['asks'])
+        return bids / asks if asks else 1.0
+
+    # --- sisemine ---
+
+    def _url(self):
+        streams = []
+        for s in self.symbols:
+            streams += [f"{s.lower()}@kline_1m", f"{s.lower()}@depth{DEPTH_LEVELS}@100ms"]
+        return f"{self.ws_url}/stream?streams={'/'.join(streams)}"
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+
+    async def _run(self):
+        import websockets  # alles voo käivitamisel, replay ja tööriistad ei vaja seda
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self._url(), max_queue=None) as ws:
+                    self._ws = ws
+                    # Voo sõnumid ootavad puhvris, kuni REST hetktõmmis on peale laetud
+                    await asyncio.get_running_loop().run_in_executor(None, self.resync)
+                    backoff = 1
+                    async for msg in ws:
+                        self._handle(json.loads(msg))
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"⚠️ Turuvoog katkes ({e}), uus katse {backoff}s pärast")
+            finally:
+                self._ws = None
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def resync(self):
+        """Fill candles missing since the last one seen and reload the order books."""
+        for s in self.symbols:
+            stream = self.candles[s]
+            last = stream.last_time
+            missing = (int(time.time() * 1000) - last) // 60_000 + 2 if last else None
+            if missing is None or missing >= self.history:
+                klines = self.client.get_klines(symbol=s, interval='1m', limit=self.history)
+                stream = IndicatorStream(size=self.history)
+            else:
+                klines = self.client.get_klines(symbol=s, interval='1m', limit=int(missing))
+            depth = self.client.get_order_book(symbol=s, limit=DEPTH_LEVELS)
+            with self._lock:
+                stream.extend(klines)
+                self.candles[s] = stream
+                self._set_book(s, depth)
+                # Viimane REST küünal võib veel kujuneda, eelmised on suletud
+                self.closed_until[s] = max(self.closed_until[s], stream.last_time or 0)
+                self._closed.notify_all()
+            self.last_message[s] = time.time()
+        logger.info(f"🔄 Turuvoog sünkroniseeritud REST-ist ({', '.join(self.symbols)})")
+
+    def _set_book(self, symbol, depth):
+        self.books[symbol] = {
+            'bids': [(float(p), float(q)) for p, q in depth['bids'][:DEPTH_LEVELS]],
+            'asks': [(float(p), float(q)) for p, q in depth['asks'][:DEPTH_LEVELS]],
+        }
+
+    def _handle(self, msg):
+        name, data = msg.get('stream', ''), msg.get('data', {})
+        symbol = name.split('@', 1)[0].upper()
+        if symbol not in self.candles:
+            return
+        with self._lock:
+            if data.get('e') == 'kline':
+                k = data['k']
+                self.candles[symbol].update([k['t'], k['o'], k['h'], k['l'], k['c'], k['v']])
+                # Uue küünla esimene sõnum sulgeb ka eelmise, kui 'x' sõnum jäi vahele
+                closed = k['t'] + 60_000 if k.get('x') else k['t']
+                if closed > self.closed_until[symbol]:
+                    self.closed_until[symbol] = closed
+                    self._closed.notify_all()
+            elif 'bids' in data:
+                self._set_book(symbol, data)
+        self.last_message[symbol] = time.time()
@@ -0,0 +1,323 @@
+"""In-process metrics for the bot tick.
+
+Every stage of a tick (kline fetch, indicators, settings, order book,
+model load, inference, trade log insert) is timed with `timer(stage)`.
+The last `WINDOW` samples of each stage are kept for p50/p95/p99, next to
+all-time count and sum. Counters record errors and retries, gauges the
+data staleness (age of the last candle) and the log writer / market
+stream state.
+
+`serve(port)` exposes everything over HTTP:
+
+    /metrics          Prometheus text format
+    /metrics.json     the same as JSON
+    /profile/start    start profiling (?mode=cprofile or ?mode=sample)
+    /profile/stop     stop and return the top functions as text
+
+cProfile only sees the threads that run `tick()`, one tick at a time:
+only one profiler can be active (Python 3.12+), so with the scheduler's
+concurrent ticks the others run unprofiled and are counted in the report.
+The sampling profiler looks at every thread from `sys._current_frames()`
+and costs nothing while it is off.
+
+Usage:
+    METRICS_PORT=9101 python bot.py
+    curl localhost:9101/metrics
+    curl 'localhost:9101/profile/start?mode=sample'; sleep 60; curl localhost:9101/profile/stop
+"""
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import collections
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'bot'
+WINDOW = 2048  # viimast mõõtmist etapi kohta protsentiilide jaoks
+QUANTILES = (0.5, 0.95, 0.99)
+SAMPLE_INTERVAL = 0.01  # sekundit, proovivõtva profileerija samm
+PROFILE_TOP = 40
+
+_lock = threading.Lock()
+_samples = {}   # etapp -> deque sekundites
+_totals = {}    # etapp -> [count, sum]
+_counters = collections.Counter()  # (nimi, sildid) -> väärtus
+_gauges = {}    # (nimi, sildid) -> väärtus
+_collectors = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(stage, seconds):
+    with _lock:
+        if stage not in _samples:
+            _samples[stage] = collections.deque(maxlen=WINDOW)
+            _totals[stage] = [0, 0.0]
+        _samples[stage].append(seconds)
+        _totals[stage][0] += 1
+        _totals[stage][1] += seconds
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def counter(name, **labels):
+    """Current value of a counter (0 if it was never incremented)."""
+    with _lock:
+        return _counters[_key(name, labels)]
+
+
+def gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def reset():
+    """Forget all samples, counters and gauges (between benchmark runs)."""
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def register_collector(collect):
+    """`collect()` returns {name: value} gauges, read at every snapshot."""
+    _collectors.append(collect)
+
+
+@contextmanager
+def timer(stage):
+    """Time a block as `stage`; an exception leaving it counts as an error."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        inc('errors_total', stage=stage)
+        if getattr(e, 'status_code', None) in (418, 429):  # Binance päringulimiit
+            inc('rate_limited_total', stage=stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def _quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def snapshot():
+    gauges = {}
+    for collect in _collectors:
+        try:
+            for name, value in collect().items():
+                if value is not None:
+                    gauges[(name, ())] = float(value)
+        except Exception as e:
+            logger.warning(f"Mõõdikute koguja viga: {e}")
+    with _lock:
+        stages = {}
+        for stage, samples in _samples.items():
+            values = sorted(samples)
+            count, total = _totals[stage]
+            stages[stage] = {'count': count, 'sum': total, 'max': values[-1],
+                             **{f'p{int(q * 100)}': _quantile(values, q) for q in QUANTILES}}
+        counters = dict(_counters)
+        gauges.update(_gauges)
+    return {
+        'stages': stages,
+        'counters': [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in counters.items()],
+        'gauges': [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in gauges.items()],
+    }
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+def prometheus():
+    snap = snapshot()
+    lines = [f'# TYPE {PREFIX}_stage_seconds summary']
+    for stage, s in sorted(snap['stages'].items()):
+        for q in QUANTILES:
+            lines.append(f'{PREFIX}_stage_seconds{_labels({"stage": stage, "quantile": q})} {s[f"p{int(q * 100)}"]:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{_labels({"stage": stage})} {s["sum"]:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_count{_labels({"stage": stage})} {s["count"]}')
+    for kind, items in (('counter', snap['counters']), ('gauge', snap['gauges'])):
+        for name in sorted({m['name'] for m in items}):
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for m in items:
+                if m['name'] == name:
+                    lines.append(f'{PREFIX}_{name}{_labels(m["labels"])} {m["value"]:g}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- profileerimine ---
+
+class Profiler:
+    """Runtime toggled profiling: cProfile per tick, or stack sampling."""
+
+    def __init__(self):
+        self.mode = None
+        self.started = None
+        self._lock = threading.Lock()
+        self._stats = None                       # cprofile: kogutud pstats.Stats
+        self._counts = collections.Counter()     # sample: (fail, rida, funktsioon) -> proove
+        self._samples = 0
+        self._thread = None
+        self._active = threading.Lock()          # cprofile: korraga üks profileeritav tikk
+        self._ticks = collections.Counter()      # cprofile: profileeritud / vahele jäetud tikid
+
+    def start(self, mode='cprofile'):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"tundmatu profileerimise režiim: {mode}")
+        with self._lock:
+            if self.mode is not None:
+                return False
+            self.mode, self.started = mode, time.time()
+            self._stats, self._counts, self._samples = None, collections.Counter(), 0
+            self._ticks = collections.Counter()
+        if mode == 'sample':
+            self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+            self._thread.start()
+        logger.info(f"🔬 Profileerimine käivitatud ({mode})")
+        return True
+
+    def stop(self):
+        """Stop profiling and return the report text."""
+        with self._lock:
+            mode, self.mode = self.mode, None
+        if mode is None:
+            return "profileerimine ei käi\n"
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info(f"🔬 Profileerimine peatatud ({mode})")
+        return self._report(mode)
+
+    @contextmanager
+    def tick(self):
+        if self.mode != 'cprofile':
+            yield
+            return
+        if not self._active.acquire(blocking=False):
+            # Teine lõim profileerib juba: teist profiilijat ei saa samal ajal käivitada
+            with self._lock:
+                self._ticks['skipped'] += 1
+            yield
+            return
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._ticks['profiled'] += 1
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profile)
+                    else:
+                        self._stats.add(profile)
+        finally:
+            self._active.release()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.mode == 'sample':
+            seen = set()  # iga funktsioon loeb proovi kohta ühe korra (rekursioon, mitu lõime)
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                while frame is not None:
+                    code = frame.f_code
+                    site = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if site not in seen:
+                        self._counts[site] += 1
+                        seen.add(site)
+                    frame = frame.f_back
+            self._samples += 1
+            time.sleep(SAMPLE_INTERVAL)
+
+    def _report(self, mode):
+        elapsed = time.time() - self.started
+        out = io.StringIO()
+        out.write(f"{mode}, {elapsed:.1f}s\n")
+        if mode == 'cprofile':
+            out.write(f"{self._ticks['profiled']} tikki profileeritud, "
+                      f"{self._ticks['skipped']} samaaegset tikki vahele jäetud\n")
+            if self._stats is None:
+                out.write("ühtegi tikki ei profileeritud\n")
+            else:
+                self._stats.stream = out
+                self._stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        else:
+            out.write(f"{self._samples} proovi, kumulatiivne osa proovidest\n")
+            for (path, line, name), count in self._counts.most_common(PROFILE_TOP):
+                out.write(f"{100 * count / max(self._samples, 1):6.1f}%  {name}  {path}:{line}\n")
+        return out.getvalue()
+
+
+profiler = Profiler()
+
+
+@contextmanager
+def tick(symbol=None):
+    """Wrap one bot tick: total latency, tick counter and the cProfile hook."""
+    with profiler.tick(), timer('tick'):
+        yield
+    inc('ticks_total', **({'symbol': symbol} if symbol else {}))
+
+
+# --- HTTP ---
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/metrics':
+            self._send(200, prometheus(), 'text/plain; version=0.0.4')
+        elif url.path == '/metrics.json':
+            self._send(200, json.dumps(snapshot()), 'application/json')
+        elif url.path == '/profile/start':
+            try:
+                started = profiler.start(query.get('mode', ['cprofile'])[0])
+            except ValueError as e:
+                return self._send(400, f"{e}\n")
+            self._send(200 if started else 409, "ok\n" if started else f"juba käib ({profiler.mode})\n")
+        elif url.path == '/profile/stop':
+            self._send(200, profiler.stop())
+        else:
+            self._send(404, "not found\n")
+
+    def _send(self, status, body, content_type='text/plain'):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    """Start the metrics endpoint in a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"📈 Mõõdikud: http://{host}:{port}/metrics")
+    return server
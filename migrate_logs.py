@@ -1,88 +1,213 @@
 """Backfill missing indicator columns in `trade_logs` table.
 
-This script fetches all rows where one of the new features is null and
-recomputes them based on the market data at the time of the log.
-It uses the same indicator functions as `bot.get_market_data`.
+This script pages through the whole table by id, finds rows where one of
+the new features is null and recomputes them based on the market data at
+the time of the log. It uses the shared `indicators` module, like the bot
+and the backtester.
+
+Rows are grouped into contiguous time ranges. Each range is fetched once
+(through the local `kline_store`) with enough warm-up candles for EMA200,
+the indicators are computed over the whole range in one pass and joined
+to the rows by candle open time. Ranges run concurrently under a request
+weight limit, results are written back with batched upserts, and the last
+processed id is checkpointed so an interrupted run resumes where it
+stopped.
 
 Usage:
-    python migrate_logs.py
+    python migrate_logs.py            # resume from the checkpoint
+    python migrate_logs.py --restart  # start from the first row again
 """
 import os
+import sys
+import json
 import time
+import threading
 import pandas as pd
-import pandas_ta as ta
-from binance.client import Client
-from supabase import create_client
+import numpy as np
+import indicators
+import features
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import logging
+import kline_store
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - [migrate] %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
-supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+client = None  # Binance ja Supabase kliendid luuakse init()-is
+supabase = None
 SYMBOL = 'BTCUSDT'
+BACKFILL_COLUMNS = ['volume', 'vwap', 'stoch_k', 'stoch_d'] + features.TIMEFRAME_COLUMNS
+# upsert peab sisaldama ka kohustuslikke veerge, muidu INSERT osa kukub läbi
+KEY_COLUMNS = ['id', 'created_at', 'symbol', 'action', 'price']
+WARMUP_MINUTES = max(1000, features.warmup_minutes())  # EMA200 ja kõrgemate ajaraamide soojendus
+MAX_RANGE_GAP = 120     # minutit; suurem vahe logide vahel alustab uue vahemiku
+PAGE_SIZE = 1000
+UPSERT_BATCH = 500
+CONCURRENCY = 4
+WEIGHT_PER_MINUTE = 600  # pool Binance'i 1200 limiidist jääb live botile
+CHECKPOINT_PATH = 'migrate_logs.checkpoint.json'
+
+
+def init():
+    global client, supabase
+    if client is None:
+        from binance.client import Client
+        client = Client(os.getenv('BINANCE_API_KEY'), os.getenv('BINANCE_API_SECRET'))
+    if supabase is None:
+        from supabase import create_client
+        supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+
 
+class RateLimitedClient:
+    """Passes kline requests to the client within a request weight budget."""
+
+    def __init__(self, client, per_minute=WEIGHT_PER_MINUTE):
+        self.client = client
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._used = []  # (time, weight)
+
+    def _acquire(self, weight):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._used = [(t, w) for t, w in self._used if now - t < 60]
+                if sum(w for _, w in self._used) + weight <= self.per_minute:
+                    self._used.append((now, weight))
+                    return
+            time.sleep(0.5)
+
+    def get_historical_klines(self, symbol, interval, start, end=None, **kwargs):
+        minutes = ((kline_store._to_ms(end) if end else kline_store._now_ms()) - kline_store._to_ms(start)) // 60_000
+        # 1000 küünalt päringu kohta, kaal 2 päringu kohta
+        self._acquire(2 * (int(minutes) // 1000 + 1))
+        return self.client.get_historical_klines(symbol, interval, start, end, **kwargs)
 
-# copy of indicator logic, returns df with new columns present
 
 def enrich_df(df: pd.DataFrame) -> pd.DataFrame:
-    df['rsi'] = ta.rsi(df['close'], length=14)
-    macd = ta.macd(df['close'])
-    df['macd'] = macd.iloc[:, 0]
-    df['macd_signal'] = macd.iloc[:, 2]
-    bbands = ta.bbands(df['close'], length=20, std=2)
-    df['bb_lower'] = bbands.iloc[:, 0]
-    df['bb_upper'] = bbands.iloc[:, 2]
-    df['ema50'] = ta.ema(df['close'], length=50)
-    df['ema200'] = ta.ema(df['close'], length=200)
-    df['atr'] = ta.atr(df['high'], df['low'], df['close'], length=14)
-    try:
-        df['vwap'] = ta.vwap(df['high'], df['low'], df['close'], df['volume'])
-        stoch = ta.stoch(df['high'], df['low'], df['close'])
-        df['stoch_k'] = stoch.iloc[:, 0]
-        df['stoch_d'] = stoch.iloc[:, 1]
-    except Exception:
-        pass
-    return df
-
-
-def backfill_records(limit=100):
-    # fetch rows missing any of the target columns
-    cols = ['volume', 'vwap', 'stoch_k', 'stoch_d']
-    query = supabase.table('trade_logs')
-    for c in cols:
-        query = query.or_(f"{c}.is.null")
-    # supabase-python doesn't support or chaining easily; so we'll simply
-    # do select and filter in pandas below.
-    res = supabase.table('trade_logs').select('*').limit(limit).execute()
-    if not res.data:
-        logger.info('No rows returned.')
-        return
-    df = pd.DataFrame(res.data)
-    to_process = df[[c for c in cols if c in df.columns]].isna().any(axis=1)
-    df = df[to_process]
-    logger.info(f"Processing {len(df)} rows for backfill")
-
-    for idx, row in df.iterrows():
-        ts = row['created_at']
-        # fetch a bit of market data around the timestamp
-        try:
-            end = pd.to_datetime(ts).strftime('%Y-%m-%d %H:%M:%S') + ' UTC'
-            klines = client.get_historical_klines(SYMBOL, '1m', end, limit=10)
-            mdf = pd.DataFrame(klines, columns=['time','open','high','low','close','volume','_','_','_','_','_','_'])
-            mdf[['open','high','low','close','volume']] = mdf[['open','high','low','close','volume']].apply(pd.to_numeric)
-            mdf = enrich_df(mdf)
-            # take the last row (closest to timestamp)
-            newvals = mdf.iloc[-1]
-            update = {k: float(newvals[k]) for k in cols if k in newvals}
-            if update:
-                logger.info(f"Updating row {row['id']} with {update}")
-                supabase.table('trade_logs').update(update).eq('id', row['id']).execute()
-        except Exception as e:
-            logger.error(f"Error processing row {row['id']}: {e}")
+    """Indicator columns from the shared `indicators` and `features` modules."""
+    return features.add_timeframes(indicators.add_indicators(df))
+
+
+def load_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f).get('last_id')
+    return None
+
+
+def save_checkpoint(last_id):
+    tmp = CHECKPOINT_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'last_id': last_id}, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def iter_pages(after_id=None):
+    """Pages of trade_logs ordered by id, only the columns the backfill needs."""
+    while True:
+        query = supabase.table('trade_logs').select(','.join(KEY_COLUMNS + [c for c in BACKFILL_COLUMNS if c not in KEY_COLUMNS]))
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        res = query.order('id').limit(PAGE_SIZE).execute()
+        if not res.data:
+            return
+        yield pd.DataFrame(res.data)
+        after_id = res.data[-1]['id']
+        if len(res.data) < PAGE_SIZE:
+            return
+
+
+def _symbols(df):
+    # Vanematel logidel (enne mitme sümboli tuge) symbol puudub, need on SYMBOL-i read
+    return df['symbol'].fillna(SYMBOL)
+
+
+def log_time_ms(created_at):
+    """`created_at` column of trade_logs as epoch milliseconds."""
+    created = pd.to_datetime(created_at, utc=True, format='ISO8601')
+    return (created - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+
+
+def split_ranges(df):
+    """Contiguous groups of rows of one symbol (sorted by time) with no gap above MAX_RANGE_GAP."""
+    df = df.iloc[np.lexsort((df['ts'].to_numpy(), _symbols(df).to_numpy()))]
+    symbols = _symbols(df)
+    new_range = (df['ts'].diff().fillna(0) > MAX_RANGE_GAP * 60_000) | (symbols != symbols.shift())
+    return [group for _, group in df.groupby(new_range.cumsum())]
+
+
+def compute_range(rows, source):
+    """Indicator values for `rows` from one kline fetch over their time range."""
+    start = int(rows['ts'].min()) - WARMUP_MINUTES * 60_000
+    end = int(rows['ts'].max()) + 60_000
+    symbol = _symbols(rows).iloc[0]
+    kline_store.sync(source, symbol, '1m', start, end)
+    mdf = enrich_df(kline_store.load(symbol, '1m', start, end))
+    if mdf.empty:
+        return None
+    # Logi rida vastab küünlale, mis sulgus enne logimist (sulgemise tikk otsustab sulgunud küünla pealt);
+    # logimise minuti küünal oleks tulevikuandmed. Kõrgemad ajaraamid samalt realt: suletud selle küünla lõpuks
+    candle = rows['ts'] // 60_000 * 60_000 - 60_000
+    pos = np.searchsorted(mdf['time'].to_numpy(), candle.to_numpy())
+    found = (pos < len(mdf)) & (mdf['time'].to_numpy()[np.minimum(pos, len(mdf) - 1)] == candle.to_numpy())
+    values = mdf.iloc[pos[found]][BACKFILL_COLUMNS].reset_index(drop=True)
+    return rows[found].reset_index(drop=True), values
+
+
+def build_updates(rows, values):
+    """Upsert payloads; only columns that are null in the log row are filled.
+
+    Every payload carries all BACKFILL_COLUMNS (the row's own value where it
+    is set): a batch upsert writes the union of the keys, so a column missing
+    from one payload would be overwritten with NULL.
+    """
+    updates = []
+    for row, new in zip(rows.to_dict('records'), values.to_dict('records')):
+        update = {k: row[k] for k in KEY_COLUMNS}
+        filled = {k: float(new[k]) for k in BACKFILL_COLUMNS
+                  if pd.isna(row.get(k)) and not pd.isna(new[k])}
+        if filled:
+            current = {k: None if pd.isna(row.get(k)) else float(row[k]) for k in BACKFILL_COLUMNS}
+            updates.append({**update, **current, **filled})
+    return updates
+
+
+def upsert(updates):
+    for i in range(0, len(updates), UPSERT_BATCH):
+        supabase.table('trade_logs').upsert(updates[i:i + UPSERT_BATCH]).execute()
+
+
+def backfill_records(restart=False):
+    init()
+    last_id = None if restart else load_checkpoint()
+    if last_id is not None:
+        logger.info(f"Resuming after id {last_id}")
+    source = RateLimitedClient(client)
+    total = updated = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        for page in iter_pages(last_id):
+            total += len(page)
+            present = [c for c in BACKFILL_COLUMNS if c in page.columns]
+            todo = page[page[present].isna().any(axis=1)].copy() if present else page.copy()
+            if not todo.empty:
+                todo['ts'] = log_time_ms(todo['created_at'])
+                updates = []
+                for result in pool.map(lambda r: compute_range(r, source), split_ranges(todo)):
+                    if result is not None:
+                        updates += build_updates(*result)
+                upsert(updates)
+                updated += len(updates)
+            last_id = page['id'].iloc[-1]
+            save_checkpoint(last_id.item() if hasattr(last_id, 'item') else last_id)
+            logger.info(f"Checked {total} rows, updated {updated} ({time.perf_counter() - started:.0f}s)")
+
+    logger.info(f"✅ Backfill done: {updated} of {total} rows updated")
 
 
 if __name__ == '__main__':
-    backfill_records(limit=2000)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [migrate] %(message)s')
+    backfill_records(restart='--restart' in sys.argv)
@@ -0,0 +1,118 @@
+"""In-memory model holder with atomic hot reload.
+
+`brain.py` publishes a new model with `publish_model`: the pickle is
+written to a temporary file and renamed over the old one, and only then
+is the version file updated. The bot keeps one `ModelRegistry` and calls
+`get()` every tick; that is a single `os.stat` unless a new version has
+been published, in which case the model is loaded once and swapped in.
+A file that fails to load is remembered by its mtime and size and tried
+again only when it changes, not on every tick.
+`predictor()` returns the matching `inference.Predictor`, built once per
+version at load time.
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+from inference import Predictor
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = 'trading_brain_xgb.pkl'
+
+
+def version_path(path):
+    return os.path.splitext(path)[0] + '.version'
+
+
+def _atomic_write(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def publish_model(model, path=MODEL_PATH, version=None):
+    """Atomically replace the model at `path` and bump its version file."""
+    import joblib
+    version = version or time.strftime('%Y%m%d-%H%M%S')
+    _atomic_write(path, lambda f: joblib.dump(model, f))
+    _atomic_write(version_path(path), lambda f: f.write(version.encode()))
+    return version
+
+
+class ModelRegistry:
+    """Loads the model once and reloads it only when a new version appears."""
+
+    def __init__(self, path=MODEL_PATH):
+        self.path = path
+        self.model = None
+        self._predictor = None
+        self.version = None
+        self.load_seconds = None
+        self._stamp = None
+        self._failed = None  # (stamp, pkl faili (mtime, suurus)) viimasest ebaõnnestunud laadimisest
+        self._lock = threading.Lock()
+
+    def _current_stamp(self):
+        # Versioonifail on eelistatud; vanemate mudelite puhul kasutame pkl faili mtime'i
+        for p in (version_path(self.path), self.path):
+            try:
+                return p, os.stat(p).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _file_state(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self):
+        """Current model or None when no model has been published yet."""
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp:
+            return self.model
+        if self._failed is not None and self._failed == (stamp, self._file_state()):
+            return self.model  # sama katkine fail, ootame uut
+        with self._lock:
+            if stamp != self._stamp and self._failed != (stamp, self._file_state()):
+                self._load(stamp)
+        return self.model
+
+    def predictor(self):
+        """Fast predictor for the current model (None when there is no model)."""
+        self.get()
+        return self._predictor
+
+    def _load(self, stamp):
+        state = self._file_state()  # enne lugemist: laadimise ajal vahetunud fail proovitakse uuesti
+        try:
+            import joblib  # alles esimesel laadimisel (xgboost tuleb unpickle'iga kaasa)
+            started = time.perf_counter()
+            model = joblib.load(self.path)
+            predictor = Predictor(model)
+            self.load_seconds = time.perf_counter() - started
+        except Exception as e:
+            logger.warning(f"Mudeli laadimine ebaõnnestus, jätkan vanaga ({self.version}), "
+                           f"proovin uuesti, kui fail muutub: {e}")
+            self._failed = (stamp, state)
+            return
+        version = None
+        if stamp[0] != self.path:
+            with open(stamp[0]) as f:
+                version = f.read().strip()
+        self.model, self._predictor, self._failed = model, predictor, None
+        self.version, self._stamp = version or f"mtime-{stamp[1]}", stamp
+        logger.info(f"🧠 Mudel {self.version} laaditud ({self.load_seconds * 1000:.1f} ms, {predictor.backend})")
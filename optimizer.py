@@ -0,0 +1,177 @@
+"""Walk-forward optimizer for stop_loss / take_profit / min_ai_confidence.
+
+The expensive parts are done once: klines come from `kline_store`,
+indicators from `indicators.compute` and the AI prediction from one batch
+`predict_proba`. None of them depend on the three parameters, so each
+combination only has to run `backtester.simulate`.
+
+The close / prediction / stoch_k arrays are placed in one
+`multiprocessing.shared_memory` block; pool workers attach to it instead
+of receiving a copy of the dataset. Every combination is evaluated on
+`folds + 1` consecutive segments; walk-forward then picks the best
+combination on the segments so far (expanding window) and records how it
+does on the next, unseen segment.
+
+Usage:
+    python optimizer.py --start "90 days ago UTC"                 # full grid
+    python optimizer.py --random 10000 --folds 5 --workers 8
+    python optimizer.py --apply                                   # write winner to bot_settings
+"""
+import os
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import backtester
+import indicators
+import features
+import kline_store
+
+logger = logging.getLogger('optimizer')
+
+STOP_LOSS = np.round(np.arange(-0.5, -5.01, -0.25), 2)
+TAKE_PROFIT = np.round(np.arange(0.5, 6.01, 0.25), 2)
+MIN_CONFIDENCE = np.round(np.arange(0.5, 0.901, 0.02), 2)
+MIN_TRADES = 5
+DRAWDOWN_WEIGHT = 0.5
+TASK_SIZE = 64  # kombinatsiooni ühe töölise ülesande kohta
+
+# stats[..., i]: 0 = kogutootlus %, 1 = max drawdown %, 2 = tehinguid
+RETURN, DRAWDOWN, TRADES = range(3)
+
+_shared = {}
+
+
+def grid():
+    sl, tp, conf = np.meshgrid(STOP_LOSS, TAKE_PROFIT, MIN_CONFIDENCE, indexing='ij')
+    return np.column_stack([sl.ravel(), tp.ravel(), conf.ravel()])
+
+
+def random_combos(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        np.round(rng.uniform(STOP_LOSS.min(), STOP_LOSS.max(), n), 2),
+        np.round(rng.uniform(TAKE_PROFIT.min(), TAKE_PROFIT.max(), n), 2),
+        np.round(rng.uniform(MIN_CONFIDENCE.min(), MIN_CONFIDENCE.max(), n), 3),
+    ])
+
+
+def load_dataset(symbol, start, end=None, pressure=1.0):
+    """close, prediction and stoch_k as one (3, n) float64 array."""
+    import bot
+    bot.init(database=False)
+    df = kline_store.get_klines(bot.client, symbol, '1m', start, end)
+    df = features.add_timeframes(indicators.add_indicators(df))
+    df['market_pressure'] = pressure
+    prediction = backtester.predict(bot.models.get(), df)
+    return np.vstack([df['close'].to_numpy(), prediction, df['stoch_k'].to_numpy()])
+
+
+def _attach(name, shape, bounds):
+    shm = shared_memory.SharedMemory(name=name)
+    _shared.update(shm=shm, data=np.ndarray(shape, dtype=np.float64, buffer=shm.buf), bounds=bounds)
+
+
+def _evaluate(combos):
+    """Stats for each combination on each segment: (len(combos), segments, 3)."""
+    data, bounds = _shared['data'], _shared['bounds']
+    out = np.zeros((len(combos), len(bounds) - 1, 3))
+    for i, (sl, tp, conf) in enumerate(combos):
+        for s in range(len(bounds) - 1):
+            lo, hi = bounds[s], bounds[s + 1]
+            trades = backtester.simulate(data[0, lo:hi], data[1, lo:hi], data[2, lo:hi], sl, tp, conf)
+            stats = backtester.summarize(trades)
+            out[i, s] = stats['total_return'], stats['max_drawdown'], stats['trades']
+    return out
+
+
+def score(stats):
+    """Higher is better; too few trades rank last."""
+    s = stats[..., RETURN] - DRAWDOWN_WEIGHT * stats[..., DRAWDOWN]
+    return np.where(stats[..., TRADES] >= MIN_TRADES, s, -np.inf)
+
+
+def combine(stats):
+    """Chain segment results as if they were one run."""
+    total = (np.prod(1 + stats[..., RETURN] / 100, axis=-1) - 1) * 100
+    return np.stack([total, stats[..., DRAWDOWN].max(axis=-1), stats[..., TRADES].sum(axis=-1)], axis=-1)
+
+
+def evaluate(data, combos, folds=4, workers=None):
+    bounds = np.linspace(0, data.shape[1], folds + 2).astype(int)
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        tasks = [combos[i:i + TASK_SIZE] for i in range(0, len(combos), TASK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_attach,
+                                 initargs=(shm.name, data.shape, bounds)) as pool:
+            return np.concatenate(list(pool.map(_evaluate, tasks))), bounds
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def walk_forward(stats):
+    """For each fold: best combination on the segments before it, scored on the fold."""
+    steps = []
+    for fold in range(1, stats.shape[1]):
+        in_sample = score(combine(stats[:, :fold]))
+        best = int(np.argmax(in_sample))
+        steps.append((fold, best, stats[best, fold]))
+    return steps
+
+
+def apply_settings(sl, tp, conf):
+    import bot
+    bot.init(exchange=False)
+    bot.supabase.table("bot_settings").update(
+        {"stop_loss": float(sl), "take_profit": float(tp), "min_ai_confidence": float(conf)}
+    ).eq("id", 1).execute()
+    logger.info(f"✅ bot_settings uuendatud: SL {sl} TP {tp} AI {conf}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbol', default=backtester.SYMBOL)
+    parser.add_argument('--start', default='90 days ago UTC')
+    parser.add_argument('--end')
+    parser.add_argument('--random', type=int, help='juhuslike kombinatsioonide arv (vaikimisi täisvõrk)')
+    parser.add_argument('--folds', type=int, default=4)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--apply', action='store_true', help='kirjuta võitja bot_settings tabelisse')
+    args = parser.parse_args()
+
+    data = load_dataset(args.symbol, args.start, args.end)
+    combos = random_combos(args.random) if args.random else grid()
+    logger.info(f"🔎 {len(combos)} kombinatsiooni, {data.shape[1]} küünalt, {args.folds} walk-forward sammu")
+
+    started = time.perf_counter()
+    stats, bounds = evaluate(data, combos, args.folds, args.workers)
+    logger.info(f"⏱️ {len(combos) * (len(bounds) - 1)} simulatsiooni {time.perf_counter() - started:.1f}s")
+
+    oos = []
+    for fold, best, result in walk_forward(stats):
+        sl, tp, conf = combos[best]
+        oos.append(result)
+        logger.info(f"WF {fold}: SL {sl} TP {tp} AI {conf} -> valimiväliselt {result[RETURN]:.2f}% "
+                    f"DD {result[DRAWDOWN]:.2f}% tehinguid {int(result[TRADES])}")
+    oos = combine(np.array(oos))
+    logger.info(f"Walk-forward kokku: {oos[RETURN]:.2f}% DD {oos[DRAWDOWN]:.2f}% tehinguid {int(oos[TRADES])}")
+
+    overall = combine(stats)
+    ranking = np.argsort(-score(overall))[:args.top]
+    print(f"{'SL':>6} {'TP':>6} {'AI':>6} {'tootlus%':>9} {'DD%':>7} {'tehinguid':>9}")
+    for i in ranking:
+        print(f"{combos[i][0]:>6} {combos[i][1]:>6} {combos[i][2]:>6} "
+              f"{overall[i, RETURN]:>9.2f} {overall[i, DRAWDOWN]:>7.2f} {int(overall[i, TRADES]):>9}")
+
+    if args.apply and np.isfinite(score(overall[ranking[0]])):
+        apply_settings(*combos[ranking[0]])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [optimizer] %(message)s')
+    main()
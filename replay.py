@@ -0,0 +1,319 @@
+"""Deterministic market replay through the real bot tick.
+
+Recorded 1m klines and order book snapshots are fed through
+`bot.get_market_data` -> `analyze_signals` -> `log_to_supabase` (via
+`bot.tick`) on a virtual clock, as fast as the code allows. The exchange
+client and Supabase are replaced by local stand-ins (`ReplayClient`,
+`ReplayDB`); everything else (indicator stream, model registry and
+inference, batched log writer, metrics) is the production code.
+
+A recording is a directory with, per symbol:
+
+    <SYMBOL>.klines.npy   (6, n) float64: time, open, high, low, close, volume
+    <SYMBOL>.depth.npz    time (m,), bids / asks (m, levels, 2) price, qty
+
+`synthesize` builds one from the deterministic `fake_exchange` market,
+`record` from the real exchange (klines via `kline_store`, the order
+book polled while recording).
+
+Usage:
+    python replay.py synthesize data/replay/synthetic --symbols BTCUSDT ETHUSDT --hours 24
+    python replay.py record data/replay/live --symbols BTCUSDT --minutes 60
+    python replay.py run data/replay/synthetic [--samples 2]
+"""
+import os
+import time
+import hashlib
+import argparse
+import logging
+import tempfile
+import numpy as np
+import kline_store
+import fake_exchange
+import features
+import metrics
+
+logger = logging.getLogger('replay')
+
+MINUTE_MS = 60_000
+DEPTH_LEVELS = 10
+DEPTH_EVERY_MS = 10_000
+SYNTHETIC_START_MS = 1_700_000_000_000 - 1_700_000_000_000 % MINUTE_MS
+REST_CLOSE_DELAY_MS = 250  # nagu candle_clock REST režiimis
+DEFAULT_SETTINGS = {"id": 1, "stop_loss": -2.0, "take_profit": 3.0, "min_ai_confidence": 0.6}
+
+
+# --- salvestised ---
+
+def save(path, symbol, klines, depth_time, bids, asks):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, f"{symbol}.klines.npy"), np.asarray(klines, dtype=np.float64))
+    np.savez(os.path.join(path, f"{symbol}.depth.npz"), time=np.asarray(depth_time, dtype=np.int64),
+             bids=np.asarray(bids, dtype=np.float64), asks=np.asarray(asks, dtype=np.float64))
+
+
+def load(path, symbols=None):
+    """{symbol: (klines (6, n), depth time, bids, asks)} of a recording."""
+    symbols = symbols or sorted(f.split('.')[0] for f in os.listdir(path) if f.endswith('.klines.npy'))
+    data = {}
+    for s in symbols:
+        depth = np.load(os.path.join(path, f"{s}.depth.npz"))
+        data[s] = (np.load(os.path.join(path, f"{s}.klines.npy"), mmap_mode='r'),
+                   depth['time'], depth['bids'], depth['asks'])
+    return data
+
+
+def _book(depth):
+    bids = [[float(p), float(q)] for p, q in depth['bids']]
+    asks = [[float(p), float(q)] for p, q in depth['asks']]
+    return bids, asks
+
+
+def synthesize(symbols, minutes, start_ms=SYNTHETIC_START_MS):
+    """Recording data from the fake_exchange price path; each symbol is shifted in time."""
+    data = {}
+    for i, s in enumerate(symbols):
+        shift = i * 7_919 * MINUTE_MS  # eri sümbolitel erinev, aga korduv turg
+        opens = start_ms + np.arange(minutes, dtype=np.int64) * MINUTE_MS
+        rows = [fake_exchange.kline(int(t) + shift) for t in opens]
+        klines = np.array([[t] + [float(v) for v in r[1:6]] for t, r in zip(opens, rows)]).T
+        depth_time = np.arange(start_ms, start_ms + minutes * MINUTE_MS, DEPTH_EVERY_MS, dtype=np.int64)
+        books = [_book(fake_exchange.depth(DEPTH_LEVELS, int(t) + shift)) for t in depth_time]
+        data[s] = (klines, depth_time, np.array([b for b, _ in books]), np.array([a for _, a in books]))
+    return data
+
+
+def record(client, path, symbols, minutes, history=500):
+    """Poll the order book for `minutes`, then store the klines of the same period."""
+    start = kline_store._now_ms()
+    snapshots = {s: ([], [], []) for s in symbols}
+    while kline_store._now_ms() < start + minutes * MINUTE_MS:
+        for s in symbols:
+            bids, asks = _book(client.get_order_book(symbol=s, limit=DEPTH_LEVELS))
+            snapshots[s][0].append(kline_store._now_ms())
+            snapshots[s][1].append(bids)
+            snapshots[s][2].append(asks)
+        time.sleep(DEPTH_EVERY_MS / 1000)
+    # Ajalugu enne salvestuse algust, et esimene tikk saaks täis puhvri
+    history = start - (history + 1) * MINUTE_MS
+    for s in symbols:
+        kline_store.sync(client, s, '1m', history, kline_store._now_ms())
+        klines = np.vstack(kline_store.load_arrays(s, '1m', history, kline_store._now_ms()))
+        save(path, s, klines, *snapshots[s])
+    logger.info(f"💾 Salvestatud {path}: {', '.join(symbols)}, {minutes} min")
+
+
+# --- asendajad ---
+
+class ReplayClient:
+    """Binance client stand-in serving a recording as of a virtual time `now_ms`."""
+
+    def __init__(self, data):
+        self.data = data
+        self.now_ms = 0
+        self.requests = 0
+
+    def get_server_time(self):
+        return {'serverTime': self.now_ms}
+
+    def _rows(self, symbol, first, last):
+        """Kline rows with open time in [first, last]; the forming candle is partial."""
+        klines = self.data[symbol][0]
+        times = klines[0]
+        rows = []
+        for i in range(int(np.searchsorted(times, first)), int(np.searchsorted(times, last, side='right'))):
+            t, o, h, l, c, v = (float(x) for x in klines[:, i])
+            if t + MINUTE_MS > self.now_ms:
+                # Kujunev küünal: lineaarselt osa sellest, mis on möödunud
+                f = (self.now_ms - t) / MINUTE_MS
+                c = o + (c - o) * f
+                h, l, v = max(o, c), min(o, c), v * f
+            rows.append([int(t), o, h, l, c, v, int(t) + MINUTE_MS - 1, '0', 0, '0', '0', '0'])
+        return rows
+
+    def get_klines(self, symbol, interval='1m', limit=500, **kwargs):
+        self.requests += 1
+        step = features.step_ms(interval)
+        last = self.now_ms - self.now_ms % step
+        rows = self._rows(symbol, last - (limit - 1) * step, self.now_ms)
+        return rows if step == MINUTE_MS else self._aggregate(rows, step)
+
+    @staticmethod
+    def _aggregate(rows, step):
+        """1m kline rows -> `step` klines, the way the exchange builds them."""
+        out = []
+        for row in rows:
+            bucket = row[0] - row[0] % step
+            if out and out[-1][0] == bucket:
+                k = out[-1]
+                k[2], k[3], k[4], k[5] = max(k[2], row[2]), min(k[3], row[3]), row[4], k[5] + row[5]
+            else:
+                out.append([bucket, row[1], row[2], row[3], row[4], row[5], bucket + step - 1, '0', 0, '0', '0', '0'])
+        return out
+
+    def get_historical_klines(self, symbol, interval, start_str, end_str=None, **kwargs):
+        self.requests += 1
+        # "500 minutes ago UTC" on päris kella suhtes; nihutame virtuaalsesse aega
+        start = kline_store._to_ms(start_str)
+        if isinstance(start_str, str) and 'ago' in start_str:
+            start += self.now_ms - kline_store._now_ms()
+        end = kline_store._to_ms(end_str) if end_str else self.now_ms
+        return self._rows(symbol, start, min(end, self.now_ms))
+
+    def get_order_book(self, symbol, limit=DEPTH_LEVELS):
+        self.requests += 1
+        _, times, bids, asks = self.data[symbol]
+        i = max(0, int(np.searchsorted(times, self.now_ms, side='right')) - 1)
+        return {'lastUpdateId': int(times[i]),
+                'bids': [[str(p), str(q)] for p, q in bids[i, :limit]],
+                'asks': [[str(p), str(q)] for p, q in asks[i, :limit]]}
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db, self.table, self.rows, self._single = db, table, None, False
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def execute(self):
+        if self.rows is not None:
+            self.db.tables.setdefault(self.table, []).extend(self.rows)
+            self.db.inserts += 1
+            return _Result(self.rows)
+        if self.table == 'bot_settings':
+            return _Result(dict(self.db.settings) if self._single else [dict(self.db.settings)])
+        return _Result(list(self.db.tables.get(self.table, [])))
+
+
+class ReplayDB:
+    """Supabase stand-in: inserts go to memory, `bot_settings` is a fixed row."""
+
+    def __init__(self, settings=None):
+        self.settings = settings or DEFAULT_SETTINGS
+        self.tables = {}
+        self.inserts = 0
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+# --- taasesitus ---
+
+def replay(data, samples=1, model_path=None, limit=None, progress=False):
+    """Run every tick of the recording through `bot.tick`; returns the run summary."""
+    import bot
+    from model_registry import ModelRegistry
+    from log_writer import TradeLogWriter
+
+    client, db = ReplayClient(data), ReplayDB()
+    bot.client, bot.supabase, bot.market_stream = client, db, None
+    bot.now_ms = lambda: client.now_ms
+    bot.streams.clear()
+    bot.positions.clear()
+    bot._last_data.clear()
+    bot.timeframes.clear()
+    bot.cache.clear()  # vahemälu kell on bot.now_ms, s.t. virtuaalne
+    if model_path:
+        bot.models = ModelRegistry(model_path)
+    spool = os.path.join(tempfile.gettempdir(), f"replay-spool-{os.getpid()}.jsonl")
+    bot.log_writer = TradeLogWriter(bot._insert_logs, spool_path=spool)
+    metrics.reset()
+
+    symbols = list(data)
+    first = max(data[s][0][0, 0] for s in symbols) + bot.HISTORY_CANDLES * MINUTE_MS
+    last = min(data[s][0][0, -1] for s in symbols) + MINUTE_MS
+    step = MINUTE_MS // samples
+    points = np.arange(first, last, step, dtype=np.int64)[:limit]
+    decisions = hashlib.sha256()
+    actions = {}
+    bot.models.get()  # mudeli laadimine ei kuulu tikkide aja sisse
+
+    started = time.perf_counter()
+    for n, point in enumerate(points):
+        close = int(point) if point % MINUTE_MS == 0 else None
+        client.now_ms = int(point) + (REST_CLOSE_DELAY_MS if close is not None else 0)
+        settings = bot.get_bot_settings()
+        for s in symbols:
+            with metrics.tick(s):
+                result = bot.tick(s, settings, close)
+            if result is not None:
+                actions[result[0]] = actions.get(result[0], 0) + 1
+                decisions.update(f"{s}{point}{result[1]}".encode())
+        if progress and n % 1000 == 0:
+            logger.info(f"⏩ {n}/{len(points)}")
+    elapsed = time.perf_counter() - started
+    bot.log_writer.close()
+    if os.path.exists(spool):
+        os.remove(spool)
+
+    ticks = len(points) * len(symbols)
+    return {
+        'symbols': len(symbols),
+        'ticks': ticks,
+        'seconds': elapsed,
+        'ticks_per_second': ticks / elapsed if elapsed else 0.0,
+        'actions': actions,
+        'logged_rows': len(db.tables.get('trade_logs', [])),
+        'exchange_requests': client.requests,
+        'decisions_digest': decisions.hexdigest()[:16],
+        'model_version': bot.models.version,
+        'stages': metrics.snapshot()['stages'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('synthesize')
+    p.add_argument('path')
+    p.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    p.add_argument('--hours', type=float, default=24)
+    p = sub.add_parser('record')
+    p.add_argument('path')
+    p.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    p.add_argument('--minutes', type=int, default=60)
+    p = sub.add_parser('run')
+    p.add_argument('path')
+    p.add_argument('--symbols', nargs='+')
+    p.add_argument('--samples', type=int, default=1, help='tikke küünla kohta')
+    p.add_argument('--model')
+    args = parser.parse_args()
+
+    if args.command == 'synthesize':
+        for s, d in synthesize(args.symbols, int(args.hours * 60)).items():
+            save(args.path, s, *d)
+        logger.info(f"💾 {args.path}: {', '.join(args.symbols)}, {args.hours} h")
+    elif args.command == 'record':
+        import bot
+        bot.init(database=False)
+        record(bot.client, args.path, args.symbols, args.minutes, bot.HISTORY_CANDLES)
+    else:
+        result = replay(load(args.path, args.symbols), args.samples, args.model, progress=True)
+        stages = result.pop('stages')
+        for k, v in result.items():
+            print(f"{k:>18}: {v}")
+        for stage, s in sorted(stages.items()):
+            print(f"{stage:>18}: p50 {s['p50'] * 1e3:7.3f} ms  p95 {s['p95'] * 1e3:7.3f} ms  "
+                  f"p99 {s['p99'] * 1e3:7.3f} ms  n={s['count']}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [replay] %(message)s')
+    main()
@@ -0,0 +1,103 @@
+"""Run many symbols from one process.
+
+Every round the scheduler reads `bot_settings` once (from `bot.cache`,
+refreshed in the background) and runs one tick per symbol on a shared worker pool. Rounds start at the candle close
+(`candle_clock`), plus `CANDLE_SAMPLES - 1` intra-candle points. All symbols share the Binance HTTP
+session, the websocket market stream, the in-memory model and the
+batched log writer from `bot`; each symbol only has its own `Position`
+and candle buffer.
+
+Usage:
+    python scheduler.py BTCUSDT ETHUSDT SOLUSDT
+    SYMBOLS=BTCUSDT,ETHUSDT python scheduler.py
+"""
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+import bot
+import metrics
+import candle_clock
+
+logger = logging.getLogger('scheduler')
+
+REPORT_EVERY = 10  # ringi
+
+
+class SymbolStats:
+    def __init__(self):
+        self.ticks = 0
+        self.errors = 0
+        self.last_tick_ms = None
+        self.max_tick_ms = 0.0
+        self.staleness_s = None  # viimase küünla vanus tiku hetkel
+
+
+def tick(symbol, settings, stats, clock=None, point=None, closed=False):
+    """`bot.tick` for one symbol (the same path as `bot.run_bot` and `replay.py`) plus its stats."""
+    started = time.perf_counter()
+    errors = metrics.counter('market_data_errors_total', symbol=symbol)
+    try:
+        with metrics.tick(symbol):
+            result = bot.tick(symbol, settings, point if closed else None)
+            if result is not None and clock is not None:
+                metrics.observe('decision_latency', clock.latency(point))
+        if result is not None and result[0] != "HOLD":
+            logger.info(f"🔔 TEHING {symbol}: {result[1]}")
+        return result[0] if result is not None else None
+    except Exception as e:
+        stats.errors += 1
+        logger.error(f"{symbol} tiku viga: {e}")
+        return None
+    finally:
+        # Turuandmete vead püüab bot.get_market_data ise kinni, need tulevad mõõdikust
+        stats.errors += metrics.counter('market_data_errors_total', symbol=symbol) - errors
+        last = bot.last_candle_time(symbol)
+        if last is not None:
+            stats.staleness_s = time.time() - (last + (candle_clock.CANDLE_MS if closed else 0)) / 1000
+        stats.ticks += 1
+        stats.last_tick_ms = (time.perf_counter() - started) * 1000
+        stats.max_tick_ms = max(stats.max_tick_ms, stats.last_tick_ms)
+
+
+def report(stats):
+    lat = sorted(s.last_tick_ms for s in stats.values() if s.last_tick_ms is not None)
+    if not lat:
+        return
+    stalest = max(stats, key=lambda s: stats[s].staleness_s or 0)
+    logger.info(
+        f"📊 {len(stats)} sümbolit | tikk p50 {lat[len(lat) // 2]:.0f} ms, max {lat[-1]:.0f} ms | "
+        f"vigu {sum(s.errors for s in stats.values())} | "
+        f"vanim {stalest} {stats[stalest].staleness_s or 0:.0f}s | logijärjekord {bot.log_writer.stats()['queue_depth']}")
+
+
+def run_symbols(symbols, workers=None, samples=None):
+    workers = workers or min(32, len(symbols))
+    bot.init()
+    # Üks HTTP sessioon kõigile lõimedele, ühenduste kogum peab mahutama kõik töölised
+    bot.client.session.mount('https://', HTTPAdapter(pool_maxsize=workers))
+    bot.client.session.mount('http://', HTTPAdapter(pool_maxsize=workers))
+    bot.start_metrics()
+    bot.start_cache()
+    bot.start_market_stream(symbols)
+    stats = {s: SymbolStats() for s in symbols}
+    clock = candle_clock.CandleClock(bot.client, bot.market_stream, symbols, samples or candle_clock.SAMPLES)
+    logger.info(f"🤖 Ajastaja käivitatud: {len(symbols)} sümbolit, {workers} töölist")
+
+    rounds = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tick') as pool:
+        while True:
+            point, closed = clock.wait()
+            settings = bot.get_bot_settings()
+            wait([pool.submit(tick, s, settings, stats[s], clock, point, closed) for s in symbols])
+            rounds += 1
+            if rounds % REPORT_EVERY == 0:
+                report(stats)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [scheduler] %(message)s')
+    symbols = sys.argv[1:] or os.getenv('SYMBOLS', bot.SYMBOL).split(',')
+    run_symbols([s.strip().upper() for s in symbols if s.strip()])
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testid impordivad juurkataloogi mooduleid (bot, replay, migrate_logs, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
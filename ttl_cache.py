@@ -0,0 +1,217 @@
+"""Read-through cache for slow-changing remote values (settings, order book).
+
+`TTLCache` keeps one entry per (name, args) with a per-name TTL:
+
+* `get()` returns the cached value while it is younger than `ttl`;
+* a background thread (`start()`) reloads entries that were read recently
+  before they expire, so the trading loop normally never waits on the
+  network (per name, `keep_warm=0` turns this off);
+* when a load fails, the last value that loaded successfully is returned
+  (a warning and `cache_errors_total` are recorded); the registered
+  default is only used if nothing was ever loaded.
+
+`TableSubscription` listens to Supabase Realtime row changes of one table
+in a background thread and hands every changed row to a callback, e.g.
+`cache.set('settings', row)`, so edits show up within seconds while the
+TTL poll stays as a safety net.
+"""
+import time
+import asyncio
+import logging
+import threading
+import metrics
+
+logger = logging.getLogger(__name__)
+
+KEEP_WARM = 180.0  # sekundit: nii kaua pärast viimast lugemist värskendatakse kirjet taustal
+REFRESH_AHEAD = 0.8  # kirje laaditakse uuesti, kui see on vanem kui 80% TTL-ist
+MAX_BACKOFF = 60
+
+
+class _Spec:
+    def __init__(self, loader, ttl, default, keep_warm):
+        self.loader = loader
+        self.ttl = ttl
+        self.default = default
+        self.keep_warm = keep_warm
+
+
+class _Entry:
+    def __init__(self):
+        self.value = None
+        self.loaded_at = None  # None = pole kunagi õnnestunud
+        self.read_at = 0.0
+        self.failed_at = None  # viimane ebaõnnestunud laadimine
+        self.lock = threading.Lock()
+
+
+class TTLCache:
+    def __init__(self, clock=time.monotonic):
+        """`clock()` returns seconds; `replay.py` passes its virtual clock through `bot.now_ms`."""
+        self.clock = clock
+        self._specs = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, loader, ttl, default=None, keep_warm=KEEP_WARM):
+        """`loader(*args)` fetches the value of `get(name, *args)` and raises on failure.
+
+        `keep_warm` = seconds after the last read that the entry is refreshed
+        in the background; 0 = read-through only (values read every tick
+        anyway, where a background refresh would only add requests).
+        """
+        self._specs[name] = _Spec(loader, ttl, default, keep_warm)
+
+    def get(self, name, *args):
+        spec = self._specs[name]
+        entry = self._entry(name, args)
+        now = self.clock()
+        entry.read_at = now
+        if entry.loaded_at is not None and now - entry.loaded_at < spec.ttl:
+            metrics.inc('cache_hits_total', key=name)
+            return entry.value
+        if entry.failed_at is not None and now - entry.failed_at < spec.ttl:
+            # Allikas on maas: ei oota igal tikil uuesti võrgu taimaudi ära
+            return entry.value if entry.loaded_at is not None else spec.default
+        metrics.inc('cache_misses_total', key=name)
+        return self._load(name, args, entry)
+
+    def set(self, name, value, *args):
+        """Store a value pushed from elsewhere (a change notification)."""
+        entry = self._entry(name, args)
+        with entry.lock:
+            entry.value, entry.loaded_at, entry.failed_at = value, self.clock(), None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ttl-cache', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # --- sisemine ---
+
+    def _entry(self, name, args):
+        key = (name, args)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry())
+        return entry
+
+    def _load(self, name, args, entry):
+        spec = self._specs[name]
+        with entry.lock:
+            # Teine lõim võis sama kirje vahepeal laadida
+            if entry.loaded_at is not None and self.clock() - entry.loaded_at < spec.ttl * REFRESH_AHEAD:
+                return entry.value
+            try:
+                value = spec.loader(*args)
+            except Exception as e:
+                entry.failed_at = self.clock()
+                metrics.inc('cache_errors_total', key=name)
+                if entry.loaded_at is None:
+                    logger.warning(f"⚠️ {name}{list(args) or ''} laadimine ebaõnnestus ({e}), kasutan vaikeväärtust")
+                    return spec.default
+                age = self.clock() - entry.loaded_at
+                logger.warning(f"⚠️ {name}{list(args) or ''} laadimine ebaõnnestus ({e}), "
+                               f"kasutan viimast head väärtust ({age:.0f}s vana)")
+                return entry.value
+            entry.value, entry.loaded_at, entry.failed_at = value, self.clock(), None
+            return value
+
+    def _due(self):
+        now = self.clock()
+        with self._lock:
+            items = list(self._entries.items())
+        for (name, args), entry in items:
+            spec = self._specs[name]
+            fresh = entry.loaded_at is not None and now - entry.loaded_at < spec.ttl * REFRESH_AHEAD
+            failing = entry.failed_at is not None and now - entry.failed_at < spec.ttl
+            if not fresh and not failing and now - entry.read_at < spec.keep_warm:
+                yield name, args, entry
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name, args, entry in list(self._due()):
+                self._load(name, args, entry)
+            step = min((s.ttl for s in self._specs.values() if s.keep_warm), default=1.0) * (1 - REFRESH_AHEAD)
+            self._stop.wait(max(0.2, step))
+
+
+class TableSubscription:
+    """Supabase Realtime listener: `on_change(row)` for every insert/update of `table`."""
+
+    def __init__(self, url, key, table, on_change, filter=None):
+        self.url = url.rstrip('/') + '/realtime/v1'
+        self.key = key
+        self.table = table
+        self.on_change = on_change
+        self.filter = filter
+        self.connected = False
+        self.reconnects = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._thread_main, name=f'realtime-{self.table}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _thread_main(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        finally:
+            loop.close()
+
+    def _callback(self, payload):
+        row = payload.get('data', {}).get('record')
+        if row:
+            metrics.inc('table_changes_total', table=self.table)
+            self.on_change(row)
+
+    async def _run(self):
+        from realtime import AsyncRealtimeClient
+        backoff = 1
+        while not self._stop.is_set():
+            client = AsyncRealtimeClient(self.url, self.key, params={'apikey': self.key}, auto_reconnect=False)
+            try:
+                await client.connect()
+                channel = client.channel(f'{self.table}-changes')
+                channel.on_postgres_changes('*', self._callback, table=self.table, filter=self.filter)
+                await channel.subscribe()
+                self.connected = True
+                logger.info(f"📡 Tabeli {self.table} muudatuste tellimus aktiivne")
+                backoff = 1
+                while not self._stop.is_set() and client.is_connected:
+                    await asyncio.sleep(1)
+            except Exception as e:
+                logger.warning(f"⚠️ Tabeli {self.table} tellimus katkes ({e}), uus katse {backoff}s pärast")
+            finally:
+                self.connected = False
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)